@@ -0,0 +1,289 @@
+# Arquivo: agendador_treinamento.py
+#
+# Agendador de treinamentos com fila persistente e execução única (single-flight).
+# As interfaces (app.py, bot_discord.py) apenas registram pedidos com solicitar_treinamento();
+# um único worker por máquina (garantido por trava de arquivo entre processos) aguarda a
+# rajada de confirmações acalmar, junta todos os pedidos pendentes em uma só execução e
+# grava o progresso, que qualquer interface consulta com obter_status().
+# A trava é só do worker; as interfaces sabem se ele está vivo pelo sinal (pid + horário)
+# que ele grava na tabela status a cada INTERVALO_SINAL segundos.
+#
+# Uso manual: python agendador_treinamento.py --worker | --status
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+import subprocess
+from datetime import datetime
+
+DIRETORIO_ATUAL = os.path.dirname(os.path.abspath(__file__))
+ARQUIVO_FILA = os.path.join(DIRETORIO_ATUAL, 'fila_treinamento.db')
+ARQUIVO_TRAVA = os.path.join(DIRETORIO_ATUAL, 'treinamento.lock')
+DEBOUNCE_SEGUNDOS = int(os.getenv('DEBOUNCE_TREINAMENTO', 20)) # Espera sem pedidos novos antes de treinar
+INTERVALO_SINAL = 5 # Segundos entre os sinais de vida do worker
+TOLERANCIA_SINAL = 30 # Sem sinal há mais tempo que isso, o worker é considerado morto
+
+# Pedidos mais abrangentes englobam os menores
+PRIORIDADE_TIPOS = {'incremental': 1, 'sincronizar': 2, 'completo': 3}
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS pedidos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tipo TEXT NOT NULL,
+    layouts TEXT,
+    motivo TEXT,
+    criado_em REAL NOT NULL,
+    estado TEXT NOT NULL DEFAULT 'pendente'
+);
+CREATE INDEX IF NOT EXISTS idx_pedidos_estado ON pedidos (estado);
+CREATE TABLE IF NOT EXISTS status (
+    chave TEXT PRIMARY KEY,
+    valor TEXT
+);
+"""
+
+def conectar():
+    con = sqlite3.connect(ARQUIVO_FILA, timeout=30)
+    con.executescript(ESQUEMA)
+    return con
+
+# --- TRAVA ENTRE PROCESSOS ---
+
+class TravaArquivo:
+    """Trava exclusiva entre processos; o sistema operacional a libera se o processo morrer."""
+
+    def __init__(self, caminho=ARQUIVO_TRAVA):
+        self.caminho = caminho
+        self._arquivo = None
+
+    def tentar_adquirir(self):
+        self._arquivo = open(self.caminho, 'a+')
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                self._arquivo.seek(0)
+                msvcrt.locking(self._arquivo.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._arquivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            self._arquivo.close()
+            self._arquivo = None
+            return False
+
+    def adquirir(self):
+        """Espera a trava; para seções curtas entre processos (ex.: o log de inclusões do índice)."""
+        self._arquivo = open(self.caminho, 'a+')
+        if os.name == 'nt':
+            import msvcrt
+            self._arquivo.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self._arquivo.fileno(), msvcrt.LK_LOCK, 1) # Desiste após ~10 s; tenta de novo
+                    break
+                except OSError:
+                    continue
+        else:
+            import fcntl
+            fcntl.flock(self._arquivo.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __enter__(self):
+        return self.adquirir()
+
+    def __exit__(self, *erro):
+        self.liberar()
+
+    def liberar(self):
+        if not self._arquivo: return
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                self._arquivo.seek(0)
+                msvcrt.locking(self._arquivo.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._arquivo.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._arquivo.close()
+            self._arquivo = None
+
+# --- STATUS ---
+
+def gravar_status(con=None, **campos):
+    fechar = con is None
+    con = con or conectar()
+    with con:
+        con.executemany("INSERT OR REPLACE INTO status (chave, valor) VALUES (?, ?)",
+                        [(chave, json.dumps(valor, ensure_ascii=False)) for chave, valor in campos.items()])
+    if fechar: con.close()
+
+def ler_status(con):
+    return {chave: json.loads(valor) for chave, valor in con.execute("SELECT chave, valor FROM status")}
+
+def worker_ativo(status=None):
+    """
+    Há um worker vivo se ele deu sinal há menos de TOLERANCIA_SINAL segundos. Não testa a
+    trava do worker: uma sondagem segurando a trava faria um worker recém-iniciado desistir.
+    """
+    if status is None:
+        con = conectar()
+        try:
+            status = ler_status(con)
+        finally:
+            con.close()
+    sinal = status.get('worker_sinal')
+    return bool(status.get('worker_pid')) and sinal is not None and time.time() - sinal < TOLERANCIA_SINAL
+
+def manter_sinal(parar):
+    """Thread do worker: renova o sinal de vida enquanto o treinamento (longo) roda."""
+    while not parar.wait(INTERVALO_SINAL):
+        try:
+            gravar_status(worker_pid=os.getpid(), worker_sinal=time.time())
+        except sqlite3.Error as e:
+            print(f"AVISO: sinal do worker não gravado: {e}")
+
+def obter_status():
+    """
+    Estado atual do agendador: 'ocioso', 'aguardando' (debounce), 'executando', 'erro' ou
+    'interrompido' (worker morreu no meio). Inclui a etapa, pedidos pendentes e a geração,
+    que aumenta a cada treinamento concluído.
+    """
+    con = conectar()
+    try:
+        status = ler_status(con)
+        status['pendentes'] = con.execute("SELECT COUNT(*) FROM pedidos WHERE estado = 'pendente'").fetchone()[0]
+    finally:
+        con.close()
+    status.setdefault('estado', 'ocioso')
+    status.setdefault('geracao', 0)
+    if status['estado'] in ('aguardando', 'executando') and not worker_ativo(status):
+        status['estado'] = 'interrompido'
+    return status
+
+# --- PEDIDOS ---
+
+def solicitar_treinamento(tipo='incremental', layouts=None, motivo=''):
+    """
+    Registra um pedido e garante que exista um worker para atendê-lo.
+    tipo: 'incremental' (retreina só os layouts informados), 'sincronizar' (API + metadados)
+    ou 'completo' (fluxo completo do treinador).
+    """
+    if tipo not in PRIORIDADE_TIPOS:
+        raise ValueError(f"Tipo de treinamento desconhecido: {tipo}")
+    con = conectar()
+    with con:
+        con.execute("INSERT INTO pedidos (tipo, layouts, motivo, criado_em) VALUES (?, ?, ?, ?)",
+                    (tipo, json.dumps([str(l) for l in (layouts or [])]), motivo, time.time()))
+    con.close()
+    iniciar_worker()
+
+def iniciar_worker():
+    """Dispara o worker em segundo plano; se já houver um rodando, o novo sai imediatamente."""
+    if worker_ativo(): return
+    opcoes = {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP} if os.name == 'nt' else {'start_new_session': True}
+    subprocess.Popen([sys.executable, os.path.join(DIRETORIO_ATUAL, 'agendador_treinamento.py'), '--worker'],
+                     cwd=DIRETORIO_ATUAL, **opcoes)
+
+def coalescer_pedidos(pedidos):
+    """Junta os pedidos em um só: o tipo mais abrangente vence e os layouts são unidos."""
+    tipo = max((p[1] for p in pedidos), key=PRIORIDADE_TIPOS.get)
+    layouts = set()
+    for pedido in pedidos:
+        layouts.update(json.loads(pedido[2] or '[]'))
+    return tipo, sorted(layouts)
+
+def executar_treinamento(tipo, layouts, con):
+    import treinador_em_massa as treinador # Importação pesada, só dentro do worker
+
+    if tipo in ('sincronizar', 'completo'):
+        gravar_status(con, etapa="Sincronizando metadados com a API")
+        resumo = treinador.sincronizar_mapeamento_com_api()
+        if resumo is None:
+            raise RuntimeError("Falha na sincronização com a API.")
+        # Layouts recém-cadastrados podem já ter documentos que o modelo ignorava
+        layouts = sorted(set(layouts) | set(resumo['novos']))
+    if tipo == 'completo':
+        gravar_status(con, etapa="Treinando o modelo")
+        treinador.treinar_modelo_ml()
+    elif layouts:
+        gravar_status(con, etapa=f"Retreinando {len(layouts)} layout(s)")
+        treinador.treinar_modelo_ml(layouts=layouts)
+
+def processar_fila():
+    """Loop do worker: espera o debounce, executa os pedidos coalescidos e repete até esvaziar."""
+    con = conectar()
+    with con: # Pedidos de um worker que morreu voltam para a fila
+        con.execute("UPDATE pedidos SET estado = 'pendente' WHERE estado = 'executando'")
+
+    while True:
+        ultimo = con.execute("SELECT MAX(criado_em) FROM pedidos WHERE estado = 'pendente'").fetchone()[0]
+        if ultimo is None: break
+        espera = ultimo + DEBOUNCE_SEGUNDOS - time.time()
+        if espera > 0:
+            gravar_status(con, estado='aguardando', etapa=f"Aguardando novas confirmações ({int(espera)}s)")
+            time.sleep(min(espera, 5))
+            continue
+
+        with con:
+            pedidos = con.execute("SELECT id, tipo, layouts FROM pedidos WHERE estado = 'pendente'").fetchall()
+            con.executemany("UPDATE pedidos SET estado = 'executando' WHERE id = ?", [(p[0],) for p in pedidos])
+        tipo, layouts = coalescer_pedidos(pedidos)
+        print(f"Executando treinamento '{tipo}' para {len(pedidos)} pedido(s).")
+        gravar_status(con, estado='executando', tipo=tipo, layouts=layouts,
+                      inicio=datetime.now().strftime("%Y-%m-%d %H:%M:%S"), erro=None)
+        try:
+            executar_treinamento(tipo, layouts, con)
+            geracao = ler_status(con).get('geracao', 0) + 1
+            gravar_status(con, estado='ocioso', etapa="Concluído", geracao=geracao,
+                          fim=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            estado_final = 'concluido'
+        except Exception as e:
+            print(f"ERRO no treinamento: {e}")
+            gravar_status(con, estado='erro', etapa="Falhou", erro=str(e),
+                          fim=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            estado_final = 'erro'
+        with con:
+            con.executemany("UPDATE pedidos SET estado = ? WHERE id = ?", [(estado_final, p[0]) for p in pedidos])
+    con.close()
+
+def executar_worker():
+    os.chdir(DIRETORIO_ATUAL) # O treinador usa caminhos relativos à raiz do projeto
+    while True:
+        trava = TravaArquivo()
+        if not trava.tentar_adquirir():
+            print("Já existe um worker de treinamento ativo.")
+            return
+        gravar_status(worker_pid=os.getpid(), worker_sinal=time.time())
+        parar = threading.Event()
+        sinal = threading.Thread(target=manter_sinal, args=(parar,), daemon=True)
+        sinal.start()
+        try:
+            processar_fila()
+        finally:
+            parar.set()
+            sinal.join()
+            # Apaga o sinal antes de conferir a fila: um pedido feito a partir daqui dispara outro worker
+            gravar_status(worker_pid=None, worker_sinal=None)
+            trava.liberar()
+        # Um pedido pode ter chegado entre a fila esvaziar e o sinal ser apagado
+        con = conectar()
+        pendentes = con.execute("SELECT COUNT(*) FROM pedidos WHERE estado = 'pendente'").fetchone()[0]
+        con.close()
+        if not pendentes: return
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Agendador de treinamentos do identificador de layouts.")
+    parser.add_argument('--worker', action='store_true', help="Processa a fila de pedidos pendentes.")
+    parser.add_argument('--status', action='store_true', help="Mostra o estado atual do agendador.")
+    args = parser.parse_args()
+
+    if args.worker:
+        executar_worker()
+    else:
+        print(json.dumps(obter_status(), indent=4, ensure_ascii=False))
@@ -1,21 +1,18 @@
 import streamlit as st
 from identificador import (
     identificar_layout,
-    recarregar_modelo,
-    extrair_texto_do_arquivo,
+    salvar_arquivo_confirmado,
     get_layouts_mapeados,
 )
+from agendador_treinamento import solicitar_treinamento, obter_status
+from ingestao_zip import processar_zips, contar_membros, agendar_retreino
+import telemetria
+from registro_eventos import registrar_busca, registrar_acao_admin
+from github_sync import publicar_modelo, get_config
+from backup import criar_geracao, conteudo_zip, listar_geracoes, restaurar_geracao, TreinamentoEmAndamento
 import os
-import subprocess
-import time
-import sys
-import shutil
-from datetime import datetime
 from dotenv import load_dotenv
 import pandas as pd
-import csv
-import zipfile
-from io import BytesIO
 from streamlit.components.v1 import html
 
 # --- CARREGAMENTO EXPLÍCITO DE SEGREDOS ---
@@ -23,19 +20,18 @@ caminho_secrets = os.path.join(".streamlit", "secrets.toml")
 if os.path.exists(caminho_secrets):
     load_dotenv(dotenv_path=caminho_secrets)
     print("Arquivo de segredos do Streamlit carregado para o ambiente.")
+telemetria.iniciar_exportacao() # Só abre porta/arquivo se PORTA_METRICAS ou ARQUIVO_METRICAS estiverem definidos
 
 # --- Configurações Iniciais ---
-TEMP_DIR = "temp_files"
 TRAIN_DIR = "arquivos_de_treinamento"
 MAP_FILE = "mapeamento_layouts.xlsx"
 CACHE_DIR = "cache_de_texto"
-LOG_FILE = "admin_log.csv"
-SEARCH_LOG_FILE = "search_log.csv"
+CORPUS_FILE = "corpus_textos.db"
 
 # Suporte ao formato OFX e outros adicionado aqui
 EXTENSOES_SUPORTADAS = ["pdf", "xlsx", "xls", "txt", "csv", "xml", "ofx"]
 
-for folder in [TEMP_DIR, TRAIN_DIR, CACHE_DIR]:
+for folder in [TRAIN_DIR, CACHE_DIR]:
     if not os.path.exists(folder):
         os.makedirs(folder, exist_ok=True)
 
@@ -77,70 +73,41 @@ def scroll_to_element(element_id):
     """
     html(js, height=0, width=0)
 
-def log_admin_action(username, action, details):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    if not os.path.exists(LOG_FILE):
-        with open(LOG_FILE, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(["Timestamp", "Admin", "Ação", "Detalhes"])
-    with open(LOG_FILE, 'a', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow([timestamp, username, action, details])
-
-def log_search_action(filename, user_origin, user_desc, user_type, top_result_code, top_result_compat):
-    try:
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        user = os.getenv('username', 'Utilizador Anónimo')
-        if not os.path.exists(SEARCH_LOG_FILE):
-            with open(SEARCH_LOG_FILE, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow(["Timestamp", "Utilizador", "Ficheiro", "Filtro Origem", "Filtro Descrição", "Filtro Tipo", "Resultado (Layout)", "Compatibilidade"])
-        with open(SEARCH_LOG_FILE, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([timestamp, user, filename, user_origin, user_desc, user_type, top_result_code, top_result_compat])
-    except Exception as e:
-        print(f"ERRO ao escrever no log de busca: {e}")
-
-def analisar_arquivo(caminho_arquivo, sistema=None, descricao=None, tipo_relatorio=None, senha=None):
+def analisar_arquivo(conteudo_arquivo, sistema=None, descricao=None, tipo_relatorio=None, senha=None):
+    # O upload é analisado em memória; nada é gravado em disco até a confirmação
     st.session_state.resultados = identificar_layout(
-        caminho_arquivo, sistema_alvo=sistema, descricao_adicional=descricao,
-        tipo_relatorio_alvo=tipo_relatorio, senha_manual=senha
+        conteudo_arquivo, sistema_alvo=sistema, descricao_adicional=descricao,
+        tipo_relatorio_alvo=tipo_relatorio, senha_manual=senha,
+        nome_arquivo=st.session_state.nome_arquivo_original, origem='streamlit'
     )
     st.session_state.senha_incorreta = (st.session_state.resultados == "SENHA_INCORRETA")
     st.session_state.senha_necessaria = (st.session_state.resultados == "SENHA_NECESSARIA")
     st.session_state.analise_feita = True
 
-    if isinstance(st.session_state.resultados, list) and st.session_state.resultados:
-        top_res = st.session_state.resultados[0]
-        log_search_action(st.session_state.nome_arquivo_original, sistema, descricao, tipo_relatorio, top_res.get('codigo_layout'), top_res.get('compatibilidade'))
+    registrar_busca('streamlit', os.getenv('username', 'Utilizador Anónimo'), st.session_state.nome_arquivo_original,
+                    st.session_state.resultados, filtros={'sistema': sistema, 'descricao': descricao, 'tipo': tipo_relatorio},
+                    rastreio=telemetria.ultimo_rastreio())
 
 def confirmar_e_retreinar(codigo_correto):
-    if st.session_state.caminho_arquivo_temp and os.path.exists(st.session_state.caminho_arquivo_temp):
+    if st.session_state.conteudo_arquivo:
         nome_original = st.session_state.nome_arquivo_original
         admin_user = os.getenv('username', 'N/A')
-        log_admin_action(admin_user, "Confirmação de Layout", f"Arquivo '{nome_original}' -> Layout '{codigo_correto}'.")
-        timestamp = datetime.now().strftime("%Y%m%d%H:%M:%S")
-        novo_nome_base = f"{codigo_correto}_confirmed_{timestamp}_{nome_original}"
-        caminho_destino = os.path.join(TRAIN_DIR, novo_nome_base)
-        shutil.copy(st.session_state.caminho_arquivo_temp, caminho_destino)
-        
-        # Ajuste desempacotando o novo retorno (texto, foi_ocr)
-        texto_novo, _ = extrair_texto_do_arquivo(caminho_destino)
-        if texto_novo:
-            with open(os.path.join(CACHE_DIR, novo_nome_base + '.txt'), 'w', encoding='utf-8') as f:
-                f.write(texto_novo)
-        st.info(f"O layout '{codigo_correto}' foi reforçado. Iniciando retreinamento...")
-        subprocess.Popen([sys.executable, 'treinador_em_massa.py', '--retreinar-rapido'])
+        registrar_acao_admin(admin_user, "Confirmação de Layout", f"Arquivo '{nome_original}' -> Layout '{codigo_correto}'.")
+        # O texto já está no corpus desde a análise; o vetor da análise entra direto no índice
+        salvar_arquivo_confirmado(st.session_state.conteudo_arquivo, nome_original, codigo_correto)
+        # Confirmações em sequência são agrupadas em um único retreino incremental
+        solicitar_treinamento('incremental', [codigo_correto], motivo=f"Confirmação de '{nome_original}'")
+        st.info(f"O layout '{codigo_correto}' foi reforçado e já vale para as próximas buscas. O retreinamento agendado consolida a correção no modelo.")
     else:
         st.error("Nenhum arquivo válido para confirmar.")
 
 # --- Gerenciamento de Estado ---
-keys_init = ['analise_feita', 'resultados', 'senha_necessaria', 'senha_incorreta', 'caminho_arquivo_temp', 'nome_arquivo_original', 'authenticated', 'page_number', 'scroll_to_top']
+keys_init = ['analise_feita', 'resultados', 'senha_necessaria', 'senha_incorreta', 'conteudo_arquivo', 'nome_arquivo_original', 'authenticated', 'page_number', 'scroll_to_top']
 for key in keys_init:
     if key not in st.session_state:
         if key == 'page_number': st.session_state[key] = 0
         elif key in ['authenticated', 'analise_feita', 'senha_necessaria', 'senha_incorreta', 'scroll_to_top']: st.session_state[key] = False
-        else: st.session_state[key] = None if key == 'resultados' else ""
+        else: st.session_state[key] = None if key in ['resultados', 'conteudo_arquivo'] else ""
 
 # --- PAINEL DE ADMIN NA SIDEBAR ---
 st.sidebar.title("Painel de Administração")
@@ -159,33 +126,63 @@ if st.session_state.authenticated:
     with st.sidebar.expander("Treinamento em Lote (.zip)"):
         uploaded_zip = st.file_uploader("Selecione arquivos .zip", type=["zip"], accept_multiple_files=True)
         if uploaded_zip and st.button("Processar ZIPs"):
-            total = 0
-            for up_zip in uploaded_zip:
-                with zipfile.ZipFile(up_zip, "r") as z:
-                    z.extractall(TRAIN_DIR)
-                    total += len(z.namelist())
-            st.sidebar.success(f"{total} arquivos extraídos!")
-            subprocess.Popen([sys.executable, 'treinador_em_massa.py'])
+            relatorio = []
+            barra = st.progress(0.0, text="Lendo arquivos...")
+            total_membros = contar_membros(uploaded_zip)
+            for item in processar_zips(uploaded_zip):
+                relatorio.append(item)
+                barra.progress(min(1.0, len(relatorio) / max(1, total_membros)), text=f"{item['arquivo']}: {item['status']}")
+            barra.empty()
+            novos = [i for i in relatorio if str(i['status']).startswith("novo")]
+            st.sidebar.success(f"{len(novos)} arquivos novos, {len(relatorio) - len(novos)} ignorados/duplicados.")
+            st.dataframe(pd.DataFrame(relatorio), hide_index=True)
+            layouts_agendados = agendar_retreino(relatorio, {str(l.get('codigo_layout')) for l in layouts_mapeados})
+            if layouts_agendados: st.info(f"Retreino agendado para {len(layouts_agendados)} layout(s).")
 
     if st.sidebar.button("Sincronizar API e Recarregar"):
-        st.sidebar.info("Sincronizando...")
-        subprocess.Popen([sys.executable, 'treinador_em_massa.py', '--sincronizar-api'])
-        time.sleep(5)
-        if recarregar_modelo(): st.sidebar.success("Modelo atualizado!"); st.rerun()
+        solicitar_treinamento('sincronizar', motivo="Sincronização manual")
+        st.sidebar.info("Sincronização agendada; o modelo será recarregado ao concluir.")
+
+    with st.sidebar.expander("Status do Treinamento"):
+        status_treino = obter_status()
+        st.write(f"**Estado:** {status_treino['estado']} | **Pendentes:** {status_treino['pendentes']}")
+        if status_treino.get('etapa'): st.caption(status_treino['etapa'])
+        if status_treino.get('fim'): st.caption(f"Último treinamento: {status_treino['fim']} (geração {status_treino['geracao']})")
+        if status_treino.get('erro'): st.error(status_treino['erro'])
+        if st.button("Atualizar status"): st.rerun()
 
     with st.sidebar.expander("Gerir Backups"):
         if st.button("Criar Backup"):
-            assets = [MAP_FILE, 'layouts_meta.json', 'layout_embeddings.joblib', 'layout_labels.joblib', TRAIN_DIR, CACHE_DIR]
-            buf = BytesIO()
-            with zipfile.ZipFile(buf, "a", zipfile.ZIP_DEFLATED, False) as zf:
-                for asset in assets:
-                    if os.path.exists(asset):
-                        if os.path.isfile(asset): zf.write(asset)
-                        else:
-                            for r, d, f in os.walk(asset):
-                                for file in f: zf.write(os.path.join(r, file))
-            buf.seek(0)
-            st.download_button("Baixar Backup", data=buf, file_name="backup_layouts.zip")
+            with st.spinner("A criar a geração de backup..."):
+                manifesto = criar_geracao()
+            st.success(f"Geração {manifesto['geracao']}: {len(manifesto['arquivos'])} arquivos, "
+                       f"{manifesto['objetos_novos']} novos ({manifesto['bytes_novos'] / 1e6:.1f} MB).")
+            registrar_acao_admin(os.getenv('username', 'N/A'), "Backup Criado", f"Geração {manifesto['geracao']}.")
+        geracoes = listar_geracoes()
+        if geracoes:
+            # O ZIP só é montado quando o botão é clicado, e nunca fica numa pasta servida pelo site
+            st.download_button("⬇️ Baixar Backup", data=lambda geracao=geracoes[-1]: conteudo_zip(geracao), file_name=f"backup_layouts_g{geracoes[-1]:06d}.zip",
+                               mime="application/zip", on_click="ignore")
+            geracao_restaurar = st.selectbox("Geração para restaurar", list(reversed(geracoes)))
+            if st.button("Restaurar Geração"):
+                try:
+                    with st.spinner("A restaurar..."):
+                        total = restaurar_geracao(geracao_restaurar)
+                except TreinamentoEmAndamento as e:
+                    st.warning(f"{e} Tente de novo quando o treinamento terminar.")
+                else:
+                    st.cache_resource.clear()
+                    registrar_acao_admin(os.getenv('username', 'N/A'), "Backup Restaurado", f"Geração {geracao_restaurar} ({total} arquivos).")
+                    st.success(f"{total} arquivos restaurados da geração {geracao_restaurar}.")
+
+    if get_config("GITHUB_TOKEN") and st.sidebar.button("Publicar Modelo no GitHub"):
+        with st.spinner("A publicar os artefatos do modelo..."):
+            publicado = publicar_modelo()
+        if publicado:
+            registrar_acao_admin(os.getenv('username', 'N/A'), "Modelo Publicado", "Artefatos enviados ao GitHub.")
+            st.sidebar.success("Artefatos do modelo publicados no GitHub.")
+        else:
+            st.sidebar.error("Não foi possível publicar agora (treinamento em andamento ou erro no GitHub; veja o log).")
 
     if st.sidebar.button("Logout"):
         st.session_state.authenticated = False; st.rerun()
@@ -205,19 +202,17 @@ with tab1:
     
     if submitted:
         if uploaded_file:
-            caminho_arquivo = os.path.join(TEMP_DIR, uploaded_file.name)
-            with open(caminho_arquivo, "wb") as f: f.write(uploaded_file.getbuffer())
-            st.session_state.caminho_arquivo_temp, st.session_state.nome_arquivo_original = caminho_arquivo, uploaded_file.name
-            analisar_arquivo(caminho_arquivo, sistema=sistema_input, descricao=descricao_input, tipo_relatorio=tipo_relatorio_input)
-        elif st.session_state.caminho_arquivo_temp:
-            analisar_arquivo(st.session_state.caminho_arquivo_temp, sistema=sistema_input, descricao=descricao_input, tipo_relatorio=tipo_relatorio_input)
+            st.session_state.conteudo_arquivo, st.session_state.nome_arquivo_original = uploaded_file.getvalue(), uploaded_file.name
+            analisar_arquivo(st.session_state.conteudo_arquivo, sistema=sistema_input, descricao=descricao_input, tipo_relatorio=tipo_relatorio_input)
+        elif st.session_state.conteudo_arquivo:
+            analisar_arquivo(st.session_state.conteudo_arquivo, sistema=sistema_input, descricao=descricao_input, tipo_relatorio=tipo_relatorio_input)
         else: st.warning("Por favor, selecione um ficheiro.")
 
     if st.session_state.senha_necessaria:
         st.warning("🔒 O PDF está protegido por senha.")
         senha_manual = st.text_input("Digite a senha do PDF:", type="password", key="pwd_input")
         if st.button("Tentar novamente"):
-            analisar_arquivo(st.session_state.caminho_arquivo_temp, sistema=sistema_input, descricao=descricao_input, tipo_relatorio=tipo_relatorio_input, senha=senha_manual); st.rerun()
+            analisar_arquivo(st.session_state.conteudo_arquivo, sistema=sistema_input, descricao=descricao_input, tipo_relatorio=tipo_relatorio_input, senha=senha_manual); st.rerun()
     
     elif st.session_state.analise_feita:
         resultados = st.session_state.resultados
@@ -236,6 +231,7 @@ with tab1:
                             st.warning("⚠️ **Arquivo não editável:** Este PDF é uma imagem (escaneado ou salvo com Microsoft Print To PDF). O layout foi identificado via OCR, mas arquivos neste formato **não podem ser importados** no Conciliador. Solicite ao cliente o arquivo original e editável.")
                     with col_res_3:
                         if st.button("Confirmar este layout", key=f"confirm_{res['codigo_layout']}"): confirmar_e_retreinar(res['codigo_layout'])
+        elif resultados == "OCUPADO": st.warning("⏳ O servidor está processando muitos arquivos agora. Tente novamente em alguns instantes.")
         else: st.warning("Nenhum layout compatível encontrado.")
 
 # --- ABA 2: NAVEGAÇÃO (ORIGINAL RESTAURADA) ---
@@ -250,10 +246,9 @@ with tab2:
     with col_nav2: filtro_descricao = st.text_input("Filtrar por Descrição", key="nav_descricao")
     with col_nav3: filtro_tipo = st.selectbox("Filtrar por Tipo", ("Todos", "Bancário", "Financeiro"), key="nav_tipo")
     
-    layouts_filtrados = get_layouts_mapeados()
+    layouts_filtrados = get_layouts_mapeados(tipo_relatorio=None if filtro_tipo == "Todos" else filtro_tipo)
     if filtro_sistema: layouts_filtrados = [l for l in layouts_filtrados if filtro_sistema.lower() in l.get('sistema', '').lower()]
     if filtro_descricao: layouts_filtrados = [l for l in layouts_filtrados if filtro_descricao.lower() in l.get('descricao', '').lower()]
-    if filtro_tipo != "Todos": layouts_filtrados = [l for l in layouts_filtrados if l.get('tipo_relatorio') == filtro_tipo]
         
     st.write(f"**{len(layouts_filtrados)} layouts encontrados**")
     
@@ -0,0 +1,300 @@
+# Arquivo: avaliacao.py
+#
+# Avaliação offline da identificação com as amostras confirmadas pelos usuários
+# (<codigo>_confirmed_<timestamp>_<nome> em arquivos_de_treinamento), sem retreinar nem
+# passar pela interface. Textos vêm do corpus_textos e os vetores de cada documento também
+# ficam guardados lá (tipo "vetor:<codificador>:selecao<versão>"), então só documentos novos são codificados.
+# Cada amostra confirmada é pontuada contra o índice sem ela mesma (leave-one-out), com as
+# mesmas regras do identificar_layout (melhor vetor por layout, bônus, filtro de formato e
+# tipo), tudo em matrizes. Uma grade de bônus é avaliada sobre as mesmas similaridades.
+#
+# Uso:
+#   python avaliacao.py                                  # índice atual, filtros das buscas registradas
+#   python avaliacao.py --indice documentos              # um vetor por documento de treino
+#   python avaliacao.py --filtros sistema --bonus-sistema 0,10,25,40 --bonus-descricao 0,20,40
+#   python avaliacao.py --saida avaliacao.json --listar-erros 20
+
+import os
+import re
+import json
+import time
+import base64
+import argparse
+import numpy as np
+import joblib
+
+import corpus_textos
+import metadados_layouts
+import telemetria
+import identificador
+from identificador import (extrair_texto_com_cache, parametros_extracao, normalizar_extensao, palavras_relevantes,
+                           calcular_bonus, BONUS_SISTEMA_ALVO, BONUS_DESCRICAO)
+from treinador_em_massa import sincronizar_documentos_de_treinamento, parametros_validos, PASTA_PRINCIPAL_TREINAMENTO
+from registro_eventos import iterar_eventos
+from selecao_texto import selecionar_texto, texto_para_encode, orcamento_do_modelo, VERSAO_SELECAO
+
+PADRAO_CONFIRMADO = re.compile(r'^\d+_confirmed_\d+_')
+LIMIAR_MESMO_VETOR = 0.9999 # No índice do modelo, a própria amostra é reconhecida pelo vetor idêntico
+LINHAS_POR_BLOCO = 512 # Amostras por multiplicação de matrizes (limita a memória com índices grandes)
+
+# --- TEXTOS E VETORES EM CACHE ---
+
+def tipo_vetor():
+    return f"vetor:{identificador.nome_codificador_semantico()}:selecao{VERSAO_SELECAO}"
+
+def vetor_para_valor(vetor):
+    return {'vetor': base64.b64encode(np.asarray(vetor, dtype=np.float32).tobytes()).decode('ascii')}
+
+def valor_para_vetor(valor):
+    return np.frombuffer(base64.b64decode(valor['vetor']), dtype=np.float32)
+
+def carregar_documentos(mapa_layouts):
+    """[{nome, codigo, digest, formato, texto, confirmado}] dos documentos de layouts cadastrados com texto."""
+    documentos = []
+    with telemetria.etapa('textos'):
+        extracoes = corpus_textos.carregar_extracoes('texto', parametros_validos())
+        for nome_arquivo, codigo_layout, digest in sincronizar_documentos_de_treinamento():
+            if codigo_layout not in mapa_layouts: continue
+            extensao = os.path.splitext(nome_arquivo)[1].lower()
+            em_cache = extracoes.get((digest, corpus_textos.assinatura_parametros(parametros_extracao(extensao))))
+            telemetria.contar('textos_em_cache' if em_cache else 'textos_extraidos')
+            if em_cache:
+                texto = em_cache['texto']
+            else:
+                senha_extraida = re.search(r'senha[_\s-]*(\d+)', nome_arquivo, re.IGNORECASE)
+                texto, _ = extrair_texto_com_cache(os.path.join(PASTA_PRINCIPAL_TREINAMENTO, nome_arquivo),
+                                                   senha_manual=senha_extraida.group(1) if senha_extraida else None, digest=digest)
+            if not texto or texto in ["SENHA_NECESSARIA", "SENHA_INCORRETA"]: continue
+            documentos.append({'nome': nome_arquivo, 'codigo': codigo_layout, 'digest': digest, 'extensao': extensao,
+                               'formato': normalizar_extensao(extensao), 'texto': texto,
+                               'confirmado': bool(PADRAO_CONFIRMADO.match(nome_arquivo))})
+    return documentos
+
+def carregar_vetores(documentos, modelo):
+    """Matriz (documentos x dimensão) dos textos; os que faltam no corpus são codificados em lote e gravados."""
+    with telemetria.etapa('vetores'):
+        tipo = tipo_vetor()
+        em_cache = corpus_textos.carregar_extracoes(tipo, parametros_validos())
+        vetores, faltando = [None] * len(documentos), []
+        for i, doc in enumerate(documentos):
+            valor = em_cache.get((doc['digest'], corpus_textos.assinatura_parametros(parametros_extracao(doc['extensao']))))
+            if valor is not None: vetores[i] = valor_para_vetor(valor)
+            else: faltando.append(i)
+    telemetria.contar('vetores_em_cache', len(documentos) - len(faltando))
+    telemetria.contar('vetores_codificados', len(faltando))
+    if faltando:
+        with telemetria.etapa('encode'):
+            orcamento = orcamento_do_modelo(modelo())
+            novos = np.asarray(modelo().encode([selecionar_texto(documentos[i]['texto'], orcamento) for i in faltando],
+                                               show_progress_bar=True), dtype=np.float32)
+        with telemetria.etapa('vetores'):
+            corpus_textos.gravar_extracoes(tipo, [(documentos[i]['digest'], parametros_extracao(documentos[i]['extensao']), vetor_para_valor(v))
+                                                   for i, v in zip(faltando, novos)])
+            for i, v in zip(faltando, novos): vetores[i] = v
+    return np.vstack(vetores) if vetores else np.zeros((0, 0), dtype=np.float32)
+
+def normalizar_linhas(matriz):
+    matriz = np.asarray(matriz, dtype=np.float32)
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    return matriz / np.where(normas == 0, 1, normas)
+
+# --- FILTROS DAS AMOSTRAS ---
+
+def filtros_registrados():
+    """{digest: filtros} da busca mais recente de cada arquivo no log de eventos."""
+    filtros = {}
+    for evento in iterar_eventos('busca'):
+        if evento.get('digest'): filtros[evento['digest']] = evento.get('filtros') or {}
+    return filtros
+
+def filtros_das_amostras(amostras, mapa_layouts, modo):
+    """
+    'log': os filtros que o usuário usou na busca daquele arquivo (quando registrada);
+    'sistema': o sistema correto do layout, como se o usuário sempre o informasse, e a descrição do log;
+    'nenhum': sem sistema, descrição ou tipo.
+    """
+    if modo == 'nenhum': return [{} for _ in amostras]
+    registrados = filtros_registrados()
+    filtros = []
+    for amostra in amostras:
+        registro = dict(registrados.get(amostra['digest'], {}))
+        if modo == 'sistema':
+            registro = {'sistema': mapa_layouts[amostra['codigo']].get('sistema'), 'descricao': registro.get('descricao')}
+        filtros.append(registro)
+    return filtros
+
+# --- PONTUAÇÃO VETORIZADA ---
+
+def montar_indice(modo, documentos, vetores_documentos):
+    """(vetores normalizados, labels, digests ou None) do índice a avaliar."""
+    with telemetria.etapa('indice'):
+        if modo == 'modelo':
+            return normalizar_linhas(joblib.load(identificador.ARQUIVO_EMBEDDINGS)), [str(l) for l in joblib.load(identificador.ARQUIVO_LABELS)], None
+        return normalizar_linhas(vetores_documentos), [d['codigo'] for d in documentos], [d['digest'] for d in documentos]
+
+def pontuar(consultas, consultas_texto, digests_consulta, indice, labels, digests_indice, codigos):
+    """
+    Similaridade (x100) de cada consulta com o melhor vetor de cada layout em `codigos`, sem a
+    própria amostra: no índice por documento, saem os vetores do mesmo digest; no índice do
+    modelo, os vetores idênticos ao da amostra.
+    """
+    posicao = {codigo: j for j, codigo in enumerate(codigos)}
+    colunas = [i for i, label in enumerate(labels) if label in posicao]
+    ordem = sorted(colunas, key=lambda i: posicao[labels[i]])
+    grupos = np.array([posicao[labels[i]] for i in ordem])
+    inicios = np.flatnonzero(np.r_[True, grupos[1:] != grupos[:-1]]) if len(grupos) else np.array([], dtype=int)
+    indice = indice[ordem]
+    digests_ordenados = np.array([digests_indice[i] for i in ordem]) if digests_indice is not None else None
+    pontuacoes = np.full((len(consultas), len(codigos)), -np.inf, dtype=np.float32)
+    for inicio in range(0, len(consultas), LINHAS_POR_BLOCO):
+        fim = min(inicio + LINHAS_POR_BLOCO, len(consultas))
+        sims = consultas[inicio:fim] @ indice.T
+        if digests_ordenados is not None:
+            mascara = digests_ordenados[None, :] == np.array(digests_consulta[inicio:fim])[:, None]
+        else:
+            mascara = (consultas_texto[inicio:fim] @ indice.T) >= LIMIAR_MESMO_VETOR
+        sims[mascara] = -np.inf
+        if len(inicios): pontuacoes[inicio:fim, grupos[inicios]] = np.maximum.reduceat(sims, inicios, axis=1) * 100
+    return pontuacoes
+
+def matrizes_de_bonus(filtros, codigos, mapa_layouts):
+    """Componentes (amostras x layouts) dos bônus com peso 1, para combinar com qualquer peso da grade."""
+    sistema = np.zeros((len(filtros), len(codigos)), dtype=np.float32)
+    descricao = np.zeros_like(sistema)
+    por_sistema = {}
+    for i, filtro in enumerate(filtros):
+        if filtro.get('sistema'):
+            alvo = filtro['sistema']
+            if alvo not in por_sistema:
+                por_sistema[alvo] = np.array([calcular_bonus(mapa_layouts[c], alvo, None, 1, 0) for c in codigos], dtype=np.float32)
+            sistema[i] = por_sistema[alvo]
+        if filtro.get('descricao'):
+            palavras = palavras_relevantes(filtro['descricao'])
+            descricao[i] = [calcular_bonus(mapa_layouts[c], None, palavras, 0, 1) for c in codigos]
+    return sistema, descricao
+
+def mascara_de_filtros(amostras, filtros, codigos, mapa_layouts):
+    """Layouts que o identificar_layout descartaria: formato diferente do arquivo ou outro tipo de relatório."""
+    formatos = np.array([str(mapa_layouts[c].get('formato', '')).lower() for c in codigos])
+    tipos = np.array([str(mapa_layouts[c].get('tipo_relatorio', '')).lower() for c in codigos])
+    mascara = formatos[None, :] != np.array([a['formato'] for a in amostras])[:, None]
+    for i, filtro in enumerate(filtros):
+        tipo = str(filtro.get('tipo') or '').lower()
+        if tipo and tipo != 'todos': mascara[i] |= tipos != tipo
+    return mascara
+
+def acertos(pontuacoes, verdadeiros):
+    """(acerto no top-1, acerto no top-5) por amostra; layouts descartados ou ausentes contam como erro."""
+    linhas = np.arange(len(verdadeiros))
+    presentes = verdadeiros >= 0
+    alvo = np.where(presentes, pontuacoes[linhas, np.maximum(verdadeiros, 0)], -np.inf)
+    posicao = (pontuacoes > alvo[:, None]).sum(axis=1)
+    validos = presentes & np.isfinite(alvo)
+    return validos & (posicao == 0), validos & (posicao < 5)
+
+# --- EXECUÇÃO ---
+
+def avaliar(modo_indice='modelo', modo_filtros='log', grade_sistema=None, grade_descricao=None, listar_erros=0):
+    with telemetria.rastrear('avaliacao', 'lote') as rastreio:
+        with telemetria.etapa('metadados'):
+            mapa_layouts = metadados_layouts.carregar_layouts()
+        documentos = carregar_documentos(mapa_layouts)
+        amostras_idx = [i for i, d in enumerate(documentos) if d['confirmado']]
+        if not amostras_idx:
+            print("Nenhuma amostra confirmada com texto para avaliar.")
+            return None
+
+        modelo_carregado = []
+        def modelo():
+            if not modelo_carregado:
+                with telemetria.etapa('carregar_modelo'):
+                    modelo_carregado.append(identificador.carregar_modelo_semantico())
+            return modelo_carregado[0]
+
+        # Só os vetores necessários: no índice do modelo, bastam os das amostras
+        necessarios = list(range(len(documentos))) if modo_indice == 'documentos' else amostras_idx
+        vetores = carregar_vetores([documentos[i] for i in necessarios], modelo)
+        linha_de = {doc_idx: linha for linha, doc_idx in enumerate(necessarios)}
+        amostras = [documentos[i] for i in amostras_idx]
+        consultas_texto = normalizar_linhas(vetores[[linha_de[i] for i in amostras_idx]])
+
+        filtros = filtros_das_amostras(amostras, mapa_layouts, modo_filtros)
+        consultas = consultas_texto.copy()
+        com_descricao = [i for i, f in enumerate(filtros) if f.get('descricao')]
+        if com_descricao:
+            # Como na busca, a descrição entra no texto codificado
+            with telemetria.etapa('encode'):
+                orcamento = orcamento_do_modelo(modelo())
+                consultas[com_descricao] = normalizar_linhas(modelo().encode(
+                    [texto_para_encode(amostras[i]['texto'], orcamento, filtros[i]['descricao']) for i in com_descricao]))
+            telemetria.contar('consultas_com_descricao', len(com_descricao))
+
+        indice, labels, digests_indice = montar_indice(modo_indice, [documentos[i] for i in necessarios], vetores)
+        codigos = sorted(set(labels) & set(mapa_layouts))
+        posicao = {codigo: j for j, codigo in enumerate(codigos)}
+        verdadeiros = np.array([posicao.get(a['codigo'], -1) for a in amostras])
+
+        with telemetria.etapa('similaridade'):
+            similaridades = pontuar(consultas, consultas_texto, [a['digest'] for a in amostras], indice, labels, digests_indice, codigos)
+            similaridades[mascara_de_filtros(amostras, filtros, codigos, mapa_layouts)] = -np.inf
+        with telemetria.etapa('bonus'):
+            bonus_sistema, bonus_descricao = matrizes_de_bonus(filtros, codigos, mapa_layouts)
+
+        with telemetria.etapa('grade'):
+            grade = []
+            for peso_sistema in grade_sistema or [BONUS_SISTEMA_ALVO]:
+                for peso_descricao in grade_descricao or [BONUS_DESCRICAO]:
+                    top1, top5 = acertos(similaridades + peso_sistema * bonus_sistema + peso_descricao * bonus_descricao, verdadeiros)
+                    grade.append({'bonus_sistema': peso_sistema, 'bonus_descricao': peso_descricao,
+                                  'top1': round(float(top1.mean()), 4), 'top5': round(float(top5.mean()), 4)})
+            grade.sort(key=lambda r: (r['top1'], r['top5']), reverse=True)
+
+        pontuacoes_atuais = similaridades + BONUS_SISTEMA_ALVO * bonus_sistema + BONUS_DESCRICAO * bonus_descricao
+        top1, top5 = acertos(pontuacoes_atuais, verdadeiros)
+
+    por_formato = {}
+    for formato in sorted({a['formato'] for a in amostras}):
+        selecao = np.array([a['formato'] == formato for a in amostras])
+        por_formato[formato] = {'amostras': int(selecao.sum()), 'top1': round(float(top1[selecao].mean()), 4),
+                                'top5': round(float(top5[selecao].mean()), 4)}
+    resumo = rastreio.resumo()
+    relatorio = {
+        'indice': modo_indice, 'filtros': modo_filtros, 'codificador': identificador.nome_codificador_semantico(),
+        'amostras': len(amostras), 'vetores_no_indice': len(labels), 'layouts_no_indice': len(codigos),
+        'amostras_sem_layout_no_indice': int((verdadeiros < 0).sum()),
+        'atual': {'bonus_sistema': BONUS_SISTEMA_ALVO, 'bonus_descricao': BONUS_DESCRICAO,
+                  'top1': round(float(top1.mean()), 4), 'top5': round(float(top5.mean()), 4), 'por_formato': por_formato},
+        'grade': grade,
+        'duracao_ms': resumo['duracao_ms'], 'etapas_ms': resumo['etapas'], 'contadores': resumo['contadores'],
+        'similaridade_ms_por_amostra': round(resumo['etapas'].get('similaridade', 0) / len(amostras), 4),
+    }
+    if listar_erros:
+        melhores = np.argmax(pontuacoes_atuais, axis=1)
+        relatorio['erros'] = [{'arquivo': a['nome'], 'esperado': a['codigo'],
+                               'obtido': codigos[melhores[i]] if np.isfinite(pontuacoes_atuais[i, melhores[i]]) else None}
+                              for i, a in enumerate(amostras) if not top1[i]][:listar_erros]
+    return relatorio
+
+def lista_de_numeros(texto):
+    return [float(v) for v in texto.split(',') if v.strip()] if texto else None
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Avaliação leave-one-out com as amostras confirmadas.")
+    parser.add_argument('--indice', choices=['modelo', 'documentos'], default='modelo',
+                        help="'modelo': layout_embeddings.joblib atual; 'documentos': um vetor por documento de treino.")
+    parser.add_argument('--filtros', choices=['log', 'sistema', 'nenhum'], default='log',
+                        help="Filtros das consultas: os das buscas registradas, o sistema correto ou nenhum.")
+    parser.add_argument('--bonus-sistema', help=f"Pesos a testar para o bônus de sistema (atual: {BONUS_SISTEMA_ALVO}), ex: 0,10,25,40.")
+    parser.add_argument('--bonus-descricao', help=f"Pesos a testar para o bônus de descrição (atual: {BONUS_DESCRICAO}), ex: 0,20,40.")
+    parser.add_argument('--listar-erros', type=int, default=0, help="Inclui até N amostras erradas no top-1.")
+    parser.add_argument('--saida', help="Grava o relatório JSON neste arquivo.")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    relatorio = avaliar(args.indice, args.filtros, lista_de_numeros(args.bonus_sistema), lista_de_numeros(args.bonus_descricao), args.listar_erros)
+    if relatorio:
+        texto = json.dumps(relatorio, indent=4, ensure_ascii=False)
+        if args.saida:
+            with open(args.saida, 'w', encoding='utf-8') as f: f.write(texto)
+        print(texto)
+        print(f"\nAvaliação concluída em {time.perf_counter() - inicio:.1f}s.")
@@ -0,0 +1,238 @@
+# Arquivo: backup.py
+#
+# Backups incrementais endereçados por conteúdo, sempre gravados em disco em streaming.
+#   backups/objetos/<sha[:2]>/<sha>.gz  -> conteúdo de cada arquivo (um objeto por conteúdo distinto)
+#   backups/geracoes/<n>.json           -> manifesto da geração: caminho -> sha, tamanho, mtime
+# Uma nova geração só copia arquivos novos ou alterados; os demais apontam para objetos já
+# existentes. Qualquer geração pode ser exportada como ZIP (para download) ou restaurada.
+# A restauração reproduz o estado da geração: arquivos dos ativos que não estão nela são
+# removidos, e os bancos SQLite são restaurados por dentro (API de backup), sem trocar o
+# arquivo que o site e o bot mantêm aberto em modo WAL. Ela só roda com a trava do
+# treinamento (agendador_treinamento.TravaArquivo): um retreino em curso gravaria por cima.
+#
+# Uso: python backup.py --criar | --listar | --exportar N | --restaurar N
+
+import os
+import json
+import gzip
+import shutil
+import sqlite3
+import hashlib
+import zipfile
+import argparse
+import tempfile
+from datetime import datetime
+
+from agendador_treinamento import ARQUIVO_TRAVA, TravaArquivo
+
+DIRETORIO_ATUAL = os.path.dirname(os.path.abspath(__file__))
+PASTA_BACKUPS = os.path.join(DIRETORIO_ATUAL, 'backups')
+PASTA_OBJETOS = os.path.join(PASTA_BACKUPS, 'objetos')
+PASTA_GERACOES = os.path.join(PASTA_BACKUPS, 'geracoes')
+PASTA_EXPORTACOES = os.path.join(PASTA_BACKUPS, 'exportacoes')
+
+ATIVOS_BACKUP = [
+    'mapeamento_layouts.xlsx', 'layouts_meta.json', 'layout_embeddings.joblib', 'layout_labels.joblib', 'layout_indice_compacto.joblib',
+    'layout_indice_wal.jsonl', 'model_version.txt', 'corpus_textos.db', 'metadados_layouts.db', 'arquivos_de_treinamento', 'cache_de_texto',
+]
+TAMANHO_BLOCO = 1024 * 1024
+PREFIXO_EXPORTACAO = 'backup_layouts_'
+
+class TreinamentoEmAndamento(Exception):
+    """A restauração foi recusada porque o worker de treinamento está com a trava."""
+
+def listar_arquivos_dos_ativos(ativos=ATIVOS_BACKUP, base=None):
+    """Caminhos relativos (com '/') de todos os arquivos dos ativos existentes em `base`."""
+    base = base or DIRETORIO_ATUAL
+    for ativo in ativos:
+        caminho = os.path.join(base, ativo)
+        if os.path.isfile(caminho):
+            yield ativo
+        elif os.path.isdir(caminho):
+            for raiz, _, arquivos in os.walk(caminho):
+                for nome in arquivos:
+                    yield os.path.relpath(os.path.join(raiz, nome), base).replace(os.sep, '/')
+
+def caminho_objeto(sha):
+    return os.path.join(PASTA_OBJETOS, sha[:2], sha + '.gz')
+
+def hash_arquivo(caminho):
+    sha = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(TAMANHO_BLOCO), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+def armazenar_objeto(caminho, sha):
+    """Copia o arquivo comprimido para o repositório de objetos, se ainda não estiver lá."""
+    destino = caminho_objeto(sha)
+    if os.path.exists(destino): return False
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    destino_tmp = f"{destino}.{os.getpid()}.tmp"
+    with open(caminho, 'rb') as origem, gzip.open(destino_tmp, 'wb', compresslevel=6) as saida:
+        shutil.copyfileobj(origem, saida, TAMANHO_BLOCO)
+    os.replace(destino_tmp, destino)
+    return True
+
+def copia_consistente_sqlite(caminho):
+    """Bancos SQLite em modo WAL não podem ser copiados byte a byte com segurança; usa a API de backup."""
+    descritor, caminho_tmp = tempfile.mkstemp(suffix='.db')
+    os.close(descritor)
+    origem, destino = sqlite3.connect(caminho), sqlite3.connect(caminho_tmp)
+    try:
+        origem.backup(destino)
+    finally:
+        origem.close()
+        destino.close()
+    return caminho_tmp
+
+# --- GERAÇÕES ---
+
+def listar_geracoes():
+    if not os.path.exists(PASTA_GERACOES): return []
+    return sorted(int(nome[:-5]) for nome in os.listdir(PASTA_GERACOES) if nome.endswith('.json'))
+
+def carregar_manifesto(geracao):
+    with open(os.path.join(PASTA_GERACOES, f"{geracao:06d}.json"), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def criar_geracao(ativos=ATIVOS_BACKUP):
+    """
+    Cria uma nova geração. Arquivos com mesmo tamanho e mtime da geração anterior reaproveitam
+    o hash sem reler o conteúdo; só objetos novos são gravados. Retorna o manifesto.
+    """
+    os.makedirs(PASTA_GERACOES, exist_ok=True)
+    geracoes = listar_geracoes()
+    anteriores = carregar_manifesto(geracoes[-1])['arquivos'] if geracoes else {}
+    arquivos, novos, bytes_novos = {}, 0, 0
+
+    for relativo in listar_arquivos_dos_ativos(ativos):
+        caminho = os.path.join(DIRETORIO_ATUAL, relativo)
+        info = os.stat(caminho)
+        anterior = anteriores.get(relativo)
+        if relativo.endswith('.db'):
+            copia = copia_consistente_sqlite(caminho)
+            try:
+                sha = hash_arquivo(copia)
+                if armazenar_objeto(copia, sha): novos += 1; bytes_novos += os.path.getsize(copia)
+            finally:
+                os.remove(copia)
+        elif anterior and anterior['tamanho'] == info.st_size and anterior['mtime'] == info.st_mtime \
+                and os.path.exists(caminho_objeto(anterior['sha'])):
+            sha = anterior['sha']
+        else:
+            sha = hash_arquivo(caminho)
+            if armazenar_objeto(caminho, sha): novos += 1; bytes_novos += info.st_size
+        arquivos[relativo] = {'sha': sha, 'tamanho': info.st_size, 'mtime': info.st_mtime}
+
+    manifesto = {
+        'geracao': (geracoes[-1] + 1) if geracoes else 1,
+        'criado_em': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'anterior': geracoes[-1] if geracoes else None,
+        'objetos_novos': novos,
+        'bytes_novos': bytes_novos,
+        'arquivos': arquivos,
+    }
+    caminho_manifesto = os.path.join(PASTA_GERACOES, f"{manifesto['geracao']:06d}.json")
+    with open(caminho_manifesto + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, ensure_ascii=False)
+    os.replace(caminho_manifesto + '.tmp', caminho_manifesto)
+    return manifesto
+
+def exportar_zip(geracao, destino=None):
+    """Monta o ZIP da geração direto em disco, arquivo a arquivo. Retorna o caminho do ZIP."""
+    manifesto = carregar_manifesto(geracao)
+    destino = destino or os.path.join(PASTA_EXPORTACOES, f"{PREFIXO_EXPORTACAO}g{geracao:06d}.zip")
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    if os.path.exists(destino): return destino
+    with zipfile.ZipFile(destino + '.tmp', 'w', zipfile.ZIP_DEFLATED) as zf:
+        for relativo, info in manifesto['arquivos'].items():
+            with gzip.open(caminho_objeto(info['sha']), 'rb') as origem, zf.open(relativo, 'w', force_zip64=True) as saida:
+                shutil.copyfileobj(origem, saida, TAMANHO_BLOCO)
+    os.replace(destino + '.tmp', destino)
+    return destino
+
+def conteudo_zip(geracao):
+    """Bytes do ZIP da geração, para download; o arquivo montado em disco é apagado em seguida."""
+    with tempfile.TemporaryDirectory() as pasta:
+        with open(exportar_zip(geracao, os.path.join(pasta, f"{PREFIXO_EXPORTACAO}g{geracao:06d}.zip")), 'rb') as f:
+            return f.read()
+
+def limpar_exportacoes(manter=1, pasta=None):
+    """Remove ZIPs exportados antigos; as gerações e objetos continuam intactos."""
+    pasta = pasta or PASTA_EXPORTACOES
+    if not os.path.exists(pasta): return
+    zips = sorted((os.path.join(pasta, n) for n in os.listdir(pasta) if n.startswith(PREFIXO_EXPORTACAO) and n.endswith('.zip')),
+                  key=os.path.getmtime)
+    for caminho in zips[:-manter] if manter else zips:
+        os.remove(caminho)
+
+def restaurar_sqlite(sha, caminho):
+    """
+    Copia o banco da geração para dentro do banco em uso pela API de backup do SQLite. Trocar o
+    arquivo com os.replace deixaria os -wal/-shm do banco antigo ao lado do novo (e conexões
+    abertas nele); a API de backup grava pelo próprio SQLite, e as conexões veem o conteúdo restaurado.
+    """
+    descritor, caminho_tmp = tempfile.mkstemp(suffix='.db')
+    os.close(descritor)
+    try:
+        with gzip.open(caminho_objeto(sha), 'rb') as origem, open(caminho_tmp, 'wb') as saida:
+            shutil.copyfileobj(origem, saida, TAMANHO_BLOCO)
+        origem, destino = sqlite3.connect(caminho_tmp), sqlite3.connect(caminho, timeout=30)
+        try:
+            origem.backup(destino)
+        finally:
+            origem.close()
+            destino.close()
+    finally:
+        os.remove(caminho_tmp)
+
+def restaurar_geracao(geracao, destino=None, ativos=ATIVOS_BACKUP):
+    """
+    Deixa os ativos em `destino` como estavam na geração: sobrescreve os arquivos dela e remove
+    os que ela não tem (documentos de treinamento adicionados depois, log de inclusões, etc.).
+    Levanta TreinamentoEmAndamento se o worker de treinamento estiver rodando.
+    """
+    destino = destino or DIRETORIO_ATUAL
+    manifesto = carregar_manifesto(geracao)
+    trava = TravaArquivo(os.path.join(destino, os.path.basename(ARQUIVO_TRAVA)))
+    if not trava.tentar_adquirir():
+        raise TreinamentoEmAndamento(f"Há um treinamento em andamento; a geração {geracao} não foi restaurada.")
+    try:
+        for relativo, info in manifesto['arquivos'].items():
+            caminho = os.path.join(destino, *relativo.split('/'))
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            if relativo.endswith('.db'):
+                restaurar_sqlite(info['sha'], caminho)
+                continue
+            with gzip.open(caminho_objeto(info['sha']), 'rb') as origem, open(caminho + '.tmp', 'wb') as saida:
+                shutil.copyfileobj(origem, saida, TAMANHO_BLOCO)
+            os.replace(caminho + '.tmp', caminho)
+        sobras = [relativo for relativo in listar_arquivos_dos_ativos(ativos, destino) if relativo not in manifesto['arquivos']]
+        for relativo in sobras:
+            os.remove(os.path.join(destino, *relativo.split('/')))
+    finally:
+        trava.liberar()
+    if sobras: print(f"{len(sobras)} arquivos ausentes na geração {geracao} removidos.")
+    return len(manifesto['arquivos'])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Backups incrementais do identificador de layouts.")
+    parser.add_argument('--criar', action='store_true', help="Cria uma nova geração de backup.")
+    parser.add_argument('--listar', action='store_true', help="Lista as gerações existentes.")
+    parser.add_argument('--exportar', type=int, metavar='N', help="Exporta a geração N como ZIP.")
+    parser.add_argument('--restaurar', type=int, metavar='N', help="Restaura a geração N no diretório do projeto.")
+    args = parser.parse_args()
+
+    if args.criar:
+        manifesto = criar_geracao()
+        print(f"Geração {manifesto['geracao']} criada: {len(manifesto['arquivos'])} arquivos, "
+              f"{manifesto['objetos_novos']} novos ({manifesto['bytes_novos'] / 1e6:.1f} MB).")
+    elif args.exportar:
+        print(f"ZIP gerado em: {exportar_zip(args.exportar)}")
+    elif args.restaurar:
+        print(f"{restaurar_geracao(args.restaurar)} arquivos restaurados da geração {args.restaurar}.")
+    else:
+        for geracao in listar_geracoes():
+            manifesto = carregar_manifesto(geracao)
+            print(f"{geracao:6d}  {manifesto['criado_em']}  {len(manifesto['arquivos'])} arquivos  +{manifesto['objetos_novos']} objetos")
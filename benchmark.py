@@ -0,0 +1,251 @@
+# Arquivo: benchmark.py
+#
+# Benchmark reprodutível do pipeline sobre o corpus sintético (corpus_sintetico.py), rodando
+# em uma área de trabalho temporária: os arquivos do projeto (corpus, metadados, modelo)
+# não são tocados. Mede extrair_texto_do_arquivo e extrair_texto_do_cabecalho por formato e
+# tamanho, o encode, o treino completo e incremental e identificar_layout de ponta a ponta.
+# O resultado é um JSON para comparar entre commits.
+#
+# Uso:
+#   python benchmark.py --codificador leve --saida bench_atual.json
+#   python benchmark.py --comparar bench_base.json bench_atual.json
+# Com --codificador leve não é preciso baixar o modelo (ver codificador_leve.py).
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import statistics
+from datetime import datetime
+
+DIRETORIO_ATUAL = os.path.dirname(os.path.abspath(__file__))
+
+def preparar_area_de_trabalho(pasta):
+    """
+    Aponta os caminhos dos módulos para `pasta` antes de qualquer conexão ser aberta.
+    O treinador usa caminhos relativos, por isso o diretório atual também muda.
+    """
+    import corpus_textos, metadados_layouts, identificador
+    corpus_textos.ARQUIVO_CORPUS = os.path.join(pasta, 'corpus_textos.db')
+    metadados_layouts.ARQUIVO_METADADOS_DB = os.path.join(pasta, 'metadados_layouts.db')
+    metadados_layouts.ARQUIVO_METADADOS_LEGADO = os.path.join(pasta, 'layouts_meta.json')
+    identificador.ARQUIVO_EMBEDDINGS = os.path.join(pasta, 'layout_embeddings.joblib')
+    identificador.ARQUIVO_LABELS = os.path.join(pasta, 'layout_labels.joblib')
+    identificador.ARQUIVO_INDICE_COMPACTO = os.path.join(pasta, 'layout_indice_compacto.joblib')
+    identificador.ARQUIVO_INDICE_WAL = os.path.join(pasta, 'layout_indice_wal.jsonl')
+    identificador.ARQUIVO_VERSAO_MODELO = os.path.join(pasta, 'model_version.txt')
+    identificador.PASTA_TREINAMENTO = os.path.join(pasta, 'arquivos_de_treinamento')
+    os.chdir(pasta)
+
+def medir(funcao, repeticoes):
+    """Executa `funcao` `repeticoes` vezes; retorna (estatísticas em ms, último retorno)."""
+    tempos, retorno = [], None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        retorno = funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return resumir(tempos), retorno
+
+def resumir(tempos):
+    tempos = sorted(tempos)
+    return {
+        'n': len(tempos),
+        'mediana_ms': round(statistics.median(tempos), 2),
+        'p95_ms': round(tempos[min(len(tempos) - 1, int(0.95 * len(tempos)))], 2),
+        'min_ms': round(tempos[0], 2),
+    }
+
+def commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=DIRETORIO_ATUAL,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+# --- ETAPAS ---
+
+def benchmark_extracao(layouts, repeticoes, semente):
+    """Extração direta (sem cache) de um documento de cada rota em cada tamanho."""
+    from identificador import extrair_texto_do_arquivo, extrair_texto_do_cabecalho
+    from corpus_sintetico import TAMANHOS, gerar_documento, limitar_linhas
+
+    extracao, cabecalho = {}, {}
+    for layout in {l['_rota']: l for l in reversed(layouts)}.values():
+        for tamanho, linhas in TAMANHOS.items():
+            linhas = limitar_linhas(layout, linhas)
+            dados = gerar_documento(layout, linhas, f"bench-{semente}")
+            nome = f"documento{layout['_extensao']}"
+            chave = f"{layout['_rota']}/{tamanho}"
+            estatisticas, (texto, foi_ocr) = medir(lambda: extrair_texto_do_arquivo(dados, nome_arquivo=nome), repeticoes)
+            extracao[chave] = {**estatisticas, 'bytes': len(dados), 'caracteres': len(texto or ''), 'foi_ocr': foi_ocr}
+            if layout['_extensao'] == '.pdf':
+                estatisticas, texto = medir(lambda: extrair_texto_do_cabecalho(dados, nome_arquivo=nome), repeticoes)
+                cabecalho[chave] = {**estatisticas, 'caracteres': len(texto)}
+            print(f"  extração {chave:<22} {extracao[chave]['mediana_ms']:10.1f} ms")
+    return extracao, cabecalho
+
+def benchmark_encode(modelo, textos, repeticoes):
+    """Encode do texto inteiro contra o da seleção por orçamento de tokens (selecao_texto), incluindo o custo da seleção."""
+    from selecao_texto import selecionar_texto, orcamento_do_modelo, estimar_tokens
+    orcamento = orcamento_do_modelo(modelo)
+    resultados = {}
+    for tamanho, texto in textos.items():
+        estatisticas, _ = medir(lambda: modelo.encode(texto), repeticoes)
+        resultados[f"individual/{tamanho}"] = {**estatisticas, 'caracteres': len(texto)}
+        def selecionar_e_codificar():
+            selecionado = selecionar_texto(texto, orcamento)
+            modelo.encode(selecionado)
+            return selecionado
+        estatisticas, selecionado = medir(selecionar_e_codificar, repeticoes)
+        resultados[f"selecionado/{tamanho}"] = {**estatisticas, 'caracteres': len(selecionado), 'tokens_estimados': estimar_tokens(selecionado)}
+    lote = list(textos.values()) * 8
+    estatisticas, _ = medir(lambda: modelo.encode(lote), max(1, repeticoes // 2))
+    resultados[f"lote_{len(lote)}"] = estatisticas
+    estatisticas, _ = medir(lambda: modelo.encode([selecionar_texto(t, orcamento) for t in lote]), max(1, repeticoes // 2))
+    resultados[f"lote_selecionado_{len(lote)}"] = estatisticas
+    for chave, valor in resultados.items():
+        print(f"  encode {chave:<24} {valor['mediana_ms']:10.1f} ms")
+    return resultados
+
+def benchmark_treino(codigo_incremental):
+    import treinador_em_massa as treinador
+    inicio = time.perf_counter()
+    treinador.atualizar_metadados()
+    metadados_ms = (time.perf_counter() - inicio) * 1000
+    inicio = time.perf_counter()
+    treinador.treinar_modelo_ml() # Primeira vez: extrai tudo (cache frio) e codifica
+    completo_frio_ms = (time.perf_counter() - inicio) * 1000
+    inicio = time.perf_counter()
+    treinador.treinar_modelo_ml() # Textos já no corpus: mede o custo de agrupar e codificar
+    completo_quente_ms = (time.perf_counter() - inicio) * 1000
+    inicio = time.perf_counter()
+    treinador.treinar_modelo_ml(layouts=[codigo_incremental])
+    incremental_ms = (time.perf_counter() - inicio) * 1000
+    resultados = {'metadados_ms': round(metadados_ms, 1), 'completo_cache_frio_ms': round(completo_frio_ms, 1),
+                  'completo_cache_quente_ms': round(completo_quente_ms, 1), 'incremental_1_layout_ms': round(incremental_ms, 1)}
+    print(f"  treino {resultados}")
+    return resultados
+
+def benchmark_identificacao(layouts, semente):
+    """Consultas com documentos novos de cada layout: primeira passada com cache frio, segunda com cache quente."""
+    import identificador, telemetria
+    from corpus_sintetico import TAMANHOS, gerar_documento, limitar_linhas
+
+    identificador.recarregar_modelo()
+    consultas = [(layout['codigo_layout'], gerar_documento(layout, limitar_linhas(layout, TAMANHOS['medio']), f"consulta-{semente}"),
+                  f"consulta{layout['_extensao']}") for layout in layouts]
+    resultados = {}
+    for passada in ('cache_frio', 'cache_quente'):
+        tempos, etapas, acertos_top1, acertos_top5 = [], {}, 0, 0
+        for codigo, dados, nome in consultas:
+            inicio = time.perf_counter()
+            retorno = identificador.identificar_layout(dados, nome_arquivo=nome, origem='benchmark')
+            tempos.append((time.perf_counter() - inicio) * 1000)
+            codigos = [r.get('codigo_layout') for r in retorno] if isinstance(retorno, list) else []
+            acertos_top1 += codigos[:1] == [codigo]
+            acertos_top5 += codigo in codigos[:5]
+            for etapa, ms in telemetria.ultimo_rastreio().etapas.items():
+                etapas.setdefault(etapa, []).append(ms)
+        resultados[passada] = {
+            **resumir(tempos),
+            'acuracia_top1': round(acertos_top1 / len(consultas), 3),
+            'acuracia_top5': round(acertos_top5 / len(consultas), 3),
+            'etapas_mediana_ms': {etapa: round(statistics.median(v), 2) for etapa, v in sorted(etapas.items())},
+        }
+        print(f"  identificação {passada:<12} {resultados[passada]['mediana_ms']:10.1f} ms  top1={resultados[passada]['acuracia_top1']}")
+    return resultados
+
+# --- EXECUÇÃO E COMPARAÇÃO ---
+
+def executar(args):
+    os.environ['CODIFICADOR_SEMANTICO'] = args.codificador
+    area = tempfile.mkdtemp(prefix='bench_layouts_')
+    sys.path.insert(0, DIRETORIO_ATUAL)
+    try:
+        preparar_area_de_trabalho(area)
+        import metadados_layouts, identificador
+        from corpus_sintetico import TAMANHOS, gerar_corpus, gerar_documento, metadados_publicos
+
+        print(f"Gerando corpus sintético em {area}...")
+        inicio = time.perf_counter()
+        layouts, arquivos = gerar_corpus(area, args.layouts, args.amostras, args.semente)
+        geracao_ms = (time.perf_counter() - inicio) * 1000
+        metadados_layouts.gravar_layouts(metadados_publicos(layouts))
+
+        resultado = {
+            'meta': {
+                'data': datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 'commit': commit_atual(),
+                'python': platform.python_version(), 'plataforma': platform.platform(), 'cpus': os.cpu_count(),
+                'codificador': args.codificador, 'semente': args.semente, 'layouts': args.layouts,
+                'amostras_por_layout': args.amostras, 'repeticoes': args.repeticoes,
+                'arquivos_treino': len(arquivos), 'geracao_corpus_ms': round(geracao_ms, 1),
+            }
+        }
+        print("Extração:")
+        resultado['extracao'], resultado['cabecalho'] = benchmark_extracao(layouts, args.repeticoes, args.semente)
+
+        print("Encode:")
+        modelo = identificador.carregar_modelo_semantico()
+        layout_txt = next(l for l in layouts if l['_rota'] == 'txt')
+        textos = {tamanho: gerar_documento(layout_txt, linhas, 'encode').decode('utf-8').lower()
+                  for tamanho, linhas in TAMANHOS.items()}
+        resultado['encode'] = benchmark_encode(modelo, textos, args.repeticoes)
+
+        print("Treino:")
+        resultado['treino'] = benchmark_treino(layouts[0]['codigo_layout'])
+
+        print("Identificação:")
+        resultado['identificacao'] = benchmark_identificacao(layouts, args.semente)
+    finally:
+        os.chdir(DIRETORIO_ATUAL)
+        if args.manter_area: print(f"Área de trabalho mantida em {area}")
+        else: shutil.rmtree(area, ignore_errors=True)
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f: f.write(texto)
+        print(f"\nResultado gravado em {args.saida}")
+    else:
+        print(texto)
+
+def achatar(valor, prefixo=''):
+    """{'a': {'mediana_ms': 1}} -> {'a.mediana_ms': 1}, só para as métricas de tempo."""
+    if isinstance(valor, dict):
+        itens = {}
+        for chave, filho in valor.items():
+            itens.update(achatar(filho, f"{prefixo}.{chave}" if prefixo else chave))
+        return itens
+    return {prefixo: valor} if prefixo.endswith('_ms') and isinstance(valor, (int, float)) else {}
+
+def comparar(caminho_base, caminho_novo):
+    with open(caminho_base, 'r', encoding='utf-8') as f: base = json.load(f)
+    with open(caminho_novo, 'r', encoding='utf-8') as f: novo = json.load(f)
+    print(f"Base: {base['meta'].get('commit')} ({base['meta']['data']})  Novo: {novo['meta'].get('commit')} ({novo['meta']['data']})")
+    metricas_base, metricas_novo = achatar({k: v for k, v in base.items() if k != 'meta'}), achatar({k: v for k, v in novo.items() if k != 'meta'})
+    for chave in sorted(set(metricas_base) & set(metricas_novo)):
+        antes, depois = metricas_base[chave], metricas_novo[chave]
+        variacao = f"{(depois - antes) / antes * 100:+7.1f}%" if antes else "    n/a"
+        print(f"{chave:<60} {antes:12.2f} {depois:12.2f} {variacao}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark do identificador sobre um corpus sintético.")
+    parser.add_argument('--codificador', choices=['leve', 'modelo'], default='leve',
+                        help="'leve' usa o codificador substituto; 'modelo' carrega o SentenceTransformer real.")
+    parser.add_argument('--layouts', type=int, default=14)
+    parser.add_argument('--amostras', type=int, default=4, help="Documentos de treino por layout.")
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', help="Arquivo JSON de saída (padrão: imprime na tela).")
+    parser.add_argument('--manter-area', action='store_true', help="Não apaga a área de trabalho temporária.")
+    parser.add_argument('--comparar', nargs=2, metavar=('BASE', 'NOVO'), help="Compara dois resultados JSON.")
+    args = parser.parse_args()
+
+    if args.comparar:
+        comparar(*args.comparar)
+    else:
+        executar(args)
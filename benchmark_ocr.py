@@ -0,0 +1,64 @@
+# Arquivo: benchmark_ocr.py
+#
+# Compara o caminho antigo (pytesseract, um processo por imagem) com o MotorOCR
+# sobre as imagens dos PDFs de exemplo.
+# Uso: python benchmark_ocr.py [--pasta arquivos_de_treinamento] [--limite 20] [--workers 4]
+
+import os
+import io
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import fitz
+from PIL import Image
+import pytesseract
+
+from identificador import MAX_PAGINAS_PDF
+from motor_ocr import MotorOCR, IDIOMA_OCR
+
+def coletar_imagens(pasta, limite):
+    """Extrai (em memória) as imagens embutidas das primeiras páginas dos PDFs da pasta."""
+    imagens = []
+    for nome_arquivo in sorted(os.listdir(pasta)):
+        if not nome_arquivo.lower().endswith('.pdf'): continue
+        try:
+            with fitz.open(os.path.join(pasta, nome_arquivo)) as doc:
+                if doc.is_encrypted: continue
+                for i, pagina in enumerate(doc):
+                    if i >= MAX_PAGINAS_PDF: break
+                    for img_info in pagina.get_images(full=True):
+                        imagens.append(doc.extract_image(img_info[0])["image"])
+        except Exception: continue
+        if len(imagens) >= limite: break
+    return imagens[:limite]
+
+def medir(descricao, funcao, imagens, workers):
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        caracteres = sum(len(t) for t in executor.map(funcao, imagens))
+    duracao = time.perf_counter() - inicio
+    print(f"{descricao:<35} {duracao:8.2f}s  {len(imagens) / duracao:6.2f} img/s  {caracteres} caracteres")
+    return duracao
+
+def ocr_pytesseract(dados):
+    return pytesseract.image_to_string(Image.open(io.BytesIO(dados)), lang=IDIOMA_OCR)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark do OCR: pytesseract vs. MotorOCR.")
+    parser.add_argument('--pasta', default='arquivos_de_treinamento')
+    parser.add_argument('--limite', type=int, default=20, help="Número máximo de imagens.")
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    imagens = coletar_imagens(args.pasta, args.limite)
+    if not imagens:
+        print(f"Nenhuma imagem encontrada nos PDFs de '{args.pasta}'.")
+        raise SystemExit(1)
+    print(f"{len(imagens)} imagens coletadas de '{args.pasta}'.\n")
+
+    base = medir("pytesseract (sequencial)", ocr_pytesseract, imagens, 1)
+    motor = MotorOCR(max_workers=args.workers)
+    medir(f"MotorOCR/{motor.backend} (1 thread)", motor.reconhecer, imagens, 1)
+    pool = medir(f"MotorOCR/{motor.backend} ({args.workers} threads)", motor.reconhecer, imagens, args.workers)
+    motor.encerrar()
+    print(f"\nGanho em relação ao caminho atual: {base / pool:.2f}x")
@@ -1,9 +1,6 @@
 import discord
 import os
 from dotenv import load_dotenv
-import shutil
-import subprocess
-import datetime
 import asyncio
 import sys
 import multiprocessing  # <--- Necessário para o executável
@@ -15,7 +12,10 @@ caminho_env = os.path.join(caminho_script, '.env')
 load_dotenv(dotenv_path=caminho_env)
 
 # Importa as funções corrigidas (Lazy Loading)
-from identificador import identificar_layout, recarregar_modelo, extrair_texto_do_arquivo, retreinar_modelo_completo
+from identificador import identificar_layout, recarregar_modelo, extrair_texto_com_cache, salvar_arquivo_confirmado
+from agendador_treinamento import solicitar_treinamento, obter_status
+import telemetria
+from registro_eventos import registrar_busca, registrar_acao_admin
 
 # Carrega as variáveis de ambiente
 DISCORD_TOKEN = os.getenv('DISCORD_TOKEN')
@@ -24,10 +24,9 @@ TRELLO_API_TOKEN = os.getenv('TRELLO_API_TOKEN')
 TRELLO_BOARD_ID = os.getenv('TRELLO_BOARD_ID')
 
 # --- Configurações e Criação de Pastas ---
-PASTA_TEMP = 'temp_files'
 PASTA_TREINAMENTO = 'arquivos_de_treinamento'
 PASTA_CACHE = 'cache_de_texto'
-for pasta in [PASTA_TEMP, PASTA_TREINAMENTO, PASTA_CACHE]:
+for pasta in [PASTA_TREINAMENTO, PASTA_CACHE]:
     if not os.path.exists(pasta):
         os.makedirs(pasta)
 
@@ -37,15 +36,30 @@ client = discord.Client(intents=intents)
 
 EXTENSOES_SUPORTADAS = ['.pdf', '.xlsx', '.xls', '.txt', '.csv', '.xml', '.ofx']
 arquivos_recentes = {}
-treinamento_em_andamento = False
+INTERVALO_STATUS_TREINAMENTO = 10 # segundos
+TIMEOUT_AVISO_TREINAMENTO = 3600
 
 @client.event
 async def on_ready():
+    telemetria.iniciar_exportacao()
     print(f'Bot está online como {client.user}')
 
+async def avisar_conclusao_treinamento(canal, geracao_anterior):
+    """Acompanha o agendador e avisa no canal quando o retreino terminar (ou falhar)."""
+    inicio = asyncio.get_running_loop().time()
+    while asyncio.get_running_loop().time() - inicio < TIMEOUT_AVISO_TREINAMENTO:
+        await asyncio.sleep(INTERVALO_STATUS_TREINAMENTO)
+        status = await asyncio.to_thread(obter_status)
+        if status['geracao'] > geracao_anterior:
+            await asyncio.to_thread(recarregar_modelo)
+            await canal.send("🎉 **Modelo atualizado!**")
+            return
+        if status['estado'] in ('erro', 'interrompido') and not status['pendentes']:
+            await canal.send(f"❌ O treinamento falhou: {status.get('erro') or status['estado']}")
+            return
+
 @client.event
 async def on_message(message):
-    global treinamento_em_andamento
     if message.author == client.user: return
 
     msg_lower = message.content.lower()
@@ -65,38 +79,26 @@ async def on_message(message):
 
     # --- Comando de Treinamento ---
     elif msg_lower.startswith('treinar layout'):
-        if treinamento_em_andamento:
-            await message.channel.send("Já existe um treinamento em andamento.")
+        codigo_correto = message.content.split()[2]
+        if message.channel.id not in arquivos_recentes:
+            await message.channel.send("❌ Nenhum arquivo recente para treinar.")
             return
-        try:
-            codigo_correto = message.content.split()[2]
-            if message.channel.id not in arquivos_recentes:
-                await message.channel.send("❌ Nenhum arquivo recente para treinar.")
-                return
-            
-            info = arquivos_recentes[message.channel.id]
-            texto_teste, _ = extrair_texto_do_arquivo(info['caminho'], senha_manual=info.get('senha_fornecida'))
-            
-            if not texto_teste or texto_teste in ["SENHA_NECESSARIA", "SENHA_INCORRETA"]:
-                await message.channel.send("❌ Conteúdo ilegível ou protegido.")
-                return
-
-            treinamento_em_andamento = True
-            await message.channel.send(f"⚙️ Aprimorando layout `{codigo_correto}`...")
-            
-            timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-            novo_nome = f"{codigo_correto}_confirmed_{timestamp}_{info['nome']}"
-            shutil.copy(info['caminho'], os.path.join(PASTA_TREINAMENTO, novo_nome))
-            
-            with open(os.path.join(PASTA_CACHE, novo_nome + '.txt'), 'w', encoding='utf-8') as f:
-                f.write(texto_teste)
-
-            proc = await asyncio.create_subprocess_exec(sys.executable, 'treinador_em_massa.py', '--retreinar-rapido')
-            await proc.communicate()
-            recarregar_modelo()
-            await message.channel.send("🎉 **Modelo atualizado!**")
-        finally:
-            treinamento_em_andamento = False
+        
+        info = arquivos_recentes[message.channel.id]
+        texto_teste, _ = extrair_texto_com_cache(info['conteudo'], senha_manual=info.get('senha_fornecida'), nome_arquivo=info['nome'])
+        
+        if not texto_teste or texto_teste in ["SENHA_NECESSARIA", "SENHA_INCORRETA"]:
+            await message.channel.send("❌ Conteúdo ilegível ou protegido.")
+            return
+
+        # O texto já ficou no corpus e o documento entra no índice na hora; o treinador não precisa extrair de novo
+        salvar_arquivo_confirmado(info['conteudo'], info['nome'], codigo_correto, senha_manual=info.get('senha_fornecida'))
+        geracao_atual = obter_status()['geracao']
+        # O agendador junta confirmações próximas (do bot e do site) em um único retreino
+        solicitar_treinamento('incremental', [codigo_correto], motivo=f"Discord: '{info['nome']}'")
+        registrar_acao_admin(str(message.author), "Confirmação de Layout", f"Arquivo '{info['nome']}' -> Layout '{codigo_correto}'.", origem='discord')
+        await message.channel.send(f"✅ Layout `{codigo_correto}` registrado e já vale para as próximas buscas. Aviso aqui quando o retreino consolidar o modelo.")
+        asyncio.create_task(avisar_conclusao_treinamento(message.channel, geracao_atual))
         return
 
     # --- LÓGICA DE ANÁLISE ---
@@ -106,24 +108,28 @@ async def on_message(message):
                 sistema_alvo = message.content.strip()
                 msg_wait = await message.channel.send(f"⏳ Analisando `{attachment.filename}`...")
                 
-                caminho = os.path.join(PASTA_TEMP, attachment.filename)
-                await attachment.save(caminho)
-                arquivos_recentes[message.channel.id] = {'caminho': caminho, 'nome': attachment.filename}
+                # O anexo fica em memória; só vai para o disco se for confirmado para treino
+                conteudo = await attachment.read()
+                arquivos_recentes[message.channel.id] = {'conteudo': conteudo, 'nome': attachment.filename}
                 
-                resultados = identificar_layout(caminho, sistema_alvo=sistema_alvo)
+                resultados = identificar_layout(conteudo, sistema_alvo=sistema_alvo, nome_arquivo=attachment.filename, origem='discord')
                 
                 if resultados == "SENHA_NECESSARIA":
                     await msg_wait.edit(content=f"🔒 `{attachment.filename}` tem senha. Responda aqui:")
                     try:
                         senha_msg = await client.wait_for('message', timeout=60.0, check=lambda m: m.author == message.author)
-                        resultados = identificar_layout(caminho, sistema_alvo=sistema_alvo, senha_manual=senha_msg.content)
+                        resultados = identificar_layout(conteudo, sistema_alvo=sistema_alvo, senha_manual=senha_msg.content, nome_arquivo=attachment.filename, origem='discord')
                         arquivos_recentes[message.channel.id]['senha_fornecida'] = senha_msg.content
                     except asyncio.TimeoutError:
                         await msg_wait.edit(content="❌ Timeout."); return
                 
+                registrar_busca('discord', str(message.author), attachment.filename, resultados,
+                                filtros={'sistema': sistema_alvo}, rastreio=telemetria.ultimo_rastreio())
                 await msg_wait.delete()
 
-                if not resultados or isinstance(resultados, dict):
+                if resultados == "OCUPADO":
+                    await message.channel.send("⏳ Estou processando muitos arquivos agora. Envie de novo em alguns instantes.")
+                elif not resultados or isinstance(resultados, dict):
                     await message.channel.send("❌ Layout não identificado.")
                 else:
                     for res in resultados:
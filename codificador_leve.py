@@ -0,0 +1,43 @@
+# Arquivo: codificador_leve.py
+#
+# Codificador substituto para benchmarks e avaliações offline: mesma interface de
+# SentenceTransformer.encode, mas com vetores de "hashing trick" sobre palavras e bigramas,
+# sem baixar modelo nem usar GPU. Os números de acurácia não valem para o modelo real;
+# serve para medir o resto do pipeline de forma reprodutível.
+# Ativado com CODIFICADOR_SEMANTICO=leve (ver identificador.carregar_modelo_semantico).
+
+import re
+import hashlib
+import numpy as np
+
+DIMENSAO = 512 # Mesma dimensão do distiluse-base-multilingual-cased-v1
+MAX_TOKENS = 128 # Imita o truncamento do modelo real
+
+class CodificadorLeve:
+    max_seq_length = MAX_TOKENS
+
+    def __init__(self, dimensao=DIMENSAO):
+        self.dimensao = dimensao
+
+    def _indice(self, termo):
+        valor = int.from_bytes(hashlib.blake2b(termo.encode('utf-8'), digest_size=8).digest(), 'little')
+        return valor % self.dimensao, 1.0 if valor >> 63 else -1.0
+
+    def _vetor(self, texto):
+        vetor = np.zeros(self.dimensao, dtype=np.float32)
+        palavras = re.findall(r'\w+', texto.lower())[:MAX_TOKENS]
+        for termo in palavras + [f"{a} {b}" for a, b in zip(palavras, palavras[1:])]:
+            indice, sinal = self._indice(termo)
+            vetor[indice] += sinal
+        norma = np.linalg.norm(vetor)
+        return vetor / norma if norma else vetor
+
+    def encode(self, textos, convert_to_tensor=False, show_progress_bar=False, batch_size=32, **kwargs):
+        unico = isinstance(textos, str)
+        lista = [textos] if unico else list(textos)
+        vetores = np.array([self._vetor(t) for t in lista], dtype=np.float32).reshape(len(lista), self.dimensao)
+        if unico: vetores = vetores[0]
+        if convert_to_tensor:
+            import torch
+            return torch.from_numpy(vetores)
+        return vetores
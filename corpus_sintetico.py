@@ -0,0 +1,179 @@
+# Arquivo: corpus_sintetico.py
+#
+# Gera offline um corpus sintético e reprodutível (mesma semente -> mesmos arquivos) para
+# benchmarks e avaliações: PDFs com camada de texto, PDFs só imagem (página rasterizada),
+# XLSX com várias abas, CSV/TXT/OFX grandes e XML, em tamanhos crescentes.
+# Cada layout sintético tem cabeçalho, colunas e formato próprios; os arquivos seguem a
+# convenção de nome do treinamento (<codigo>_<n>.<ext>).
+#
+# Uso: python corpus_sintetico.py --destino /tmp/corpus [--layouts 12] [--amostras 4]
+
+import os
+import io
+import random
+import argparse
+from datetime import date, timedelta
+import fitz
+import pandas as pd
+
+# Linhas de movimento por tamanho (PDFs: ~45 linhas por página)
+TAMANHOS = {'pequeno': 20, 'medio': 400, 'grande': 5000}
+LINHAS_POR_PAGINA_PDF = 45
+
+BANCOS = ['SICOOB', 'BRADESCO', 'ITAU', 'SANTANDER', 'CAIXA', 'BB', 'SICREDI', 'INTER', 'NUBANK', 'SAFRA', 'BTG', 'UNICRED']
+SISTEMAS = ['DOMINIO', 'SCI', 'ALTERDATA', 'PROSOFT', 'QUESTOR', 'FORTES']
+HISTORICOS = ['PIX RECEBIDO', 'PIX ENVIADO', 'TED', 'TARIFA', 'PAGAMENTO BOLETO', 'DEPOSITO', 'SAQUE', 'RENDIMENTO',
+              'DEBITO AUTOMATICO', 'TRANSFERENCIA', 'ESTORNO', 'IOF']
+COLUNAS = [['Data', 'Histórico', 'Documento', 'Valor', 'Saldo'], ['Dt Mov', 'Descrição', 'Valor (R$)', 'D/C'],
+           ['Data Lançamento', 'Complemento', 'Nº Doc', 'Crédito', 'Débito', 'Saldo'], ['Data', 'Lançamento', 'Valor']]
+# (formato no metadados, extensão gerada, rota)
+FORMATOS = [('PDF', '.pdf', 'texto'), ('PDF', '.pdf', 'imagem'), ('EXCEL', '.xlsx', 'planilha'),
+            ('TXT', '.csv', 'csv'), ('TXT', '.txt', 'txt'), ('OFX', '.ofx', 'ofx'), ('XML', '.xml', 'xml')]
+
+def definir_layouts(quantidade, semente=42):
+    """Metadados dos layouts sintéticos, ciclando pelos formatos."""
+    aleatorio = random.Random(semente)
+    layouts = []
+    for i in range(quantidade):
+        formato, extensao, rota = FORMATOS[i % len(FORMATOS)]
+        banco = BANCOS[i % len(BANCOS)]
+        bancario = i % 3 != 2
+        descricao = f"{banco} - {'Extrato de Conta Corrente' if bancario else 'Relatório Financeiro'} {aleatorio.choice(SISTEMAS)} modelo {i + 1}"
+        layouts.append({
+            'codigo_layout': str(9000 + i), 'descricao': descricao, 'formato': formato, 'sistema': banco,
+            'tipo_relatorio': 'Bancário' if bancario else 'Financeiro',
+            '_extensao': extensao, '_rota': rota, '_colunas': COLUNAS[i % len(COLUNAS)],
+            '_titulo': f"{banco} S.A. - {'EXTRATO DE CONTA CORRENTE' if bancario else 'RELATORIO DE CONTAS A PAGAR'}",
+        })
+    return layouts
+
+def gerar_movimentos(aleatorio, linhas, colunas):
+    inicio = date(2025, 1, 1)
+    saldo = aleatorio.uniform(1000, 50000)
+    movimentos = []
+    for i in range(linhas):
+        valor = round(aleatorio.uniform(-5000, 5000), 2)
+        saldo += valor
+        valores = {
+            'data': (inicio + timedelta(days=i // 8)).strftime('%d/%m/%Y'),
+            'historico': f"{aleatorio.choice(HISTORICOS)} {aleatorio.randint(100000, 999999)}",
+            'documento': str(aleatorio.randint(1000, 99999)), 'valor': f"{valor:.2f}", 'saldo': f"{saldo:.2f}",
+        }
+        movimentos.append([valores['data'], valores['historico']] + [valores['documento'], valores['valor'], valores['saldo']][:len(colunas) - 2])
+    return movimentos
+
+def cabecalho_documento(layout, aleatorio):
+    return [layout['_titulo'], f"Agência: {aleatorio.randint(1000, 9999)}  Conta: {aleatorio.randint(10000, 99999)}-{aleatorio.randint(0, 9)}",
+            f"Cliente: EMPRESA EXEMPLO {aleatorio.randint(1, 999)} LTDA  CNPJ: {aleatorio.randint(10, 99)}.{aleatorio.randint(100, 999)}.{aleatorio.randint(100, 999)}/0001-{aleatorio.randint(10, 99)}",
+            "Período: 01/01/2025 a 31/01/2025"]
+
+# --- GERADORES POR FORMATO ---
+
+def gerar_pdf(layout, aleatorio, linhas, como_imagem=False):
+    cabecalho = cabecalho_documento(layout, aleatorio)
+    movimentos = gerar_movimentos(aleatorio, linhas, layout['_colunas'])
+    doc = fitz.open()
+    for inicio in range(0, max(1, len(movimentos)), LINHAS_POR_PAGINA_PDF):
+        pagina = doc.new_page(width=595, height=842)
+        y = 50
+        for linha in cabecalho + ["  ".join(layout['_colunas'])]:
+            pagina.insert_text((40, y), linha, fontsize=10)
+            y += 16
+        for movimento in movimentos[inicio:inicio + LINHAS_POR_PAGINA_PDF]:
+            pagina.insert_text((40, y), "   ".join(movimento), fontsize=8)
+            y += 15
+    if como_imagem:
+        # Cada página vira uma imagem única, como um documento escaneado
+        digitalizado = fitz.open()
+        for pagina in doc:
+            pix = pagina.get_pixmap(dpi=150)
+            nova = digitalizado.new_page(width=pagina.rect.width, height=pagina.rect.height)
+            nova.insert_image(nova.rect, pixmap=pix)
+        doc.close()
+        doc = digitalizado
+    dados = doc.tobytes(garbage=3, deflate=True)
+    doc.close()
+    return dados
+
+def gerar_planilha(layout, aleatorio, linhas):
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as escritor:
+        pd.DataFrame([[l] for l in cabecalho_documento(layout, aleatorio)]).to_excel(escritor, sheet_name='Resumo', index=False, header=False)
+        movimentos = gerar_movimentos(aleatorio, linhas, layout['_colunas'])
+        pd.DataFrame(movimentos, columns=layout['_colunas'][:len(movimentos[0])] if movimentos else None).to_excel(
+            escritor, sheet_name='Movimentos', index=False)
+        pd.DataFrame({'Categoria': HISTORICOS, 'Total': [round(aleatorio.uniform(0, 1e5), 2) for _ in HISTORICOS]}).to_excel(
+            escritor, sheet_name='Totais', index=False)
+    return buffer.getvalue()
+
+def gerar_texto(layout, aleatorio, linhas, separador):
+    movimentos = gerar_movimentos(aleatorio, linhas, layout['_colunas'])
+    cabecalho = cabecalho_documento(layout, aleatorio) if separador != ';' else []
+    return "\n".join(cabecalho + [separador.join(layout['_colunas'])] + [separador.join(m) for m in movimentos]).encode('utf-8')
+
+def gerar_ofx(layout, aleatorio, linhas):
+    transacoes = []
+    for movimento in gerar_movimentos(aleatorio, linhas, layout['_colunas']):
+        dia, mes, ano = movimento[0].split('/')
+        transacoes.append(f"<STMTTRN><TRNTYPE>OTHER<DTPOSTED>{ano}{mes}{dia}<TRNAMT>{movimento[-1] if len(movimento) < 4 else movimento[3]}"
+                          f"<FITID>{aleatorio.randint(10**8, 10**9)}<MEMO>{movimento[1]}</STMTTRN>")
+    return ("OFXHEADER:100\nDATA:OFXSGML\nVERSION:102\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><CURDEF>BRL"
+            f"<BANKACCTFROM><BANKID>{layout['sistema']}<ACCTID>{aleatorio.randint(10000, 99999)}</BANKACCTFROM>"
+            f"<BANKTRANLIST>{''.join(transacoes)}</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>").encode('utf-8')
+
+def gerar_xml(layout, aleatorio, linhas):
+    itens = "".join(f"<lancamento><data>{m[0]}</data><historico>{m[1]}</historico><valor>{m[-1]}</valor></lancamento>"
+                    for m in gerar_movimentos(aleatorio, linhas, layout['_colunas']))
+    return (f'<?xml version="1.0" encoding="UTF-8"?><relatorio><titulo>{layout["_titulo"]}</titulo>'
+            f"<sistema>{layout['sistema']}</sistema><lancamentos>{itens}</lancamentos></relatorio>").encode('utf-8')
+
+def gerar_documento(layout, linhas, semente):
+    """Bytes de um documento do layout com `linhas` movimentos."""
+    aleatorio = random.Random(f"{layout['codigo_layout']}-{linhas}-{semente}")
+    rota = layout['_rota']
+    if rota in ('texto', 'imagem'): return gerar_pdf(layout, aleatorio, linhas, como_imagem=rota == 'imagem')
+    if rota == 'planilha': return gerar_planilha(layout, aleatorio, linhas)
+    if rota == 'csv': return gerar_texto(layout, aleatorio, linhas, ';')
+    if rota == 'txt': return gerar_texto(layout, aleatorio, linhas, '  ')
+    if rota == 'ofx': return gerar_ofx(layout, aleatorio, linhas)
+    return gerar_xml(layout, aleatorio, linhas)
+
+def limitar_linhas(layout, linhas):
+    # PDFs só imagem grandes dominariam o tempo do benchmark com OCR de páginas que o extrator nem lê
+    if layout['_rota'] == 'imagem': return min(linhas, LINHAS_POR_PAGINA_PDF * 3)
+    return linhas
+
+def gerar_corpus(destino, quantidade_layouts=12, amostras_por_layout=4, semente=42):
+    """
+    Grava <destino>/arquivos_de_treinamento com `amostras_por_layout` documentos por layout,
+    de tamanhos alternados. Retorna (layouts, [(nome_arquivo, codigo_layout, rota, tamanho)]).
+    """
+    pasta = os.path.join(destino, 'arquivos_de_treinamento')
+    os.makedirs(pasta, exist_ok=True)
+    layouts = definir_layouts(quantidade_layouts, semente)
+    nomes_tamanho = list(TAMANHOS)
+    arquivos = []
+    for layout in layouts:
+        for n in range(amostras_por_layout):
+            tamanho = nomes_tamanho[n % 2] # Treino com pequenos e médios; os grandes ficam para o benchmark
+            linhas = limitar_linhas(layout, TAMANHOS[tamanho])
+            nome = f"{layout['codigo_layout']}_{n + 1}{layout['_extensao']}"
+            with open(os.path.join(pasta, nome), 'wb') as f:
+                f.write(gerar_documento(layout, linhas, f"{semente}-{n}"))
+            arquivos.append((nome, layout['codigo_layout'], layout['_rota'], tamanho))
+    return layouts, arquivos
+
+def metadados_publicos(layouts):
+    """Registros no formato do metadados_layouts (sem os campos internos do gerador)."""
+    return [{k: v for k, v in layout.items() if not k.startswith('_')} for layout in layouts]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Gera um corpus sintético de documentos de layouts.")
+    parser.add_argument('--destino', required=True)
+    parser.add_argument('--layouts', type=int, default=12)
+    parser.add_argument('--amostras', type=int, default=4)
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+
+    layouts, arquivos = gerar_corpus(args.destino, args.layouts, args.amostras, args.semente)
+    print(f"{len(arquivos)} arquivos de {len(layouts)} layouts gravados em '{args.destino}'.")
@@ -0,0 +1,190 @@
+# Arquivo: corpus_textos.py
+#
+# Corpus de textos empacotado em um único arquivo SQLite (corpus_textos.db), no lugar dos
+# milhares de .txt soltos em cache_de_texto/. Guarda:
+#   - extracoes: textos extraídos, comprimidos com zlib, endereçados por
+#     (digest do conteúdo, tipo de extração, assinatura dos parâmetros do extrator);
+#   - documentos: os arquivos de treinamento (nome, layout, digest, tamanho, mtime), o que
+#     permite consultar por layout ou por digest e pular o hash de arquivos que não mudaram.
+# Usado tanto pelo identificador (consultas online) quanto pelo treinador.
+
+import os
+import re
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+
+DIRETORIO_ATUAL = os.path.dirname(os.path.abspath(__file__))
+ARQUIVO_CORPUS = os.path.join(DIRETORIO_ATUAL, 'corpus_textos.db')
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS extracoes (
+    digest TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    assinatura TEXT NOT NULL,
+    dados BLOB NOT NULL,
+    criado_em REAL NOT NULL,
+    PRIMARY KEY (digest, tipo, assinatura)
+);
+CREATE TABLE IF NOT EXISTS documentos (
+    nome_arquivo TEXT PRIMARY KEY,
+    codigo_layout TEXT,
+    digest TEXT NOT NULL,
+    tamanho INTEGER,
+    mtime REAL
+);
+CREATE INDEX IF NOT EXISTS idx_documentos_layout ON documentos (codigo_layout);
+CREATE INDEX IF NOT EXISTS idx_documentos_digest ON documentos (digest);
+"""
+
+_conexoes = threading.local() # sqlite3 não compartilha conexões entre threads (sessões do Streamlit)
+
+def conectar():
+    con = getattr(_conexoes, 'con', None)
+    if con is None:
+        con = sqlite3.connect(ARQUIVO_CORPUS, timeout=30)
+        con.execute("PRAGMA journal_mode=WAL") # Leitores não bloqueiam o treinador e vice-versa
+        con.executescript(ESQUEMA)
+        _conexoes.con = con
+    return con
+
+def calcular_digest(dados):
+    return hashlib.sha256(dados).hexdigest()
+
+def assinatura_parametros(parametros):
+    return hashlib.sha256(json.dumps(parametros, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+def compactar_valor(valor):
+    return zlib.compress(json.dumps(valor, ensure_ascii=False).encode('utf-8'))
+
+def descompactar_valor(dados):
+    return json.loads(zlib.decompress(dados).decode('utf-8'))
+
+# --- EXTRAÇÕES ---
+
+def ler_extracao(digest, tipo, parametros):
+    """Retorna o dicionário gravado para o conteúdo/extrator, ou None."""
+    linha = conectar().execute(
+        "SELECT dados FROM extracoes WHERE digest = ? AND tipo = ? AND assinatura = ?",
+        (digest, tipo, assinatura_parametros(parametros))
+    ).fetchone()
+    return descompactar_valor(linha[0]) if linha else None
+
+def gravar_extracao(digest, tipo, parametros, valor):
+    con = conectar()
+    with con:
+        con.execute(
+            "INSERT OR REPLACE INTO extracoes (digest, tipo, assinatura, dados, criado_em) VALUES (?, ?, ?, ?, ?)",
+            (digest, tipo, assinatura_parametros(parametros), compactar_valor(valor), time.time())
+        )
+
+def gravar_extracoes(tipo, itens):
+    """Gravação em lote numa única transação; `itens` é [(digest, parametros, valor)]."""
+    agora = time.time()
+    con = conectar()
+    with con:
+        con.executemany(
+            "INSERT OR REPLACE INTO extracoes (digest, tipo, assinatura, dados, criado_em) VALUES (?, ?, ?, ?, ?)",
+            [(digest, tipo, assinatura_parametros(parametros), compactar_valor(valor), agora) for digest, parametros, valor in itens]
+        )
+
+def carregar_extracoes(tipo, lista_parametros):
+    """Leitura sequencial em lote: {(digest, assinatura): valor} para os extratores informados."""
+    assinaturas = sorted({assinatura_parametros(p) for p in lista_parametros})
+    if not assinaturas: return {}
+    marcadores = ",".join("?" * len(assinaturas))
+    cursor = conectar().execute(
+        f"SELECT digest, assinatura, dados FROM extracoes WHERE tipo = ? AND assinatura IN ({marcadores})",
+        [tipo] + assinaturas
+    )
+    return {(digest, assinatura): descompactar_valor(dados) for digest, assinatura, dados in cursor}
+
+# --- DOCUMENTOS DE TREINAMENTO ---
+
+def registrar_documento(nome_arquivo, codigo_layout, digest, tamanho=None, mtime=None):
+    con = conectar()
+    with con:
+        con.execute(
+            "INSERT OR REPLACE INTO documentos (nome_arquivo, codigo_layout, digest, tamanho, mtime) VALUES (?, ?, ?, ?, ?)",
+            (nome_arquivo, codigo_layout, digest, tamanho, mtime)
+        )
+
+def documentos_registrados():
+    """{nome_arquivo: (codigo_layout, digest, tamanho, mtime)} em uma única consulta."""
+    cursor = conectar().execute("SELECT nome_arquivo, codigo_layout, digest, tamanho, mtime FROM documentos")
+    return {nome: (codigo, digest, tamanho, mtime) for nome, codigo, digest, tamanho, mtime in cursor}
+
+def documentos_do_layout(codigo_layout):
+    cursor = conectar().execute("SELECT nome_arquivo, digest FROM documentos WHERE codigo_layout = ?", (str(codigo_layout),))
+    return cursor.fetchall()
+
+def documentos_por_digest(digest):
+    cursor = conectar().execute("SELECT nome_arquivo, codigo_layout FROM documentos WHERE digest = ?", (digest,))
+    return cursor.fetchall()
+
+def remover_documentos(nomes_arquivos):
+    con = conectar()
+    with con:
+        con.executemany("DELETE FROM documentos WHERE nome_arquivo = ?", [(n,) for n in nomes_arquivos])
+
+def sincronizar_pasta(pasta):
+    """
+    Percorre a pasta de treinamento e mantém a tabela de documentos em dia. Arquivos com mesmo
+    tamanho e mtime reaproveitam o digest registrado (sem reler o arquivo); os apagados saem.
+    Retorna [(nome_arquivo, codigo_layout, digest)].
+    """
+    if not os.path.exists(pasta): return []
+    registrados = documentos_registrados()
+    documentos = []
+    for nome_arquivo in os.listdir(pasta):
+        caminho_completo = os.path.join(pasta, nome_arquivo)
+        if not os.path.isfile(caminho_completo): continue
+        match = re.match(r'^(\d+)', nome_arquivo) # Só o número no INÍCIO do nome é o código do layout
+        codigo_layout = match.group(1) if match else None
+        info = os.stat(caminho_completo)
+        registro = registrados.pop(nome_arquivo, None)
+        if registro and registro[2] == info.st_size and registro[3] == info.st_mtime:
+            digest = registro[1]
+        else:
+            with open(caminho_completo, 'rb') as f:
+                digest = calcular_digest(f.read())
+            registrar_documento(nome_arquivo, codigo_layout, digest, info.st_size, info.st_mtime)
+        documentos.append((nome_arquivo, codigo_layout, digest))
+    if registrados:
+        remover_documentos(list(registrados)) # Arquivos apagados da pasta
+    return documentos
+
+# --- MANUTENÇÃO ---
+
+def compactar(lista_parametros_validos, dias_retencao_consultas=30, parametros_provisorios=()):
+    """
+    Remove extrações de versões antigas do extrator e as de arquivos consultados online
+    (sem documento de treinamento) mais velhas que `dias_retencao_consultas`; depois faz VACUUM.
+    As de `parametros_provisorios` (cache legado importado) ficam até o mesmo conteúdo ter uma
+    extração válida.
+    """
+    assinaturas = sorted({assinatura_parametros(p) for p in lista_parametros_validos})
+    provisorias = sorted({assinatura_parametros(p) for p in parametros_provisorios})
+    marcadores = ",".join("?" * len(assinaturas)) or "''"
+    marcadores_provisorias = ",".join("?" * len(provisorias)) or "''"
+    limite = time.time() - dias_retencao_consultas * 86400
+    con = conectar()
+    with con:
+        obsoletas = con.execute(
+            f"DELETE FROM extracoes WHERE assinatura NOT IN ({marcadores}) AND assinatura NOT IN ({marcadores_provisorias})",
+            assinaturas + provisorias
+        ).rowcount
+        obsoletas += con.execute(
+            f"""DELETE FROM extracoes WHERE assinatura IN ({marcadores_provisorias}) AND EXISTS (
+                    SELECT 1 FROM extracoes AS valida WHERE valida.digest = extracoes.digest
+                    AND valida.tipo = extracoes.tipo AND valida.assinatura IN ({marcadores}))""",
+            provisorias + assinaturas
+        ).rowcount
+        avulsas = con.execute(
+            "DELETE FROM extracoes WHERE criado_em < ? AND digest NOT IN (SELECT digest FROM documentos)", (limite,)
+        ).rowcount
+    con.execute("VACUUM")
+    return {'obsoletas': obsoletas, 'avulsas': avulsas}
@@ -0,0 +1,61 @@
+# Arquivo: deduplicacao.py
+#
+# Detecção de quase-duplicatas no corpus de treinamento com SimHash de 64 bits sobre
+# trigramas de palavras. O mesmo extrato salvo com outro nome ou confirmado várias vezes
+# pela interface gera assinaturas a poucos bits de distância; o treinador agrupa essas
+# amostras por layout e codifica só alguns representantes de cada layout.
+
+import re
+import hashlib
+import numpy as np
+
+BITS_SIMHASH = 64
+TAMANHO_SHINGLE = 3
+MAX_SHINGLES = 4000 # O início do documento (cabeçalho + primeiras linhas) basta para a assinatura
+DISTANCIA_MAXIMA_DUPLICATA = 6 # Bits diferentes tolerados entre quase-duplicatas
+MAX_AMOSTRAS_POR_LAYOUT = 3 # Vetores por layout no índice: um por grupo, só os grupos mais recorrentes
+
+def calcular_simhash(texto):
+    """Assinatura SimHash (int de 64 bits) do texto; textos sem palavras retornam 0."""
+    palavras = re.findall(r'[a-zà-ú]{3,}|\d+', texto.lower())
+    if not palavras: return 0
+    shingles = {" ".join(palavras[i:i + TAMANHO_SHINGLE])
+                for i in range(max(1, min(len(palavras) - TAMANHO_SHINGLE + 1, MAX_SHINGLES)))}
+    hashes = np.array([int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'little')
+                       for s in shingles], dtype=np.uint64)
+    # Matriz (n_shingles, 64) de bits; cada bit da assinatura é o voto da maioria
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+    votos = bits.sum(axis=0, dtype=np.int64) * 2 > len(hashes)
+    return int(np.packbits(votos, bitorder='little').view(np.uint64)[0])
+
+def distancia_hamming(a, b):
+    return bin(a ^ b).count('1')
+
+def agrupar_quase_duplicatas(assinaturas, distancia_maxima=DISTANCIA_MAXIMA_DUPLICATA):
+    """
+    Agrupamento guloso: cada amostra entra no primeiro grupo cujo representante está a até
+    `distancia_maxima` bits; senão abre um grupo novo. Retorna listas de índices, e o
+    primeiro índice de cada grupo é o representante.
+    """
+    grupos = []
+    for indice, assinatura in enumerate(assinaturas):
+        for grupo in grupos:
+            if distancia_hamming(assinaturas[grupo[0]], assinatura) <= distancia_maxima:
+                grupo.append(indice)
+                break
+        else:
+            grupos.append([indice])
+    return grupos
+
+def selecionar_representantes(amostras, max_amostras=MAX_AMOSTRAS_POR_LAYOUT):
+    """
+    Recebe [(nome_arquivo, texto)] de um layout e retorna (representantes, grupos):
+    até `max_amostras` amostras, uma por grupo de quase-duplicatas, priorizando os grupos
+    maiores (os formatos mais recorrentes do layout). Arquivos originais vêm antes das
+    cópias '_confirmed_' para que sejam eles os representantes.
+    """
+    ordenadas = sorted(amostras, key=lambda a: ('_confirmed_' in a[0], a[0]))
+    grupos = agrupar_quase_duplicatas([calcular_simhash(texto) for _, texto in ordenadas])
+    grupos.sort(key=len, reverse=True)
+    representantes = [ordenadas[grupo[0]] for grupo in grupos[:max_amostras]]
+    return representantes, [[ordenadas[i][0] for i in grupo] for grupo in grupos]
@@ -1,11 +1,24 @@
-from github import Github
 import os
+import base64
+import hashlib
+import requests
 import streamlit as st
 from dotenv import load_dotenv
 
+from agendador_treinamento import TravaArquivo
+
 # Tenta carregar do .env local, mas prioriza st.secrets em produção
 load_dotenv()
 
+API_GITHUB_PADRAO = "https://api.github.com"
+TIMEOUT_API = 60
+TAMANHO_BLOCO = 3 * 256 * 1024 # Múltiplo de 3: cada bloco vira base64 sem padding intermediário
+MAX_TENTATIVAS_REF = 3 # A branch pode andar entre a leitura e a atualização da ref
+DIRETORIO_ATUAL = os.path.dirname(os.path.abspath(__file__))
+# Artefatos que o site precisa para identificar sem treinar (os bancos SQLite ficam de fora)
+ARTEFATOS_MODELO = ['layout_embeddings.joblib', 'layout_labels.joblib', 'layout_indice_compacto.joblib',
+                    'model_version.txt', 'mapeamento_layouts.xlsx']
+
 def get_config(key):
     # Tenta pegar dos secrets do Streamlit, senão pega do ambiente
     try:
@@ -13,9 +26,98 @@ def get_config(key):
     except:
         return os.getenv(key)
 
+def sha_blob_git(caminho):
+    """SHA-1 que o git atribui ao conteúdo do arquivo ('blob <tamanho>\\0' + conteúdo), lido em blocos."""
+    sha = hashlib.sha1(f"blob {os.path.getsize(caminho)}\0".encode())
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(TAMANHO_BLOCO), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+class CorpoBlobBase64:
+    """
+    Corpo JSON do POST /git/blobs gerado sob demanda: o arquivo é lido e codificado em base64
+    bloco a bloco enquanto a requisição é enviada, sem carregar o binário inteiro na memória.
+    Expõe __len__ para que o requests envie Content-Length em vez de chunked.
+    """
+    PREFIXO = b'{"encoding": "base64", "content": "'
+    SUFIXO = b'"}'
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        tamanho = os.path.getsize(caminho)
+        self._tamanho = len(self.PREFIXO) + 4 * ((tamanho + 2) // 3) + len(self.SUFIXO)
+        self._partes = self._gerar()
+        self._pendente = b''
+
+    def _gerar(self):
+        yield self.PREFIXO
+        with open(self.caminho, 'rb') as f:
+            for bloco in iter(lambda: f.read(TAMANHO_BLOCO), b''):
+                yield base64.b64encode(bloco)
+        yield self.SUFIXO
+
+    def __len__(self):
+        return self._tamanho
+
+    def read(self, tamanho=-1):
+        while tamanho < 0 or len(self._pendente) < tamanho:
+            parte = next(self._partes, None)
+            if parte is None: break
+            self._pendente += parte
+        if tamanho < 0: tamanho = len(self._pendente)
+        dados, self._pendente = self._pendente[:tamanho], self._pendente[tamanho:]
+        return dados
+
+class ClienteGitData:
+    """Chamadas mínimas da API de um repositório: branch padrão e Git Data API (refs, commits, árvores e blobs)."""
+
+    def __init__(self, token, repo_name, api_url=None):
+        self.base = f"{(api_url or API_GITHUB_PADRAO).rstrip('/')}/repos/{repo_name}"
+        self.sessao = requests.Session()
+        self.sessao.headers.update({
+            'Authorization': f"Bearer {token}",
+            'Accept': 'application/vnd.github+json',
+        })
+
+    def _requisitar(self, metodo, caminho, **kwargs):
+        url = f"{self.base}/{caminho}" if caminho else self.base
+        resposta = self.sessao.request(metodo, url, timeout=TIMEOUT_API, **kwargs)
+        resposta.raise_for_status()
+        return resposta.json()
+
+    def ler_branch_padrao(self):
+        return self._requisitar('GET', '')['default_branch']
+
+    def ler_ref(self, branch):
+        return self._requisitar('GET', f"git/ref/heads/{branch}")['object']['sha']
+
+    def ler_arvore_do_commit(self, sha_commit):
+        return self._requisitar('GET', f"git/commits/{sha_commit}")['tree']['sha']
+
+    def listar_blobs(self, sha_arvore):
+        """{caminho: sha} de todos os blobs da árvore (recursiva)."""
+        arvore = self._requisitar('GET', f"git/trees/{sha_arvore}", params={'recursive': 1})
+        return {item['path']: item['sha'] for item in arvore.get('tree', []) if item.get('type') == 'blob'}
+
+    def criar_blob(self, caminho_local):
+        return self._requisitar('POST', 'git/blobs', data=CorpoBlobBase64(caminho_local),
+                                headers={'Content-Type': 'application/json'})['sha']
+
+    def criar_arvore(self, sha_arvore_base, entradas):
+        return self._requisitar('POST', 'git/trees', json={'base_tree': sha_arvore_base, 'tree': entradas})['sha']
+
+    def criar_commit(self, mensagem, sha_arvore, sha_pai):
+        return self._requisitar('POST', 'git/commits', json={'message': mensagem, 'tree': sha_arvore, 'parents': [sha_pai]})['sha']
+
+    def atualizar_ref(self, branch, sha_commit):
+        self._requisitar('PATCH', f"git/refs/heads/{branch}", json={'sha': sha_commit, 'force': False})
+
 def upload_files_to_github(file_paths, commit_message="Atualização automática de modelo via Streamlit"):
     """
-    Envia uma lista de arquivos locais para o GitHub, atualizando-os.
+    Publica os arquivos locais na raiz do repositório em um único commit, pela Git Data API.
+    O SHA de blob de cada arquivo é calculado localmente e comparado com a árvore da branch:
+    só os alterados são enviados (como blobs), e se nada mudou nenhum commit é criado.
     """
     token = get_config("GITHUB_TOKEN")
     repo_name = get_config("REPO_NAME")
@@ -26,32 +128,56 @@ def upload_files_to_github(file_paths, commit_message="Atualização automática
         return False
 
     try:
-        g = Github(token)
-        repo = g.get_repo(repo_name)
-        
-        print(f"Conectado ao repositório: {repo_name}")
-
-        for file_path in file_paths:
-            # Caminho relativo dentro do repositório
-            # Removemos o caminho absoluto para ficar apenas o nome do arquivo ou pasta relativa
-            file_name = os.path.basename(file_path)
-            
-            # Lendo o conteúdo do arquivo local (binário para suportar xlsx, joblib, etc)
-            with open(file_path, "rb") as f:
-                content = f.read()
+        cliente = ClienteGitData(token, repo_name, get_config("GITHUB_API_URL"))
+        branch = branch or cliente.ler_branch_padrao()
+        print(f"Conectado ao repositório: {repo_name} (branch {branch})")
+        locais = {os.path.basename(caminho): (caminho, sha_blob_git(caminho)) for caminho in file_paths}
+        blobs_enviados = {} # Reaproveitados se a ref andar e for preciso tentar de novo
 
-            try:
-                # Tenta pegar o arquivo existente para atualizá-lo (precisa do sha)
-                contents = repo.get_contents(file_name, ref=branch)
-                repo.update_file(contents.path, commit_message, content, contents.sha, branch=branch)
-                print(f"Arquivo ATUALIZADO no GitHub: {file_name}")
-            except Exception:
-                # Se não existe, cria um novo
-                repo.create_file(file_name, commit_message, content, branch=branch)
-                print(f"Arquivo CRIADO no GitHub: {file_name}")
+        for tentativa in range(1, MAX_TENTATIVAS_REF + 1):
+            sha_head = cliente.ler_ref(branch)
+            sha_arvore = cliente.ler_arvore_do_commit(sha_head)
+            remotos = cliente.listar_blobs(sha_arvore)
 
-        return True
+            alterados = {nome: (caminho, sha) for nome, (caminho, sha) in locais.items() if remotos.get(nome) != sha}
+            if not alterados:
+                print("Nenhum arquivo alterado; nada a publicar no GitHub.")
+                return True
+
+            entradas = []
+            for nome, (caminho, sha) in alterados.items():
+                if sha not in blobs_enviados:
+                    blobs_enviados[sha] = cliente.criar_blob(caminho)
+                    print(f"Blob enviado: {nome}")
+                entradas.append({'path': nome, 'mode': '100644', 'type': 'blob', 'sha': blobs_enviados[sha]})
+
+            sha_commit = cliente.criar_commit(commit_message, cliente.criar_arvore(sha_arvore, entradas), sha_head)
+            try:
+                cliente.atualizar_ref(branch, sha_commit)
+            except requests.HTTPError as e:
+                # 422: a branch recebeu outro commit nesse meio tempo (não é fast-forward)
+                if e.response is not None and e.response.status_code == 422 and tentativa < MAX_TENTATIVAS_REF:
+                    print("Branch atualizada por outro processo; refazendo o commit sobre o novo HEAD.")
+                    continue
+                raise
+            print(f"Commit {sha_commit[:7]} publicado com {len(alterados)} arquivo(s): {', '.join(sorted(alterados))}")
+            return True
 
     except Exception as e:
         print(f"ERRO ao enviar para o GitHub: {e}")
-        return False
\ No newline at end of file
+        return False
+
+def publicar_modelo(commit_message="Atualização automática de modelo via Streamlit"):
+    """
+    Publica os artefatos do modelo existentes. Recusa (False) enquanto um treinamento roda, para
+    não misturar embeddings de um treino com os rótulos de outro no mesmo commit.
+    """
+    trava = TravaArquivo()
+    if not trava.tentar_adquirir():
+        print("Treinamento em andamento; publicação adiada.")
+        return False
+    try:
+        caminhos = [os.path.join(DIRETORIO_ATUAL, nome) for nome in ARTEFATOS_MODELO]
+        return upload_files_to_github([c for c in caminhos if os.path.exists(c)], commit_message)
+    finally:
+        trava.liberar()
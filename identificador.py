@@ -1,87 +1,217 @@
 import os
 import fitz
 import pandas as pd
-import joblib
-import json
-from sentence_transformers import SentenceTransformer, util
+from sentence_transformers import SentenceTransformer
 import xml.etree.ElementTree as ET
-import pytesseract
 from PIL import Image
+from motor_ocr import reconhecer_texto, timeouts_ocr, OCROcupado, IDIOMA_OCR, MAX_WORKERS_OCR
+import corpus_textos
+import metadados_layouts
+import telemetria
+import indice_quantizado
+from selecao_texto import texto_para_encode, orcamento_do_modelo
+from agendador_treinamento import solicitar_treinamento
 import io
 import re
-from collections import defaultdict
+import threading
+from contextlib import contextmanager
+from collections import defaultdict, OrderedDict
 import torch
-import subprocess
-import sys
-import requests
+from datetime import datetime
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None # Sem ele, só as threads do torch são limitadas
 
 try:
     import streamlit as st
 except ImportError:
     st = None # O bot vai ignorar o streamlit se ele não existir
     
-import platform
-
-if platform.system() == "Windows":
-    pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
-# No Linux, não precisa definir o caminho se estiver no PATH
+VERSAO_EXTRATOR = 3 # Incrementar ao mudar a extração; invalida as extrações do corpus_textos
 MAX_PAGINAS_PDF = 3
-TIMEOUT_OCR_IMAGEM = 15
 AREA_CABECALHO_PERCENTUAL = 0.15 
+MIN_CARACTERES_CAMADA_TEXTO = 50 # Abaixo disso a página é tratada como sem camada de texto
+COBERTURA_PAGINA_DIGITALIZADA = 0.8 # Fração da página coberta por imagens para considerá-la escaneada
+DPI_OCR = 200
+MAX_PIXELS_LADO_OCR = 4000 # Limita a rasterização de páginas grandes (A3, plantas, etc.)
 NOME_MODELO_SEMANTICO = 'distiluse-base-multilingual-cased-v1'
+BONUS_SISTEMA_ALVO = 25 # Pontos somados quando o sistema informado pelo usuário bate com o do layout
+BONUS_DESCRICAO = 20 # Máximo somado pela fração de palavras da descrição presentes no layout
 
 # --- LÓGICA DE CAMINHOS ABSOLUTOS ---
 DIRETORIO_ATUAL = os.path.dirname(os.path.abspath(__file__))
 ARQUIVO_EMBEDDINGS = os.path.join(DIRETORIO_ATUAL, 'layout_embeddings.joblib')
 ARQUIVO_LABELS = os.path.join(DIRETORIO_ATUAL, 'layout_labels.joblib')
-ARQUIVO_METADADOS = os.path.join(DIRETORIO_ATUAL, 'layouts_meta.json')
+ARQUIVO_INDICE_COMPACTO = os.path.join(DIRETORIO_ATUAL, 'layout_indice_compacto.joblib')
+ARQUIVO_INDICE_WAL = os.path.join(DIRETORIO_ATUAL, 'layout_indice_wal.jsonl')
+PASTA_TREINAMENTO = os.path.join(DIRETORIO_ATUAL, 'arquivos_de_treinamento')
+ARQUIVO_VERSAO_MODELO = os.path.join(DIRETORIO_ATUAL, 'model_version.txt')
+
+versao_modelo_carregada = None
+MAX_VETORES_RECENTES = 64 # Vetores de busca guardados para a confirmação não codificar de novo
+_vetores_recentes = OrderedDict() # digest -> vetor da última análise sem descrição adicional
+_trava_vetores = threading.Lock()
+
+# --- GOVERNADOR DE EXECUÇÃO ---
+# Sessões do Streamlit e o bot rodam buscas em paralelo no mesmo processo. Sem limite, cada
+# encode usa todas as threads do torch/BLAS e os OCRs disputam os mesmos núcleos: a latência
+# desaba em vez de as buscas entrarem em fila. O governador limita as threads de inferência e
+# a concorrência por recurso; buscas que não conseguem vaga a tempo recebem "OCUPADO".
+# Variáveis de ambiente (lidas na primeira busca, depois do .env):
+#   THREADS_INFERENCIA   -> threads do torch/BLAS (padrão: metade dos núcleos)
+#   LIMITE_REQUISICOES   -> buscas simultâneas admitidas (padrão 4)
+#   LIMITE_ENCODE        -> encodes simultâneos (padrão 1)
+#   LIMITE_OCR           -> OCRs simultâneos (padrão MAX_WORKERS_OCR)
+#   LIMITE_RASTERIZACAO  -> páginas rasterizadas simultaneamente (padrão 2)
+#   TIMEOUT_ADMISSAO     -> segundos de espera por uma vaga de busca (padrão 20)
+#   TIMEOUT_ETAPA        -> segundos de espera por encode/OCR/rasterização (padrão 60)
+
+class SistemaOcupado(Exception):
+    def __init__(self, recurso):
+        super().__init__(f"Sem vaga para '{recurso}'.")
+        self.recurso = recurso
+
+class GovernadorExecucao:
+    def __init__(self, threads, limites, timeout_admissao, timeout_etapa):
+        self.threads = threads
+        self.limites = dict(limites)
+        self.timeouts = {recurso: (timeout_admissao if recurso == 'requisicao' else timeout_etapa) for recurso in self.limites}
+        self._semaforos = {recurso: threading.BoundedSemaphore(limite) for recurso, limite in self.limites.items()}
+        self._em_uso = defaultdict(int)
+        self._trava = threading.Lock()
+        torch.set_num_threads(threads)
+        if threadpool_limits is not None: threadpool_limits(limits=threads)
+        os.environ.setdefault('OMP_THREAD_LIMIT', '1') # O Tesseract paraleliza pelos workers, não por threads internas
 
-API_BASE_URL = "https://manager.conciliadorcontabil.com.br/api/"
+    @contextmanager
+    def vaga(self, recurso):
+        """Ocupa uma vaga do recurso; levanta SistemaOcupado se não houver vaga no timeout."""
+        semaforo = self._semaforos[recurso]
+        with telemetria.etapa(f'espera_{recurso}'):
+            obtida = semaforo.acquire(timeout=self.timeouts[recurso])
+        if not obtida:
+            telemetria.contar(f'recusas_{recurso}')
+            raise SistemaOcupado(recurso)
+        with self._trava: self._em_uso[recurso] += 1
+        try:
+            yield
+        finally:
+            with self._trava: self._em_uso[recurso] -= 1
+            semaforo.release()
+
+    def estado(self):
+        with self._trava:
+            return {recurso: {'em_uso': self._em_uso[recurso], 'limite': limite} for recurso, limite in self.limites.items()}
+
+_governador = None
+_trava_governador = threading.Lock()
+
+def configurar_governador(threads=None, limite_requisicoes=None, limite_encode=None, limite_ocr=None,
+                          limite_rasterizacao=None, timeout_admissao=None, timeout_etapa=None):
+    """(Re)cria o governador do processo; parâmetros omitidos vêm do ambiente."""
+    global _governador
+    ambiente = lambda nome, padrao: type(padrao)(os.getenv(nome) or padrao)
+    limites = {
+        'requisicao': limite_requisicoes or ambiente('LIMITE_REQUISICOES', 4),
+        'encode': limite_encode or ambiente('LIMITE_ENCODE', 1),
+        'ocr': limite_ocr or ambiente('LIMITE_OCR', MAX_WORKERS_OCR),
+        'rasterizacao': limite_rasterizacao or ambiente('LIMITE_RASTERIZACAO', 2),
+    }
+    with _trava_governador:
+        _governador = GovernadorExecucao(
+            threads or ambiente('THREADS_INFERENCIA', max(1, (os.cpu_count() or 2) // 2)), limites,
+            timeout_admissao if timeout_admissao is not None else ambiente('TIMEOUT_ADMISSAO', 20.0),
+            timeout_etapa if timeout_etapa is not None else ambiente('TIMEOUT_ETAPA', 60.0),
+        )
+    return _governador
+
+def obter_governador():
+    if _governador is None:
+        with _trava_governador:
+            if _governador is not None: return _governador
+        configurar_governador()
+    return _governador
+
+def reconhecer_texto_governado(imagem):
+    with obter_governador().vaga('ocr'):
+        try:
+            return reconhecer_texto(imagem)
+        except OCROcupado:
+            raise SistemaOcupado('ocr') # Sobe até a busca sem deixar "" no cache de extração
+
+def ler_versao_modelo():
+    try:
+        with open(ARQUIVO_VERSAO_MODELO, 'r') as f: return f.read().strip()
+    except OSError:
+        return ""
+
+def nome_codificador_semantico():
+    return 'leve' if os.getenv('CODIFICADOR_SEMANTICO') == 'leve' else NOME_MODELO_SEMANTICO
+
+def carregar_modelo_semantico():
+    """SentenceTransformer real, ou o codificador leve de benchmark com CODIFICADOR_SEMANTICO=leve."""
+    if nome_codificador_semantico() == 'leve':
+        from codificador_leve import CodificadorLeve
+        return CodificadorLeve()
+    return SentenceTransformer(NOME_MODELO_SEMANTICO)
 
 # --- FUNÇÃO DE CARREGAMENTO (LAZY LOADING PARA EVITAR LOOP) ---
+# Modelo e índice ficam em caches separados: um retreino que reescreve o log de inclusões
+# troca só o índice (recarregar_indice), sem carregar o SentenceTransformer de novo.
 @st.cache_resource
-def carregar_recursos_modelo():
-    """Carrega IA e metadados apenas quando solicitado, protegendo o servidor e o Windows."""
-    print("Iniciando carregamento de recursos do modelo...")
+def carregar_modelo_em_cache():
+    print("Iniciando carregamento do modelo semântico...")
     try:
-        modelo_semantico = SentenceTransformer(NOME_MODELO_SEMANTICO)
-        layout_embeddings = joblib.load(ARQUIVO_EMBEDDINGS)
-        layout_labels = joblib.load(ARQUIVO_LABELS)
-        
-        with open(ARQUIVO_METADADOS, 'r', encoding='utf-8') as f:
-            meta_list = json.load(f)
-            metadados_locais = {str(item['codigo_layout']): item for item in meta_list}
-        
-        metadados_finais = buscar_e_mesclar_imagens_api(metadados_locais)
-        return True, modelo_semantico, layout_embeddings, layout_labels, metadados_finais
+        return carregar_modelo_semantico()
     except Exception as e:
-        print(f"Erro ao carregar recursos: {e}")
-        return False, None, None, None, {}
+        print(f"Erro ao carregar o modelo semântico: {e}")
+        return None
 
-def buscar_e_mesclar_imagens_api(metadados_locais):
-    api_secret = None
+@st.cache_resource
+def carregar_indice_em_cache():
+    """
+    Os embeddings viram um indice_quantizado.IndiceQuantizado (compacto em memória, float32 em disco),
+    que já traz os labels e as confirmações do log de inclusões ainda não retreinadas.
+    """
+    global versao_modelo_carregada
+    print("Iniciando carregamento do índice de layouts...")
+    versao_modelo_carregada = ler_versao_modelo()
     try:
-        api_secret = st.secrets["api_secret"]
-    except:
-        api_secret = os.getenv('API_SECRET')
+        indice = indice_quantizado.carregar_indice(ARQUIVO_EMBEDDINGS, ARQUIVO_INDICE_COMPACTO, ARQUIVO_LABELS, ARQUIVO_INDICE_WAL)
+    except Exception as e:
+        print(f"Erro ao carregar o índice: {e}")
+        return None
+    threading.Thread(target=completar_previas_da_api, daemon=True).start() # Não atrasa a primeira busca
+    return indice
 
-    if not api_secret: return metadados_locais
-    
+def carregar_recursos_modelo():
+    """Carrega a IA apenas quando solicitado; os metadados vêm do metadados_layouts (snapshot próprio)."""
+    modelo_semantico, indice = carregar_modelo_em_cache(), carregar_indice_em_cache()
+    if modelo_semantico is None or indice is None: return False, None, None
+    return True, modelo_semantico, indice
+
+def completar_previas_da_api():
+    """
+    Layouts sem url_previa (importados do layouts_meta.json antes da primeira sincronização)
+    recebem a imagem do cadastro da API, como a carga do modelo fazia antes; o que vier fica
+    gravado no banco. Só consulta a API enquanto faltar alguma prévia; falhas são ignoradas.
+    """
+    sem_previa = [codigo for codigo, meta in metadados_layouts.snapshot().items() if not meta.get('url_previa')]
+    if not sem_previa: return 0
     try:
-        token_url = f"{API_BASE_URL}get-token"
-        res_token = requests.post(token_url, data={'secret': api_secret}, timeout=10)
-        token = res_token.json().get("data", {}).get("access_token")
-
-        if token:
-            headers = {'Authorization': f'Bearer {token}'}
-            res_layouts = requests.get(f"{API_BASE_URL}layouts?orderby=id,asc", headers=headers, timeout=15)
-            layouts_api = res_layouts.json().get("data", [])
-            mapa = {str(l.get('codigo')): l.get('imagem') for l in layouts_api if l.get('codigo') and l.get('imagem')}
-            for cod, meta in metadados_locais.items():
-                if cod in mapa: meta['url_previa'] = mapa[cod]
-        return metadados_locais
+        segredo = st.secrets["api_secret"]
     except Exception:
-        return metadados_locais
+        segredo = os.getenv('API_SECRET')
+    if not segredo: return 0
+    try:
+        from treinador_em_massa import buscar_layouts_api # Importação tardia: o treinador importa este módulo
+        previas = {r['codigo_layout']: r['url_previa'] for r in buscar_layouts_api(segredo) if r.get('url_previa')}
+    except Exception as e:
+        print(f"Prévias dos layouts indisponíveis na API: {e}")
+        return 0
+    return metadados_layouts.gravar_previas({codigo: previas[codigo] for codigo in sem_previa if codigo in previas})
 
 # --- FUNÇÕES DE APOIO ---
 
@@ -92,6 +222,19 @@ def normalizar_extensao(ext):
     if ext in ['txt', 'csv']: return 'txt'
     return ext # pdf, ofx, xml permanecem iguais
 
+def palavras_relevantes(texto):
+    return set(re.findall(r'\b\w{3,}\b', texto.lower()))
+
+def calcular_bonus(meta, sistema_alvo=None, palavras_descricao=None, bonus_sistema=BONUS_SISTEMA_ALVO, bonus_descricao=BONUS_DESCRICAO):
+    """Bônus de um layout: sistema informado e palavras da descrição presentes no cabeçalho/descrição do layout."""
+    bonus = 0
+    if sistema_alvo and sistema_alvo.lower() in str(meta.get('sistema','')).lower():
+        bonus += bonus_sistema
+    if palavras_descricao:
+        comuns = palavras_descricao.intersection(palavras_relevantes((meta.get('cabecalho') or '') + " " + (meta.get('descricao') or '')))
+        if comuns: bonus += (len(comuns) / len(palavras_descricao)) * bonus_descricao
+    return bonus
+
 def get_compatibilidade_label(pontuacao):
     """Retorna o rótulo de confiança baseado na pontuação semântica."""
     if pontuacao >= 85: return "Alta"
@@ -100,65 +243,166 @@ def get_compatibilidade_label(pontuacao):
 
 # --- EXTRAÇÃO DE TEXTO ---
 
-def extrair_texto_do_arquivo(caminho_arquivo, senha_manual=None):
-    """Retorna (texto, foi_ocr). Suporta PDF, Excel, OFX, XML, CSV, TXT."""
+def ler_conteudo_arquivo(arquivo):
+    """Aceita caminho, bytes ou buffer (UploadedFile, BytesIO, arquivo aberto) e retorna os bytes."""
+    if isinstance(arquivo, (bytes, bytearray)): return bytes(arquivo)
+    if isinstance(arquivo, (str, os.PathLike)):
+        with open(arquivo, 'rb') as f: return f.read()
+    if hasattr(arquivo, 'getvalue'): return arquivo.getvalue()
+    if hasattr(arquivo, 'seek'): arquivo.seek(0)
+    return arquivo.read()
+
+def nome_declarado(arquivo, nome_arquivo=None):
+    """O nome vem do upload/anexo ou, na falta dele, do caminho."""
+    return nome_arquivo or (str(arquivo) if isinstance(arquivo, (str, os.PathLike)) else getattr(arquivo, 'name', ''))
+
+def extensao_do_arquivo(arquivo, nome_arquivo=None):
+    return os.path.splitext(nome_declarado(arquivo, nome_arquivo))[1].lower()
+
+def extrair_texto_do_arquivo(arquivo, senha_manual=None, nome_arquivo=None):
+    """
+    Retorna (texto, foi_ocr). Suporta PDF, Excel, OFX, XML, CSV, TXT.
+    `arquivo` pode ser um caminho, bytes ou um buffer; nesse caso informe `nome_arquivo`
+    para que o extrator seja escolhido pela extensão declarada.
+    """
     texto_completo = ""
-    extensao = os.path.splitext(caminho_arquivo)[1].lower()
+    extensao = extensao_do_arquivo(arquivo, nome_arquivo)
     foi_ocr = False
     
     try:
+        dados = ler_conteudo_arquivo(arquivo)
         if extensao == '.pdf':
-            with fitz.open(caminho_arquivo) as doc:
-                if doc.is_encrypted:
-                    if senha_manual:
-                        if not doc.authenticate(senha_manual) > 0: return "SENHA_INCORRETA", False
-                    else:
-                        desbloqueado = False
-                        for s in ["", "123456", "0000"]:
-                            if doc.authenticate(s) > 0: desbloqueado = True; break
-                        if not desbloqueado: return "SENHA_NECESSARIA", False
-                
-                for i, pagina in enumerate(doc):
-                    if i >= MAX_PAGINAS_PDF: break
-                    texto_completo += pagina.get_text()
-                    for img_info in pagina.get_images(full=True):
-                        try:
-                            xref = img_info[0]
-                            base_image = doc.extract_image(xref)
-                            texto_completo += " " + pytesseract.image_to_string(Image.open(io.BytesIO(base_image["image"])), lang='por')
-                        except: continue
-
-                if len(texto_completo.strip()) < 50:
-                    foi_ocr = True
-                    texto_completo = ""
-                    for i, pagina in enumerate(doc):
-                        if i >= MAX_PAGINAS_PDF: break
-                        pix = pagina.get_pixmap(matrix=fitz.Matrix(2, 2))
-                        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                        texto_completo += pytesseract.image_to_string(img, lang='por')
+            with telemetria.etapa('pdf_abertura'):
+                doc = fitz.open(stream=dados, filetype='pdf')
+                erro_senha = autenticar_pdf(doc, senha_manual)
+            with doc:
+                if erro_senha: return erro_senha, False
+                texto_completo, foi_ocr = extrair_texto_das_paginas_pdf(doc)
 
         elif extensao in ['.xlsx', '.xls']:
-            for sheet in pd.ExcelFile(caminho_arquivo).sheet_names:
-                texto_completo += pd.read_excel(caminho_arquivo, sheet_name=sheet, header=None).to_string(index=False) + "\n"
+            with telemetria.etapa('leitura_excel'), pd.ExcelFile(io.BytesIO(dados)) as planilha:
+                for sheet in planilha.sheet_names:
+                    texto_completo += planilha.parse(sheet, header=None).to_string(index=False) + "\n"
         elif extensao in ['.txt', '.csv', '.ofx']:
-            with open(caminho_arquivo, 'r', encoding='utf-8', errors='ignore') as f: texto_completo = f.read()
+            with telemetria.etapa('leitura_texto'):
+                texto_completo = dados.decode('utf-8', errors='ignore')
         elif extensao == '.xml':
-            for elem in ET.parse(caminho_arquivo).getroot().iter():
-                if elem.text: texto_completo += elem.text.strip() + ' '
+            with telemetria.etapa('leitura_xml'):
+                for elem in ET.fromstring(dados).iter():
+                    if elem.text: texto_completo += elem.text.strip() + ' '
                 
+    except SistemaOcupado:
+        raise # Texto parcial não pode ir para o cache; a busca inteira responde "OCUPADO"
     except Exception as e:
         print(f"Erro na extração: {e}")
         return None, False
         
     return texto_completo.lower(), foi_ocr
 
-def extrair_texto_do_cabecalho(caminho_arquivo, senha_manual=None):
+def autenticar_pdf(doc, senha_manual=None):
+    """Retorna None se o PDF estiver legível, ou "SENHA_INCORRETA"/"SENHA_NECESSARIA"."""
+    if not doc.is_encrypted: return None
+    if senha_manual:
+        return None if doc.authenticate(senha_manual) > 0 else "SENHA_INCORRETA"
+    for s in ["", "123456", "0000"]:
+        if doc.authenticate(s) > 0: return None
+    return "SENHA_NECESSARIA"
+
+def classificar_pagina_pdf(pagina):
+    """
+    Classifica a página antes de qualquer OCR. Retorna (tipo, texto, imagens), onde tipo é:
+    'texto' (só camada de texto), 'mista' (texto + imagens embutidas, ex.: logos),
+    'digitalizada' (imagens cobrem a página inteira) ou 'vetorial' (pouco texto e nenhuma imagem
+    cobrindo a página: o conteúdo está desenhado, talvez ao lado de um logo).
+    """
+    texto = pagina.get_text()
+    imagens = pagina.get_images(full=True)
+    if len(texto.strip()) >= MIN_CARACTERES_CAMADA_TEXTO:
+        return ('mista' if imagens else 'texto'), texto, imagens
+
+    # Scanners costumam gravar a página em uma imagem única ou em faixas; soma-se a área coberta
+    area_pagina = abs(pagina.rect) or 1
+    area_coberta = 0
+    for img_info in imagens:
+        try:
+            area_coberta += sum(abs(rect & pagina.rect) for rect in pagina.get_image_rects(img_info[0]))
+        except Exception: continue
+    if imagens and area_coberta / area_pagina >= COBERTURA_PAGINA_DIGITALIZADA:
+        return 'digitalizada', texto, imagens
+    return 'vetorial', texto, imagens
+
+def calcular_zoom_ocr(pagina):
+    """Escolhe a escala de rasterização a partir do tamanho da página (DPI_OCR, limitado por MAX_PIXELS_LADO_OCR)."""
+    maior_lado = max(pagina.rect.width, pagina.rect.height) or 1
+    return max(1.0, min(DPI_OCR / 72, MAX_PIXELS_LADO_OCR / maior_lado))
+
+def extrair_texto_das_paginas_pdf(doc):
+    """Retorna (texto, foi_ocr). Cada página segue uma única rota de OCR, definida por classificar_pagina_pdf."""
+    partes = []
+    ocr_por_xref = {} # Logos repetidos em todas as páginas são reconhecidos uma vez só
+    caracteres_camada_texto = 0
+
+    def ocr_imagem_embutida(xref):
+        if xref not in ocr_por_xref:
+            telemetria.contar('imagens_ocr')
+            with telemetria.etapa('ocr_imagem_embutida'):
+                try:
+                    ocr_por_xref[xref] = reconhecer_texto_governado(doc.extract_image(xref)["image"])
+                except SistemaOcupado:
+                    raise
+                except Exception:
+                    ocr_por_xref[xref] = ""
+        return ocr_por_xref[xref]
+
+    for i, pagina in enumerate(doc):
+        if i >= MAX_PAGINAS_PDF: break
+        telemetria.contar('paginas')
+        with telemetria.etapa('camada_texto'):
+            tipo, texto, imagens = classificar_pagina_pdf(pagina)
+        caracteres_camada_texto += len(texto.strip())
+
+        if tipo == 'texto':
+            partes.append(texto)
+        elif tipo == 'mista':
+            # O texto já está na camada; só as imagens embutidas (logos, carimbos) passam pelo OCR
+            partes.append(texto + "".join(" " + ocr_imagem_embutida(img_info[0]) for img_info in imagens))
+        else:
+            # 'digitalizada' ou 'vetorial': a página renderizada já inclui as imagens embutidas
+            imagem = rasterizar_pagina(pagina)
+            if imagem is not None:
+                partes.append(ocr_pagina_rasterizada(imagem))
+            else: # Sem renderização possível, resta o OCR das imagens embutidas
+                partes.append(texto + "".join(" " + ocr_imagem_embutida(img_info[0]) for img_info in imagens))
+
+    return "".join(partes), caracteres_camada_texto < MIN_CARACTERES_CAMADA_TEXTO
+
+def rasterizar_pagina(pagina):
+    """Imagem da página para o OCR, ou None se o PyMuPDF não conseguir renderizá-la."""
+    zoom = calcular_zoom_ocr(pagina)
+    telemetria.contar('paginas_rasterizadas')
+    with telemetria.etapa('rasterizacao'), obter_governador().vaga('rasterizacao'):
+        try:
+            pix = pagina.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+            return Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+        except Exception:
+            return None
+
+def ocr_pagina_rasterizada(imagem):
+    with telemetria.etapa('ocr_rasterizado'):
+        try:
+            return reconhecer_texto_governado(imagem)
+        except SistemaOcupado:
+            raise
+        except Exception:
+            return ""
+
+def extrair_texto_do_cabecalho(arquivo, senha_manual=None, nome_arquivo=None):
     """Extrai apenas o topo das páginas para o treinador identificar bônus de sistema."""
     texto_cabecalho_bruto = ""
-    extensao = os.path.splitext(caminho_arquivo)[1].lower()
+    extensao = extensao_do_arquivo(arquivo, nome_arquivo)
     if extensao != '.pdf': return ""
     try:
-        with fitz.open(caminho_arquivo) as doc:
+        with fitz.open(stream=ler_conteudo_arquivo(arquivo), filetype='pdf') as doc:
             if doc.is_encrypted and not (doc.authenticate(senha_manual or "") > 0): return ""
             for i, pagina in enumerate(doc):
                 if i >= MAX_PAGINAS_PDF: break
@@ -167,39 +411,152 @@ def extrair_texto_do_cabecalho(caminho_arquivo, senha_manual=None):
     except Exception: return ""
     return " ".join(re.sub(r'[^a-zA-Z\s]', '', texto_cabecalho_bruto.lower()).split())
 
+# --- CACHE DE EXTRAÇÃO (ENDEREÇADO POR CONTEÚDO) ---
+
+def parametros_extracao(extensao, tipo='texto', versao=VERSAO_EXTRATOR):
+    """Tudo o que altera o texto extraído entra na chave do cache (`versao`: textos de outro extrator, ex.: cache legado)."""
+    parametros = {'versao': versao, 'extensao': extensao}
+    if extensao == '.pdf':
+        parametros.update({'max_paginas': MAX_PAGINAS_PDF, 'idioma_ocr': IDIOMA_OCR, 'dpi_ocr': DPI_OCR})
+    if tipo == 'cabecalho':
+        parametros['area_cabecalho'] = AREA_CABECALHO_PERCENTUAL
+    return parametros
+
+def extrair_texto_com_cache(arquivo, senha_manual=None, nome_arquivo=None, digest=None):
+    """Mesmo retorno de extrair_texto_do_arquivo, consultando antes o cache por conteúdo."""
+    dados = ler_conteudo_arquivo(arquivo)
+    nome = nome_declarado(arquivo, nome_arquivo)
+    digest = digest or corpus_textos.calcular_digest(dados)
+    parametros = parametros_extracao(extensao_do_arquivo(arquivo, nome_arquivo))
+    telemetria.anotar('digest', digest)
+    with telemetria.etapa('cache_extracao'):
+        em_cache = corpus_textos.ler_extracao(digest, 'texto', parametros)
+    telemetria.contar('cache_acertos' if em_cache else 'cache_falhas')
+    if em_cache: return em_cache['texto'], em_cache['foi_ocr']
+
+    timeouts = timeouts_ocr()
+    texto, foi_ocr = extrair_texto_do_arquivo(dados, senha_manual=senha_manual, nome_arquivo=nome)
+    # Uma imagem que estourou o tempo de OCR saiu vazia: o texto serve para esta busca, mas não fica no cache
+    if texto and texto not in ["SENHA_NECESSARIA", "SENHA_INCORRETA"] and timeouts_ocr() == timeouts:
+        corpus_textos.gravar_extracao(digest, 'texto', parametros, {'texto': texto, 'foi_ocr': foi_ocr})
+    return texto, foi_ocr
+
+def extrair_cabecalho_com_cache(arquivo, senha_manual=None, nome_arquivo=None, digest=None):
+    dados = ler_conteudo_arquivo(arquivo)
+    digest = digest or corpus_textos.calcular_digest(dados)
+    parametros = parametros_extracao(extensao_do_arquivo(arquivo, nome_arquivo), tipo='cabecalho')
+    em_cache = corpus_textos.ler_extracao(digest, 'cabecalho', parametros)
+    if em_cache: return em_cache['texto']
+
+    texto = extrair_texto_do_cabecalho(dados, senha_manual=senha_manual, nome_arquivo=nome_declarado(arquivo, nome_arquivo))
+    if texto: corpus_textos.gravar_extracao(digest, 'cabecalho', parametros, {'texto': texto})
+    return texto
+
+def salvar_arquivo_confirmado(conteudo, nome_original, codigo_layout, pasta_treinamento=PASTA_TREINAMENTO, senha_manual=None):
+    """
+    Grava o arquivo confirmado na pasta de treinamento, o registra no corpus e o inclui no
+    índice carregado (adicionar_ao_indice), valendo já na próxima busca.
+    O texto normalmente já está em cache desde a análise, então não há nova extração.
+    Retorna (nome_novo, texto).
+    """
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    nome_novo = f"{codigo_layout}_confirmed_{timestamp}_{nome_original}"
+    caminho_destino = os.path.join(pasta_treinamento, nome_novo)
+    with open(caminho_destino, 'wb') as f: f.write(conteudo)
+
+    digest = corpus_textos.calcular_digest(conteudo)
+    info = os.stat(caminho_destino)
+    corpus_textos.registrar_documento(nome_novo, str(codigo_layout), digest, info.st_size, info.st_mtime)
+    texto, _ = extrair_texto_com_cache(conteudo, senha_manual=senha_manual, nome_arquivo=nome_original, digest=digest)
+    if texto and texto not in ["SENHA_NECESSARIA", "SENHA_INCORRETA"]:
+        try:
+            adicionar_ao_indice(digest, texto, codigo_layout)
+        except Exception as e: # O retreino agendado ainda incorpora o arquivo
+            print(f"Erro ao incluir a confirmação no índice: {e}")
+    return nome_novo, texto
+
+def guardar_vetor_recente(digest, vetor):
+    with _trava_vetores:
+        _vetores_recentes[digest] = vetor
+        _vetores_recentes.move_to_end(digest)
+        while len(_vetores_recentes) > MAX_VETORES_RECENTES: _vetores_recentes.popitem(last=False)
+
+def adicionar_ao_indice(digest, texto, codigo_layout):
+    """
+    Inclui o documento confirmado no índice em memória e no log de inclusões, que os outros
+    processos reaplicam e o próximo retreino incorpora. O vetor da análise é reaproveitado
+    quando ainda está guardado; senão o texto é codificado uma vez, como na busca.
+    """
+    sucesso, modelo, indice = carregar_recursos_modelo()
+    if not sucesso: return False
+    with _trava_vetores:
+        vetor = _vetores_recentes.get(digest)
+    if vetor is None:
+        with obter_governador().vaga('encode'):
+            vetor = modelo.encode(texto_para_encode(texto, orcamento_do_modelo(modelo)))
+    indice_quantizado.registrar_no_wal(ARQUIVO_INDICE_WAL, digest, codigo_layout, vetor)
+    indice.adicionar([vetor], [str(codigo_layout)], [digest])
+    return True
+
 # --- FUNÇÕES PRINCIPAIS ---
 
-def identificar_layout(caminho_arquivo_cliente, sistema_alvo=None, descricao_adicional=None, tipo_relatorio_alvo=None, senha_manual=None):
+def identificar_layout(arquivo_cliente, sistema_alvo=None, descricao_adicional=None, tipo_relatorio_alvo=None, senha_manual=None, nome_arquivo=None, origem=None):
+    """
+    `arquivo_cliente` pode ser caminho, bytes ou buffer; para bytes/buffer informe `nome_arquivo`.
+    `origem` ('streamlit', 'discord', ...) rotula as métricas; o rastreio da chamada fica
+    disponível em telemetria.ultimo_rastreio(). Retorna "OCUPADO" se o governador não
+    conseguir vaga para a busca (ou para o encode/OCR dela) dentro do timeout.
+    """
+    ext_at = normalizar_extensao(extensao_do_arquivo(arquivo_cliente, nome_arquivo))
+    with telemetria.rastrear(origem, ext_at):
+        try:
+            with obter_governador().vaga('requisicao'):
+                return _identificar_layout(arquivo_cliente, ext_at, sistema_alvo, descricao_adicional, tipo_relatorio_alvo, senha_manual, nome_arquivo)
+        except SistemaOcupado as e:
+            telemetria.anotar('recurso_ocupado', e.recurso)
+            return "OCUPADO"
+
+def _identificar_layout(arquivo_cliente, ext_at, sistema_alvo, descricao_adicional, tipo_relatorio_alvo, senha_manual, nome_arquivo):
     # Carrega os recursos apenas quando necessário
-    sucesso, modelo, embeddings, labels, metadados = carregar_recursos_modelo()
+    with telemetria.etapa('carregar_modelo'):
+        recarregar_se_atualizado()
+        sucesso, modelo, indice = carregar_recursos_modelo()
     if not sucesso: return [{"erro": "IA não carregada."}]
+    metadados = metadados_layouts.snapshot()
     
-    texto, foi_ocr = extrair_texto_do_arquivo(caminho_arquivo_cliente, senha_manual=senha_manual)
+    with telemetria.etapa('extracao'):
+        dados = ler_conteudo_arquivo(arquivo_cliente)
+        digest = corpus_textos.calcular_digest(dados) # Também chave do vetor reaproveitado na confirmação
+        texto, foi_ocr = extrair_texto_com_cache(dados, senha_manual=senha_manual, nome_arquivo=nome_declarado(arquivo_cliente, nome_arquivo), digest=digest)
     if texto in ["SENHA_NECESSARIA", "SENHA_INCORRETA"]: return texto
     if not texto: return [{"erro": "Arquivo ilegível."}]
+    telemetria.contar('caracteres', len(texto))
     
-    # Geração do Embedding da busca
-    query_emb = modelo.encode(texto + " " + (descricao_adicional or ""), convert_to_tensor=True)
-    sims = util.pytorch_cos_sim(query_emb, embeddings)[0].cpu().tolist()
+    # Geração do Embedding da busca, só com o que cabe no orçamento de tokens do modelo
+    with telemetria.etapa('selecao_texto'):
+        entrada = texto_para_encode(texto, orcamento_do_modelo(modelo), descricao_adicional)
+    with obter_governador().vaga('encode'), telemetria.etapa('encode'):
+        query_emb = modelo.encode(entrada)
+    if not descricao_adicional: guardar_vetor_recente(digest, query_emb) # Mesmo vetor que o treino geraria
+    with telemetria.etapa('similaridade'):
+        # Pontuação no índice compacto; os melhores candidatos são recalculados em float32
+        sims, labels = indice.buscar(query_emb)
+        sims = sims.tolist()
 
-    res_brutos = []
-    for i, score in enumerate(sims):
-        res_brutos.append({"codigo_layout": labels[i], "pontuacao": score * 100})
+        # O índice tem um vetor por amostra representativa; cada layout fica com a melhor delas
+        melhores = {}
+        for i, score in enumerate(sims):
+            if score > melhores.get(labels[i], -1): melhores[labels[i]] = score
+        res_brutos = [{"codigo_layout": codigo, "pontuacao": score * 100} for codigo, score in melhores.items()]
     
     # Aplicação de Bônus (Sistema Alvo e Descrição)
-    for res in res_brutos:
-        meta = metadados.get(res['codigo_layout'])
-        if meta:
-            if sistema_alvo and sistema_alvo.lower() in str(meta.get('sistema','')).lower(): 
-                res['pontuacao'] += 25
-            if descricao_adicional:
-                palavras = set(re.findall(r'\b\w{3,}\b', descricao_adicional.lower()))
-                texto_meta = (meta.get('cabecalho','') + " " + meta.get('descricao','')).lower()
-                comuns = palavras.intersection(set(re.findall(r'\b\w{3,}\b', texto_meta)))
-                if comuns: res['pontuacao'] += (len(comuns) / len(palavras)) * 20
+    with telemetria.etapa('bonus'):
+        palavras_descricao = palavras_relevantes(descricao_adicional) if descricao_adicional else None
+        for res in res_brutos:
+            meta = metadados.get(res['codigo_layout'])
+            if meta: res['pontuacao'] += calcular_bonus(meta, sistema_alvo, palavras_descricao)
 
     # Filtro por Formato e Tipo de Relatório
-    ext_at = normalizar_extensao(os.path.splitext(caminho_arquivo_cliente)[1])
     filtrados = []
     
     for r in sorted(res_brutos, key=lambda x: x['pontuacao'], reverse=True):
@@ -221,16 +578,43 @@ def identificar_layout(caminho_arquivo_cliente, sistema_alvo=None, descricao_adi
                 
     return filtrados[:5]
 
-def get_layouts_mapeados():
-    sucesso, _, _, _, metadados = carregar_recursos_modelo()
-    return list(metadados.values()) if sucesso else []
+def get_layouts_mapeados(tipo_relatorio=None, formato=None):
+    """Layouts cadastrados, opcionalmente filtrados pelos campos indexados do metadados_layouts."""
+    if tipo_relatorio or formato:
+        return metadados_layouts.consultar_layouts(formato=formato, tipo_relatorio=tipo_relatorio)
+    return list(metadados_layouts.snapshot().values())
 
 def recarregar_modelo():
-    carregar_recursos_modelo.clear()
+    carregar_modelo_em_cache.clear()
+    carregar_indice_em_cache.clear()
+    with _trava_vetores:
+        _vetores_recentes.clear() # Vetores do modelo anterior
     return carregar_recursos_modelo()[0]
 
+def recarregar_indice():
+    """Só índice e labels; o modelo semântico (e os vetores recentes que ele gerou) continuam valendo."""
+    carregar_indice_em_cache.clear()
+    return carregar_recursos_modelo()[0]
+
+def recarregar_se_atualizado():
+    """
+    Recarrega quando um treinamento concluído pelo agendador grava uma nova model_version.txt.
+    Senão, aplica as confirmações que outros processos gravaram no log de inclusões; se um
+    retreino o reescreveu (compactação), recarrega só o índice.
+    """
+    if versao_modelo_carregada is None: return False
+    if ler_versao_modelo() != versao_modelo_carregada:
+        print("Nova versão do modelo detectada. Recarregando...")
+        return recarregar_modelo()
+    sucesso, _, indice = carregar_recursos_modelo()
+    if sucesso and not indice.aplicar_wal(ARQUIVO_INDICE_WAL):
+        print("Log de inclusões reescrito por um retreino. Recarregando o índice...")
+        return recarregar_indice()
+    return False
+
 def retreinar_modelo_completo():
+    """Agenda o fluxo completo; o agendador garante uma única execução por vez."""
     try:
-        subprocess.run([sys.executable, 'treinador_em_massa.py'], check=True)
+        solicitar_treinamento('completo', motivo="retreinar_modelo_completo")
         return True
-    except: return False
\ No newline at end of file
+    except Exception: return False
\ No newline at end of file
@@ -0,0 +1,448 @@
+# Arquivo: indice_quantizado.py
+#
+# Índice de embeddings em precisão reduzida. Os vetores são normalizados no treino (cosseno
+# vira produto escalar) e guardados em int8 (com uma escala por vetor) ou float16 em
+# layout_indice_compacto.joblib. Na busca, todos os vetores são pontuados no próprio tipo
+# compacto (int8: consulta também em int8 e np.matmul acumulando em int32; float16: produto
+# nativo do torch) e só os CANDIDATOS_REAVALIACAO melhores são recalculados em float32 a partir
+# do layout_embeddings.joblib, lido por mapeamento de memória (no Windows, direto do arquivo):
+# as linhas não consultadas nem chegam à RAM. Em float32 não há cópia compacta: a pontuação lê
+# os próprios embeddings em blocos e só o inverso da norma de cada vetor fica em memória.
+#
+# Confirmações entram no índice carregado sem recarga (IndiceQuantizado.adicionar) e no log de
+# inclusões layout_indice_wal.jsonl (uma linha JSON por vetor). Ao carregar, e a cada busca, o
+# log é reaplicado, então os outros processos (site, bot) também veem a inclusão. O próximo
+# retreino incorpora as confirmações e tira do log o que já está nos artefatos (compactar_wal);
+# inclusões e compactação passam pela mesma trava de arquivo (layout_indice_wal.jsonl.trava).
+#
+# Variáveis de ambiente (opcionais):
+#   PRECISAO_INDICE         -> int8 (padrão), float16 ou float32 (sem quantização)
+#   CANDIDATOS_REAVALIACAO  -> vetores recalculados em float32 por busca (padrão 64)
+#
+# Uso: python indice_quantizado.py [--consultas 200] [--k 10]   (relatório memória/latência/recall)
+
+import os
+import json
+import time
+import base64
+import hashlib
+import threading
+import argparse
+import statistics
+import numpy as np
+import joblib
+from collections import OrderedDict, namedtuple
+from agendador_treinamento import TravaArquivo
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+DIRETORIO_ATUAL = os.path.dirname(os.path.abspath(__file__))
+ARQUIVO_EMBEDDINGS = os.path.join(DIRETORIO_ATUAL, 'layout_embeddings.joblib')
+ARQUIVO_LABELS = os.path.join(DIRETORIO_ATUAL, 'layout_labels.joblib')
+ARQUIVO_INDICE_COMPACTO = os.path.join(DIRETORIO_ATUAL, 'layout_indice_compacto.joblib')
+ARQUIVO_WAL = os.path.join(DIRETORIO_ATUAL, 'layout_indice_wal.jsonl')
+PRECISOES = ('int8', 'float16', 'float32')
+PRECISAO_INDICE = os.getenv('PRECISAO_INDICE', 'int8')
+CANDIDATOS_REAVALIACAO = int(os.getenv('CANDIDATOS_REAVALIACAO', 64))
+LINHAS_POR_BLOCO = 8192 # Quantização no treino, em blocos
+LINHAS_POR_BLOCO_BUSCA = 512 # Pontuação em blocos: o resultado int32/float32 de cada um cabe no cache
+LINHAS_ASSINATURA = 64
+# No Windows um arquivo mapeado não pode ser substituído pelo treinador (os.replace falha);
+# lá as linhas reavaliadas são lidas do arquivo a cada busca (LinhasEmDisco)
+MAPEAR_EMBEDDINGS = os.name != 'nt'
+
+def normalizar(matriz):
+    matriz = np.asarray(matriz, dtype=np.float32)
+    if matriz.ndim == 1:
+        norma = np.linalg.norm(matriz)
+        return matriz / norma if norma else matriz
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    return matriz / np.where(normas == 0, 1, normas)
+
+def assinatura_embeddings(embeddings):
+    """Impressão digital barata (forma + algumas linhas) para saber se o índice compacto é desta matriz."""
+    linhas = np.unique(np.linspace(0, len(embeddings) - 1, LINHAS_ASSINATURA).astype(int)) if len(embeddings) else []
+    digest = hashlib.sha256(str(np.shape(embeddings)).encode('utf-8'))
+    for i in linhas: digest.update(np.asarray(embeddings[i], dtype=np.float32).tobytes())
+    return digest.hexdigest()[:16]
+
+def quantizar(embeddings, precisao=None):
+    """
+    Índice compacto (dicionário salvo pelo treinador) a partir dos embeddings float32 brutos.
+    float32 não guarda vetores, só o inverso das normas: a busca lê os próprios embeddings.
+    """
+    precisao = precisao or PRECISAO_INDICE
+    if precisao not in PRECISOES: raise ValueError(f"Precisão desconhecida: {precisao}")
+    escalas, blocos = None, []
+    if precisao != 'float16': escalas = np.empty(len(embeddings), dtype=np.float32)
+    for inicio in range(0, len(embeddings), LINHAS_POR_BLOCO):
+        bloco = np.asarray(embeddings[inicio:inicio + LINHAS_POR_BLOCO], dtype=np.float32)
+        if precisao == 'float32':
+            normas = np.linalg.norm(bloco, axis=1)
+            escalas[inicio:inicio + len(bloco)] = 1 / np.where(normas == 0, 1, normas)
+            continue
+        bloco = normalizar(bloco)
+        if precisao == 'int8':
+            escala = np.abs(bloco).max(axis=1) / 127
+            escala[escala == 0] = 1
+            escalas[inicio:inicio + len(bloco)] = escala
+            bloco = np.round(bloco / escala[:, None]).astype(np.int8)
+        blocos.append(bloco.astype(precisao, copy=False))
+    dimensao = np.shape(embeddings)[1] if len(embeddings) else 0
+    if precisao == 'float32': vetores = None
+    else: vetores = np.vstack(blocos) if blocos else np.zeros((0, dimensao), dtype=precisao)
+    return {'precisao': precisao, 'assinatura': assinatura_embeddings(embeddings), 'escalas': escalas, 'vetores': vetores}
+
+def quantizar_consulta(consulta):
+    """Consulta em int8 com a própria escala, para o produto int8×int8 acumulado em int32."""
+    escala = float(np.abs(consulta).max()) / 127 or 1.0
+    return np.round(consulta / escala).astype(np.int8), escala
+
+def pontuar_compacto(vetores, escalas, consulta):
+    """
+    Produto da consulta com os vetores em blocos de LINHAS_POR_BLOCO_BUSCA linhas, sem converter
+    o índice inteiro. int8: np.matmul int8×int8 acumulando em int32; senão cada bloco vira
+    float32. `escalas` multiplica o resultado (escala int8 de cada vetor, ou o inverso da norma).
+    """
+    int8 = vetores.dtype == np.int8
+    if int8: consulta, escala_consulta = quantizar_consulta(consulta)
+    sims = np.empty(len(vetores), dtype=np.float32)
+    for inicio in range(0, len(vetores), LINHAS_POR_BLOCO_BUSCA):
+        bloco = vetores[inicio:inicio + LINHAS_POR_BLOCO_BUSCA]
+        if bloco is None: raise RuntimeError("layout_embeddings.joblib foi trocado por um retreino; o índice será recarregado.")
+        if int8: sims[inicio:inicio + len(bloco)] = np.matmul(bloco, consulta, dtype=np.int32)
+        else: sims[inicio:inicio + len(bloco)] = np.asarray(bloco, dtype=np.float32) @ consulta
+    if int8: sims *= escala_consulta
+    if escalas is not None: sims *= escalas
+    return sims
+
+class PontuadorCompacto:
+    """
+    Pontuação sobre os vetores compactos. int8 e float32 (linhas lidas dos `exatos`, sem cópia)
+    em numpy, por blocos; float16 pelo produto nativo do torch, ou em numpy sem torch.
+    """
+
+    def __init__(self, compacto, exatos=None):
+        self.vetores, self.escalas = compacto['vetores'], compacto['escalas']
+        self.nbytes = self.escalas.nbytes if self.escalas is not None else 0
+        if self.vetores is None: # float32: pontua direto nos embeddings mapeados ou em disco
+            self.vetores = exatos
+        else:
+            self.nbytes += self.vetores.nbytes
+        self.quantidade, self.dimensao = np.shape(self.vetores)
+        self._tensor = None
+        if self.quantidade and torch is not None and self.vetores.dtype == np.float16:
+            self._tensor = torch.from_numpy(np.ascontiguousarray(self.vetores))
+
+    def __len__(self):
+        return self.quantidade
+
+    def pontuar(self, consulta):
+        if self._tensor is not None:
+            with torch.no_grad():
+                return (self._tensor @ torch.from_numpy(consulta.astype(np.float16))).float().numpy()
+        return pontuar_compacto(self.vetores, self.escalas, consulta)
+
+class LinhasEmDisco:
+    """
+    Linhas float32 de um .joblib lidas do arquivo só quando pedidas, para quem não pode mapear
+    (Windows). O arquivo fica aberto só durante a leitura; se o treinador já o trocou, as
+    linhas não são lidas (None) e a busca fica com a pontuação compacta até a recarga.
+    """
+
+    def __init__(self, caminho):
+        mapa = joblib.load(caminho, mmap_mode='r')
+        # Arquivo comprimido ou matriz fora de ordem C: quem chamou carrega em memória
+        self.contiguo = isinstance(mapa, np.memmap) and mapa.ndim == 2 and mapa.flags.c_contiguous
+        self.caminho, self.shape, self.dtype = caminho, np.shape(mapa), mapa.dtype
+        self.deslocamento = mapa.offset if self.contiguo else 0
+        info = os.stat(self.caminho)
+        self._identidade = (info.st_ino, info.st_size, info.st_mtime_ns)
+        del mapa # Solta o mapeamento: o os.replace do treinador precisa do arquivo livre
+
+    def __len__(self):
+        return self.shape[0]
+
+    def ler(self, linhas):
+        tamanho = self.shape[1] * self.dtype.itemsize
+        saida = np.empty((len(linhas), self.shape[1]), dtype=self.dtype)
+        with open(self.caminho, 'rb') as f:
+            info = os.fstat(f.fileno())
+            if (info.st_ino, info.st_size, info.st_mtime_ns) != self._identidade: return None
+            for j, linha in enumerate(linhas):
+                f.seek(self.deslocamento + int(linha) * tamanho)
+                saida[j] = np.frombuffer(f.read(tamanho), dtype=self.dtype)
+        return saida
+
+    def ler_intervalo(self, inicio, fim):
+        """Linhas [inicio, fim) numa única leitura (pontuação float32 e quantização em blocos)."""
+        tamanho = self.shape[1] * self.dtype.itemsize
+        fim = max(inicio, min(fim, len(self)))
+        with open(self.caminho, 'rb') as f:
+            info = os.fstat(f.fileno())
+            if (info.st_ino, info.st_size, info.st_mtime_ns) != self._identidade: return None
+            f.seek(self.deslocamento + inicio * tamanho)
+            return np.frombuffer(f.read((fim - inicio) * tamanho), dtype=self.dtype).reshape(-1, self.shape[1])
+
+    def __getitem__(self, linhas):
+        if isinstance(linhas, slice):
+            inicio, fim, passo = linhas.indices(len(self))
+            if passo == 1: return self.ler_intervalo(inicio, fim)
+            linhas = range(inicio, fim, passo)
+        elif np.ndim(linhas) == 0:
+            linha = self.ler([linhas])
+            return linha[0] if linha is not None else None
+        return self.ler(np.asarray(linhas))
+
+# Estado das inclusões feitas depois do carregamento; trocado inteiro a cada inclusão
+RetratoIndice = namedtuple('RetratoIndice', 'exatos compacto labels')
+
+class IndiceQuantizado:
+    """Pontuação aproximada sobre os vetores compactos com reavaliação exata dos melhores candidatos."""
+
+    def __init__(self, compacto, exatos, labels=None):
+        self.precisao = compacto['precisao']
+        self.compacto = PontuadorCompacto(compacto, exatos)
+        self.dimensao = self.compacto.dimensao
+        self.exatos = exatos # float32 brutos (mapeados em memória ou LinhasEmDisco)
+        self.labels_base = list(labels) if labels is not None else []
+        self._inclusoes = OrderedDict() # chave (digest) -> (vetor normalizado, label)
+        self._retrato = RetratoIndice(np.zeros((0, self.dimensao), dtype=np.float32), None, self.labels_base)
+        self._trava = threading.Lock() # Só para quem inclui; as buscas leem o retrato vigente
+        self._trava_wal = threading.Lock()
+        self._wal_lido = None # (inode, bytes já aplicados) do log de inclusões
+
+    def __len__(self):
+        return len(self.compacto) + len(self._retrato.exatos)
+
+    @property
+    def labels(self):
+        return self._retrato.labels
+
+    def memoria_bytes(self):
+        """Memória própria do índice: compacto + inclusões (os float32 mapeados ou lidos do disco não contam)."""
+        retrato = self._retrato
+        total = self.compacto.nbytes + retrato.exatos.nbytes
+        if retrato.compacto: total += retrato.compacto.nbytes
+        return total
+
+    def similaridades_aproximadas(self, consulta, retrato=None):
+        retrato = retrato or self._retrato
+        sims = self.compacto.pontuar(consulta)
+        if not retrato.compacto: return sims
+        return np.concatenate([sims, retrato.compacto.pontuar(consulta)])
+
+    def buscar(self, consulta, candidatos=None):
+        """
+        (similaridades, labels) lidos do mesmo retrato: uma inclusão concorrente não desalinha
+        as duas listas. Os `candidatos` melhores são recalculados com precisão total.
+        """
+        retrato = self._retrato
+        consulta = normalizar(np.asarray(consulta, dtype=np.float32).reshape(-1))
+        sims = np.array(self.similaridades_aproximadas(consulta, retrato), dtype=np.float32)
+        candidatos = min(CANDIDATOS_REAVALIACAO if candidatos is None else candidatos, len(sims))
+        if self.precisao == 'float32' or candidatos <= 0: return sims, retrato.labels
+        melhores = np.sort(np.argpartition(-sims, candidatos - 1)[:candidatos])
+        base, incluidos = melhores[melhores < len(self.compacto)], melhores[melhores >= len(self.compacto)]
+        if len(base):
+            linhas = self.exatos[base] # None se o arquivo já foi trocado por um retreino
+            if linhas is not None: sims[base] = normalizar(np.asarray(linhas, dtype=np.float32)) @ consulta
+        if len(incluidos): sims[incluidos] = retrato.exatos[incluidos - len(self.compacto)] @ consulta
+        return sims, retrato.labels
+
+    def similaridades(self, consulta, candidatos=None):
+        """Cosseno da consulta com cada vetor; os `candidatos` melhores com precisão total."""
+        return self.buscar(consulta, candidatos)[0]
+
+    def adicionar(self, vetores, labels, chaves):
+        """
+        Inclui vetores sem recarregar o índice; uma chave já incluída é substituída (documento
+        confirmado de novo, talvez com outro layout). Vetores de outra dimensão (log gravado
+        com outro codificador) são ignorados. Retorna quantos entraram.
+        """
+        if not len(labels): return 0
+        vetores = np.asarray(vetores, dtype=np.float32).reshape(len(labels), -1)
+        if vetores.shape[1] != self.dimensao: return 0
+        with self._trava:
+            for vetor, label, chave in zip(normalizar(vetores), labels, chaves):
+                self._inclusoes.pop(chave, None)
+                self._inclusoes[chave] = (vetor, str(label))
+            exatos = np.vstack([vetor for vetor, _ in self._inclusoes.values()])
+            incluidos = [label for _, label in self._inclusoes.values()]
+            # Só a parte incluída é quantizada de novo; buscas em andamento terminam no retrato anterior
+            compacto = PontuadorCompacto(quantizar(exatos, self.precisao), exatos)
+            self._retrato = RetratoIndice(exatos, compacto, self.labels_base + incluidos)
+        return len(labels)
+
+    def aplicar_wal(self, caminho=ARQUIVO_WAL):
+        """
+        Aplica o que o log de inclusões ganhou desde a última leitura (inclusões deste e de
+        outros processos). Retorna False se o log foi reescrito por um retreino: as inclusões já
+        aplicadas podem ter saído dele, e o índice precisa ser recarregado.
+        """
+        with self._trava_wal:
+            try:
+                info = os.stat(caminho)
+            except FileNotFoundError:
+                return self._wal_lido is None
+            inode, posicao = self._wal_lido or (info.st_ino, 0)
+            if inode != info.st_ino or info.st_size < posicao: return False
+            if info.st_size > posicao:
+                entradas, posicao = ler_wal(caminho, posicao)
+                entradas.sort(key=lambda e: e['ts']) # A compactação regrava entradas antigas depois de novas
+                vetores = [decodificar_vetor(e) for e in entradas]
+                validas = [i for i, vetor in enumerate(vetores) if len(vetor) == self.dimensao]
+                self.adicionar([vetores[i] for i in validas], [entradas[i]['label'] for i in validas], [entradas[i]['chave'] for i in validas])
+            self._wal_lido = (inode, posicao)
+            return True
+
+# --- LOG DE INCLUSÕES (WAL) ---
+
+def trava_wal(caminho):
+    """Trava entre processos do log: inclusões e compactação não se intercalam."""
+    return TravaArquivo(f"{caminho}.trava")
+
+def registrar_no_wal(caminho, chave, label, vetor):
+    """Acrescenta uma inclusão ao log: uma linha JSON, num único write, com fsync antes de retornar."""
+    vetor = base64.b64encode(np.asarray(vetor, dtype=np.float32).reshape(-1).tobytes()).decode('ascii')
+    with trava_wal(caminho):
+        entrada = {'ts': time.time(), 'chave': chave, 'label': str(label), 'vetor': vetor}
+        linha = (json.dumps(entrada) + "\n").encode('utf-8')
+        with open(caminho, 'a+b') as f:
+            if f.seek(0, os.SEEK_END):
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n": linha = b"\n" + linha # Fecha a linha de uma gravação interrompida
+            f.write(linha)
+            f.flush()
+            os.fsync(f.fileno())
+    return entrada
+
+def ler_wal(caminho, posicao=0):
+    """Entradas completas a partir de `posicao` (bytes) e a posição após a última; uma linha pela metade fica para a próxima leitura."""
+    try:
+        with open(caminho, 'rb') as f:
+            f.seek(posicao)
+            dados = f.read()
+    except FileNotFoundError:
+        return [], posicao
+    fim = dados.rfind(b"\n") + 1
+    entradas = []
+    for linha in dados[:fim].splitlines():
+        try:
+            entradas.append(json.loads(linha))
+        except ValueError:
+            continue # Linha corrompida por uma queda no meio da gravação
+    return entradas, posicao + fim
+
+def decodificar_vetor(entrada):
+    return np.frombuffer(base64.b64decode(entrada['vetor']), dtype=np.float32)
+
+def compactar_wal(caminho, ate_ts, labels=None):
+    """
+    Depois de um retreino, tira do log as inclusões que os artefatos já contêm: as gravadas até
+    `ate_ts` (início do treino) e, num retreino incremental, só as dos `labels` retreinados.
+    O log é trocado por um novo com os.replace (os processos percebem pelo inode e recarregam).
+    Tudo sob a trava do log: uma inclusão concorrente espera a troca e vai para o log novo.
+    Retorna quantas saíram.
+    """
+    with trava_wal(caminho):
+        entradas = ler_wal(caminho)[0]
+        labels = {str(label) for label in labels} if labels is not None else None
+        restantes = [e for e in entradas if e['ts'] > ate_ts or (labels is not None and e['label'] not in labels)]
+        if len(restantes) == len(entradas): return 0
+        caminho_tmp = f"{caminho}.{os.getpid()}.tmp"
+        with open(caminho_tmp, 'wb') as f:
+            f.write("".join(json.dumps(e) + "\n" for e in restantes).encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(caminho_tmp, caminho)
+    return len(entradas) - len(restantes)
+
+def carregar_embeddings(caminho=ARQUIVO_EMBEDDINGS):
+    """float32 mapeados em memória; onde não dá para mapear, LinhasEmDisco (nada fica na RAM)."""
+    if not MAPEAR_EMBEDDINGS:
+        linhas = LinhasEmDisco(caminho)
+        if linhas.contiguo: return linhas
+    exatos = joblib.load(caminho, mmap_mode='r' if MAPEAR_EMBEDDINGS else None)
+    return exatos if isinstance(exatos, np.ndarray) else np.asarray(exatos, dtype=np.float32)
+
+def carregar_indice(caminho_embeddings=ARQUIVO_EMBEDDINGS, caminho_compacto=ARQUIVO_INDICE_COMPACTO,
+                    caminho_labels=ARQUIVO_LABELS, caminho_wal=ARQUIVO_WAL, precisao=None):
+    """
+    Usa o índice compacto salvo pelo treinador se ele corresponder aos embeddings atuais;
+    senão (arquivo ausente, outra precisão, restauração de backup) recria em memória.
+    As inclusões do log que o último retreino ainda não incorporou são reaplicadas.
+    """
+    precisao = precisao or PRECISAO_INDICE
+    exatos = carregar_embeddings(caminho_embeddings)
+    compacto = None
+    if precisao != 'float32' and os.path.exists(caminho_compacto):
+        try:
+            compacto = joblib.load(caminho_compacto)
+            if compacto.get('precisao') != precisao or compacto.get('assinatura') != assinatura_embeddings(exatos): compacto = None
+        except Exception as e:
+            print(f"Índice compacto ilegível, recriando: {e}")
+            compacto = None
+    if compacto is None:
+        compacto = quantizar(exatos, precisao)
+    indice = IndiceQuantizado(compacto, exatos, [str(label) for label in joblib.load(caminho_labels)])
+    if caminho_wal: indice.aplicar_wal(caminho_wal)
+    return indice
+
+# --- RELATÓRIO DE COMPROMISSO MEMÓRIA / LATÊNCIA / RECALL ---
+
+def melhores_por_layout(sims, labels):
+    melhores = {}
+    for label, score in zip(labels, sims.tolist()):
+        if score > melhores.get(label, -2): melhores[label] = score
+    return max(melhores, key=melhores.get) if melhores else None
+
+def relatorio(embeddings, labels, quantidade_consultas=200, k=10, semente=0):
+    """
+    Consultas: vetores do próprio índice com ruído (documentos parecidos, mas não idênticos).
+    Compara cada precisão com a busca float32 exata: recall@k dos vetores e concordância do
+    layout em primeiro lugar, com e sem reavaliação.
+    """
+    exatos = normalizar(embeddings)
+    aleatorio = np.random.default_rng(semente)
+    escolhidos = aleatorio.choice(len(exatos), size=min(quantidade_consultas, len(exatos)), replace=False)
+    consultas = normalizar(exatos[escolhidos] + aleatorio.normal(scale=0.02, size=(len(escolhidos), exatos.shape[1])))
+    k = min(k, len(exatos))
+    referencia = [np.argpartition(-(exatos @ c), k - 1)[:k] for c in consultas]
+    primeiros = [melhores_por_layout(exatos @ c, labels) for c in consultas]
+
+    resultados = {}
+    for precisao in PRECISOES:
+        indice = IndiceQuantizado(quantizar(embeddings, precisao), np.asarray(embeddings, dtype=np.float32))
+        for candidatos in ([0, CANDIDATOS_REAVALIACAO] if precisao != 'float32' else [0]):
+            tempos, recall, concordancia = [], [], 0
+            for consulta, vizinhos, primeiro in zip(consultas, referencia, primeiros):
+                inicio = time.perf_counter()
+                sims = indice.similaridades(consulta, candidatos)
+                tempos.append((time.perf_counter() - inicio) * 1000)
+                recall.append(len(set(np.argpartition(-sims, k - 1)[:k].tolist()) & set(vizinhos.tolist())) / k)
+                concordancia += melhores_por_layout(sims, labels) == primeiro
+            nome = precisao if precisao == 'float32' else f"{precisao}+reavaliacao_{candidatos}" if candidatos else f"{precisao}_aproximado"
+            resultados[nome] = {
+                'memoria_mb': round(indice.memoria_bytes() / 2**20, 3),
+                'latencia_mediana_ms': round(statistics.median(tempos), 3),
+                f'recall@{k}': round(float(np.mean(recall)), 4),
+                'concordancia_top1_layout': round(concordancia / len(consultas), 4),
+            }
+    return resultados
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Relatório memória/latência/recall do índice quantizado.")
+    parser.add_argument('--consultas', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    embeddings = np.asarray(joblib.load(ARQUIVO_EMBEDDINGS), dtype=np.float32)
+    labels = [str(l) for l in joblib.load(ARQUIVO_LABELS)]
+    print(f"{len(embeddings)} vetores de dimensão {embeddings.shape[1]}; reavaliação com {CANDIDATOS_REAVALIACAO} candidatos; "
+          f"blocos de {LINHAS_POR_BLOCO_BUSCA} linhas.\n")
+    for nome, valores in relatorio(embeddings, labels, args.consultas, args.k).items():
+        print(f"{nome:<28} " + "  ".join(f"{chave}={valor}" for chave, valor in valores.items()))
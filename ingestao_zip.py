@@ -0,0 +1,158 @@
+# Arquivo: ingestao_zip.py
+#
+# Ingestão de ZIPs de treinamento membro a membro, sem extractall:
+# cada arquivo é validado pela convenção de nome (^codigo), tem o conteúdo hasheado e é
+# descartado se já existir na pasta de treinamento (sincronizada com o corpus no início) ou
+# neste mesmo envio; os novos têm o texto extraído em segundo plano enquanto
+# o ZIP continua sendo lido e só são gravados e registrados depois da extração. No fim, só os
+# layouts que receberam documentos novos vão para o retreino incremental.
+# A ingestão roda no processo do site e divide o governador (OCR, rasterização) com as buscas;
+# por isso usa no máximo tantas threads quanto as vagas de OCR do governador (e até
+# MAX_WORKERS_EXTRACAO), só começa um documento quando não há busca em andamento e,
+# recusada pelo governador, tenta de novo mais tarde em vez de disputar a vaga.
+
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import corpus_textos
+from identificador import extrair_texto_com_cache, obter_governador, SistemaOcupado, PASTA_TREINAMENTO
+from agendador_treinamento import solicitar_treinamento
+
+EXTENSOES_ACEITAS = ['.pdf', '.xlsx', '.xls', '.txt', '.csv', '.xml', '.ofx']
+MAX_WORKERS_EXTRACAO = int(os.getenv('WORKERS_INGESTAO', min(4, os.cpu_count() or 1))) # Teto de threads de extração da ingestão
+TENTATIVAS_OCUPADO = 5 # Extrações recusadas pelo governador, com espera crescente entre elas
+ESPERA_OCUPADO = 2.0 # Segundos antes da primeira nova tentativa (dobra a cada recusa)
+ESPERA_MAXIMA_BUSCAS = 30 # Segundos cedidos às buscas antes de cada documento
+
+def validar_membro(info):
+    """Retorna (nome, codigo_layout, motivo_rejeicao)."""
+    nome = os.path.basename(info.filename)
+    if info.is_dir() or not nome or nome.startswith('.') or '__MACOSX' in info.filename:
+        return nome, None, "ignorado"
+    if os.path.splitext(nome)[1].lower() not in EXTENSOES_ACEITAS:
+        return nome, None, "extensão não suportada"
+    match = re.match(r'^(\d+)', nome)
+    if not match:
+        return nome, None, "nome sem código de layout no início"
+    return nome, match.group(1), None
+
+def contar_membros(arquivos_zip):
+    """Quantos itens processar_zips vai produzir (arquivos, sem pastas nem ignorados), para a barra de progresso."""
+    total = 0
+    for arquivo_zip in arquivos_zip:
+        with zipfile.ZipFile(arquivo_zip, 'r') as z:
+            total += sum(1 for info in z.infolist() if validar_membro(info)[2] != "ignorado")
+    return total
+
+def nome_disponivel(nome):
+    """Evita sobrescrever um arquivo de treinamento diferente que tenha o mesmo nome."""
+    base, extensao = os.path.splitext(nome)
+    candidato, contador = nome, 1
+    while os.path.exists(os.path.join(PASTA_TREINAMENTO, candidato)):
+        candidato = f"{base}_{contador}{extensao}"
+        contador += 1
+    return candidato
+
+def aguardar_buscas(governador, limite=ESPERA_MAXIMA_BUSCAS):
+    """Cede a vez às buscas: espera (até `limite` segundos) não haver nenhuma em andamento."""
+    fim = time.monotonic() + limite
+    while governador.estado()['requisicao']['em_uso'] and time.monotonic() < fim:
+        time.sleep(0.2)
+
+def extrair_membro(nome, dados, digest):
+    """True se houve texto extraível; levanta SistemaOcupado se o governador recusar todas as tentativas."""
+    senha_extraida = re.search(r'senha[_\s-]*(\d+)', nome, re.IGNORECASE)
+    for tentativa in range(TENTATIVAS_OCUPADO):
+        aguardar_buscas(obter_governador())
+        try:
+            texto, _ = extrair_texto_com_cache(dados, senha_manual=senha_extraida.group(1) if senha_extraida else None,
+                                               nome_arquivo=nome, digest=digest)
+            return bool(texto) and texto not in ["SENHA_NECESSARIA", "SENHA_INCORRETA"]
+        except SistemaOcupado:
+            if tentativa == TENTATIVAS_OCUPADO - 1: raise
+            time.sleep(ESPERA_OCUPADO * 2 ** tentativa)
+
+def gravar_membro(nome, codigo_layout, dados, digest):
+    """Grava na pasta de treinamento e registra no corpus; retorna o nome final."""
+    nome_final = nome_disponivel(nome)
+    caminho = os.path.join(PASTA_TREINAMENTO, nome_final)
+    with open(caminho, 'wb') as f: f.write(dados)
+    estado = os.stat(caminho)
+    corpus_textos.registrar_documento(nome_final, codigo_layout, digest, estado.st_size, estado.st_mtime)
+    return nome_final
+
+def processar_zips(arquivos_zip, max_workers=None):
+    """
+    Gerador: produz um dicionário por membro ({'zip', 'arquivo', 'layout', 'status'}) à medida
+    que cada um é concluído, para a interface mostrar o progresso. Os resultados são produzidos
+    na thread de quem chama (o Streamlit não aceita atualizações vindas de outras threads).
+    """
+    os.makedirs(PASTA_TREINAMENTO, exist_ok=True)
+    max_workers = max_workers or max(1, min(MAX_WORKERS_EXTRACAO, obter_governador().estado()['ocr']['limite']))
+    # Arquivos que chegaram à pasta sem passar pelo corpus (cópia manual, pasta anterior ao corpus) também contam
+    corpus_textos.sincronizar_pasta(PASTA_TREINAMENTO)
+    digests_vistos = set() # Já enfileirados ou gravados neste envio
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pendentes = {}
+
+        def concluidos(bloquear):
+            if bloquear and pendentes:
+                wait(list(pendentes), return_when=FIRST_COMPLETED)
+            for futuro in [f for f in pendentes if f.done()]:
+                item, dados, digest = pendentes.pop(futuro)
+                try:
+                    com_texto = futuro.result()
+                except SistemaOcupado:
+                    digests_vistos.discard(digest)
+                    item['status'] = "adiado: servidor ocupado, envie o arquivo de novo"
+                    yield item
+                    continue
+                except Exception as e:
+                    item['status'] = f"erro na extração: {e}"
+                    yield item
+                    continue
+                # Só documentos já extraídos entram na pasta de treinamento e no corpus
+                item['arquivo'] = gravar_membro(item['arquivo'], item['layout'], dados, digest)
+                item['status'] = "novo" if com_texto else "novo (sem texto extraível)"
+                yield item
+
+        for arquivo_zip in arquivos_zip:
+            nome_zip = getattr(arquivo_zip, 'name', str(arquivo_zip))
+            with zipfile.ZipFile(arquivo_zip, 'r') as z:
+                for info in z.infolist():
+                    nome, codigo_layout, rejeicao = validar_membro(info)
+                    item = {'zip': nome_zip, 'arquivo': nome, 'layout': codigo_layout, 'status': rejeicao}
+                    if rejeicao:
+                        if rejeicao != "ignorado": yield item
+                        continue
+
+                    with z.open(info) as membro:
+                        dados = membro.read()
+                    digest = corpus_textos.calcular_digest(dados)
+                    existentes = corpus_textos.documentos_por_digest(digest)
+                    if digest in digests_vistos or existentes:
+                        item['status'] = f"duplicado de {existentes[0][0]}" if existentes else "duplicado no mesmo lote"
+                        yield item
+                        continue
+                    digests_vistos.add(digest)
+                    pendentes[executor.submit(extrair_membro, nome, dados, digest)] = (item, dados, digest)
+
+                    # Limita os arquivos em memória aguardando extração
+                    yield from concluidos(bloquear=len(pendentes) >= max_workers * 2)
+        while pendentes:
+            yield from concluidos(bloquear=True)
+
+def agendar_retreino(relatorio, layouts_conhecidos=None):
+    """
+    Agenda o retreino só dos layouts que ganharam documentos novos. Se algum layout ainda não
+    estiver nos metadados, sincroniza com a API antes. Retorna os layouts agendados.
+    """
+    layouts = sorted({item['layout'] for item in relatorio if str(item['status']).startswith("novo")})
+    if not layouts: return []
+    desconhecidos = layouts_conhecidos is not None and any(l not in layouts_conhecidos for l in layouts)
+    solicitar_treinamento('sincronizar' if desconhecidos else 'incremental', layouts,
+                          motivo=f"Ingestão de ZIP ({len(layouts)} layouts)")
+    return layouts
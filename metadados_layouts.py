@@ -0,0 +1,162 @@
+# Arquivo: metadados_layouts.py
+#
+# Metadados dos layouts em SQLite (metadados_layouts.db), no lugar do layouts_meta.json.
+# Uma linha por layout, com índices por formato, tipo de relatório e sistema; o treinador
+# grava só os layouts alterados, em uma transação. Cada gravação incrementa a versão do
+# banco, e os leitores (identificador, app, bot) mantêm um snapshot em memória que só é
+# relido quando a versão muda.
+
+import os
+import json
+import time
+import sqlite3
+import threading
+
+DIRETORIO_ATUAL = os.path.dirname(os.path.abspath(__file__))
+ARQUIVO_METADADOS_DB = os.path.join(DIRETORIO_ATUAL, 'metadados_layouts.db')
+ARQUIVO_METADADOS_LEGADO = os.path.join(DIRETORIO_ATUAL, 'layouts_meta.json')
+MAX_CARACTERES_CABECALHO = 4000
+
+CAMPOS = ['codigo_layout', 'descricao', 'formato', 'sistema', 'tipo_relatorio', 'cabecalho', 'url_previa', 'assinatura_documentos']
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS layouts (
+    codigo_layout TEXT PRIMARY KEY,
+    descricao TEXT,
+    formato TEXT,
+    sistema TEXT,
+    tipo_relatorio TEXT,
+    cabecalho TEXT,
+    url_previa TEXT,
+    assinatura_documentos TEXT,
+    atualizado_em REAL
+);
+CREATE INDEX IF NOT EXISTS idx_layouts_formato ON layouts (formato COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_layouts_tipo ON layouts (tipo_relatorio COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_layouts_sistema ON layouts (sistema COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS controle (
+    chave TEXT PRIMARY KEY,
+    valor INTEGER
+);
+"""
+
+_conexoes = threading.local()
+_trava_snapshot = threading.Lock()
+_snapshot = {'versao': None, 'layouts': {}}
+
+def conectar():
+    con = getattr(_conexoes, 'con', None)
+    if con is None:
+        con = sqlite3.connect(ARQUIVO_METADADOS_DB, timeout=30)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.executescript(ESQUEMA)
+        _conexoes.con = con
+        importar_json_legado(con)
+    return con
+
+def limitar_cabecalho(texto):
+    """
+    Mantém só a primeira ocorrência de cada palavra e corta em MAX_CARACTERES_CABECALHO.
+    O cabeçalho é usado como conjunto de palavras no bônus de descrição, então repetições
+    vindas da concatenação dos exemplos só ocupavam espaço.
+    """
+    if not texto: return None
+    vistas, palavras = set(), []
+    for palavra in texto.split():
+        if palavra.lower() not in vistas:
+            vistas.add(palavra.lower())
+            palavras.append(palavra)
+    cabecalho = " ".join(palavras)
+    if len(cabecalho) > MAX_CARACTERES_CABECALHO:
+        cabecalho = cabecalho[:MAX_CARACTERES_CABECALHO].rsplit(' ', 1)[0]
+    return cabecalho
+
+def _linha_para_registro(linha):
+    return {campo: valor for campo, valor in zip(CAMPOS, linha) if valor is not None}
+
+def _incrementar_versao(con):
+    con.execute("INSERT INTO controle (chave, valor) VALUES ('versao', 1) "
+                "ON CONFLICT(chave) DO UPDATE SET valor = valor + 1")
+
+# --- ESCRITA ---
+
+def gravar_layouts(registros=(), remover=()):
+    """Upsert dos registros e remoção dos códigos informados, em uma única transação."""
+    registros, remover = list(registros), list(remover)
+    if not registros and not remover: return
+    agora = time.time()
+    con = conectar()
+    with con:
+        con.executemany(
+            f"INSERT OR REPLACE INTO layouts ({', '.join(CAMPOS)}, atualizado_em) VALUES ({', '.join('?' * len(CAMPOS))}, ?)",
+            [[str(r['codigo_layout'])] + [r.get(c) for c in CAMPOS[1:5]] + [limitar_cabecalho(r.get('cabecalho'))]
+             + [r.get(c) for c in CAMPOS[6:]] + [agora] for r in registros]
+        )
+        con.executemany("DELETE FROM layouts WHERE codigo_layout = ?", [(str(c),) for c in remover])
+        _incrementar_versao(con)
+
+def gravar_previas(previas):
+    """
+    Preenche a url_previa dos layouts que ainda não a têm ({codigo: url}); não sobrescreve a que
+    a sincronização gravou. Retorna quantos layouts foram preenchidos.
+    """
+    if not previas: return 0
+    con = conectar()
+    with con:
+        preenchidos = sum(con.execute("UPDATE layouts SET url_previa = ? WHERE codigo_layout = ? AND (url_previa IS NULL OR url_previa = '')",
+                                      (url, str(codigo))).rowcount for codigo, url in previas.items())
+        if preenchidos: _incrementar_versao(con)
+    return preenchidos
+
+def importar_json_legado(con):
+    """
+    Carga inicial a partir do layouts_meta.json, se o banco estiver vazio. O JSON não tem url_previa
+    (vinha da API a cada carga do modelo); identificador.completar_previas_da_api a preenche.
+    """
+    if not os.path.exists(ARQUIVO_METADADOS_LEGADO): return
+    if con.execute("SELECT 1 FROM layouts LIMIT 1").fetchone(): return
+    with open(ARQUIVO_METADADOS_LEGADO, 'r', encoding='utf-8') as f:
+        registros = json.load(f)
+    print(f"Importando {len(registros)} layouts de '{os.path.basename(ARQUIVO_METADADOS_LEGADO)}'...")
+    gravar_layouts(registros)
+
+# --- LEITURA ---
+
+def versao_atual():
+    linha = conectar().execute("SELECT valor FROM controle WHERE chave = 'versao'").fetchone()
+    return linha[0] if linha else 0
+
+def carregar_layouts():
+    """{codigo_layout: registro} lido do banco (cópia nova, pode ser alterada por quem chama)."""
+    cursor = conectar().execute(f"SELECT {', '.join(CAMPOS)} FROM layouts ORDER BY CAST(codigo_layout AS INTEGER)")
+    return {linha[0]: _linha_para_registro(linha) for linha in cursor}
+
+def snapshot():
+    """
+    Snapshot somente leitura dos metadados, compartilhado pelo processo. Custa uma consulta
+    à versão por chamada; o banco só é relido quando outro processo gravou alterações.
+    """
+    versao = versao_atual()
+    if _snapshot['versao'] != versao:
+        with _trava_snapshot:
+            if _snapshot['versao'] != versao:
+                con = conectar()
+                with con: # Versão e linhas lidas na mesma transação
+                    con.execute("BEGIN")
+                    versao = versao_atual()
+                    layouts = carregar_layouts()
+                _snapshot.update(versao=versao, layouts=layouts)
+    return _snapshot['layouts']
+
+def consultar_layouts(formato=None, tipo_relatorio=None, sistema=None):
+    """Layouts filtrados pelos campos indexados (comparação sem diferenciar maiúsculas)."""
+    condicoes, parametros = [], []
+    for coluna, valor in [('formato', formato), ('tipo_relatorio', tipo_relatorio), ('sistema', sistema)]:
+        if valor:
+            condicoes.append(f"{coluna} = ? COLLATE NOCASE")
+            parametros.append(valor)
+    onde = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    cursor = conectar().execute(
+        f"SELECT {', '.join(CAMPOS)} FROM layouts {onde} ORDER BY CAST(codigo_layout AS INTEGER)", parametros
+    )
+    return [_linha_para_registro(linha) for linha in cursor]
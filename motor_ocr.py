@@ -0,0 +1,124 @@
+# Arquivo: motor_ocr.py
+#
+# Motor de OCR com workers Tesseract persistentes.
+# Com o binding tesserocr instalado (pip install tesserocr), cada worker é uma instância
+# PyTessBaseAPI que carrega o traineddata uma única vez e reconhece imagens em memória,
+# sem arquivo temporário nem processo novo. O tesserocr está no requirements.txt (e as
+# bibliotecas do Tesseract no packages.txt); no Windows, sem wheel oficial, cai no
+# pytesseract (um processo por imagem), mas com a mesma concorrência limitada.
+# Sem vaga no pool levanta OCROcupado: a imagem nem foi lida. Uma imagem que estoura
+# TIMEOUT_OCR_IMAGEM (nos dois backends) é falha de OCR: sai "" e conta em timeouts_ocr(),
+# que o cache de extração consulta para não gravar o texto incompleto.
+
+import os
+import io
+import queue
+import threading
+import platform
+from PIL import Image
+import pytesseract
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None # Usa o pytesseract como alternativa
+
+if platform.system() == "Windows":
+    pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+
+IDIOMA_OCR = 'por'
+TIMEOUT_OCR_IMAGEM = 15
+MAX_WORKERS_OCR = int(os.getenv('MAX_WORKERS_OCR', max(1, (os.cpu_count() or 2) // 2)))
+
+
+class OCROcupado(Exception):
+    """O OCR não rodou por falta de vaga no pool; o resultado não é "imagem sem texto"."""
+
+_contadores = threading.local()
+
+def timeouts_ocr():
+    """Imagens desta thread que estouraram o tempo (e saíram como ""); compare antes e depois da extração."""
+    return getattr(_contadores, 'timeouts', 0)
+
+def registrar_timeout(motivo):
+    _contadores.timeouts = timeouts_ocr() + 1
+    print(f"AVISO: OCR interrompido por tempo: {motivo}")
+    return ""
+
+class MotorOCR:
+    """Pool de workers Tesseract aquecidos com concorrência limitada a max_workers."""
+
+    def __init__(self, idioma=IDIOMA_OCR, max_workers=MAX_WORKERS_OCR, usar_tesserocr=True):
+        self.idioma = idioma
+        self.max_workers = max(1, int(max_workers))
+        self.backend = 'tesserocr' if (usar_tesserocr and tesserocr is not None) else 'pytesseract'
+        self._vagas = threading.BoundedSemaphore(self.max_workers)
+        self._workers_livres = queue.LifoQueue() # LIFO mantém os workers mais "quentes" em uso
+        self._lock = threading.Lock()
+        self._workers_criados = []
+
+    def _obter_worker(self):
+        try:
+            return self._workers_livres.get_nowait()
+        except queue.Empty:
+            worker = tesserocr.PyTessBaseAPI(lang=self.idioma)
+            with self._lock:
+                self._workers_criados.append(worker)
+            return worker
+
+    def reconhecer(self, imagem, timeout=TIMEOUT_OCR_IMAGEM):
+        """
+        Reconhece o texto de uma imagem (PIL.Image ou bytes) e retorna a string.
+        Aguarda no máximo `timeout` segundos por uma vaga no pool; levanta OCROcupado se esgotar.
+        O reconhecimento também tem `timeout` segundos; se estourar, retorna "" (timeouts_ocr).
+        """
+        if isinstance(imagem, (bytes, bytearray)):
+            imagem = Image.open(io.BytesIO(imagem))
+
+        if not self._vagas.acquire(timeout=timeout):
+            print("AVISO: OCR recusado, todos os workers ocupados.")
+            raise OCROcupado("Todos os workers de OCR ocupados.")
+        try:
+            if self.backend == 'pytesseract':
+                try:
+                    return pytesseract.image_to_string(imagem, lang=self.idioma, timeout=timeout)
+                except RuntimeError as e:
+                    if 'timeout' in str(e).lower(): return registrar_timeout(e) # pytesseract mata o processo no timeout
+                    raise
+            worker = self._obter_worker()
+            try:
+                worker.SetImage(imagem)
+                if not worker.Recognize(timeout=int(timeout * 1000)): return registrar_timeout("tesserocr")
+                return worker.GetUTF8Text()
+            finally:
+                worker.Clear()
+                self._workers_livres.put(worker)
+        except Exception as e:
+            print(f"Erro no OCR: {e}")
+            return ""
+        finally:
+            self._vagas.release()
+
+    def encerrar(self):
+        """Libera as instâncias da API do Tesseract criadas pelo pool."""
+        with self._lock:
+            for worker in self._workers_criados:
+                worker.End()
+            self._workers_criados = []
+        self._workers_livres = queue.LifoQueue()
+
+
+_motor_padrao = None
+_lock_motor_padrao = threading.Lock()
+
+def obter_motor_ocr():
+    """Retorna o motor compartilhado pelo processo (criado na primeira chamada)."""
+    global _motor_padrao
+    with _lock_motor_padrao:
+        if _motor_padrao is None:
+            _motor_padrao = MotorOCR()
+            print(f"Motor de OCR iniciado ({_motor_padrao.backend}, {_motor_padrao.max_workers} workers).")
+        return _motor_padrao
+
+def reconhecer_texto(imagem, timeout=TIMEOUT_OCR_IMAGEM):
+    return obter_motor_ocr().reconhecer(imagem, timeout=timeout)
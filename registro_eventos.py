@@ -0,0 +1,191 @@
+# Arquivo: registro_eventos.py
+#
+# Log estruturado de buscas e ações administrativas, compartilhado pelo app e pelo bot.
+# Quem registra só coloca o evento em uma fila em memória; uma thread em segundo plano
+# grava os eventos em lotes, uma linha JSON por evento, em logs/<tipo>.jsonl. Os arquivos
+# são apenas acrescidos e giram ao passar de MAX_BYTES_ARQUIVO. As análises percorrem os
+# arquivos linha a linha, sem carregá-los inteiros.
+#
+# Uso: python registro_eventos.py [--dias 30]   (resumo das buscas)
+
+import os
+import json
+import queue
+import atexit
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+DIRETORIO_ATUAL = os.path.dirname(os.path.abspath(__file__))
+PASTA_LOGS = os.path.join(DIRETORIO_ATUAL, 'logs')
+MAX_BYTES_ARQUIVO = 10 * 1024 * 1024
+TAMANHO_LOTE = 200
+INTERVALO_GRAVACAO = 2.0 # Segundos entre gravações quando há poucos eventos
+MAX_EVENTOS_FILA = 10000 # Acima disso os eventos são descartados em vez de segurar a requisição
+
+_fila = queue.Queue(maxsize=MAX_EVENTOS_FILA)
+_trava = threading.Lock()
+_gravador = None
+_descartados = 0
+
+# --- REGISTRO (CHAMADO NAS REQUISIÇÕES) ---
+
+def registrar_evento(tipo, **campos):
+    """Enfileira o evento e retorna imediatamente."""
+    global _descartados
+    iniciar_gravador()
+    evento = {'ts': datetime.now().isoformat(timespec='milliseconds'), 'tipo': tipo, **campos}
+    try:
+        _fila.put_nowait(evento)
+    except queue.Full:
+        _descartados += 1
+
+def registrar_busca(origem, usuario, arquivo, resultados, filtros=None, rastreio=None):
+    """
+    Uma busca com o top-k completo. `resultados` é o retorno de identificar_layout (lista,
+    "SENHA_NECESSARIA"/"SENHA_INCORRETA" ou lista com 'erro'); `rastreio` é o
+    telemetria.ultimo_rastreio() da chamada, com etapas, contadores e digest do arquivo.
+    """
+    if isinstance(resultados, str):
+        status, top_k = resultados.lower(), []
+    elif resultados and 'erro' in resultados[0]:
+        status, top_k = resultados[0]['erro'], []
+    else:
+        status = 'ok' if resultados else 'sem_resultado'
+        top_k = [{'codigo_layout': r.get('codigo_layout'), 'pontuacao': round(r.get('pontuacao', 0), 2),
+                  'compatibilidade': r.get('compatibilidade')} for r in resultados or []]
+    resumo = rastreio.resumo() if rastreio else {}
+    registrar_evento('busca', origem=origem, usuario=usuario, arquivo=arquivo, filtros=filtros or {},
+                     status=status, top_k=top_k, **{k: v for k, v in resumo.items() if k != 'origem'})
+
+def registrar_acao_admin(usuario, acao, detalhes, origem='streamlit'):
+    registrar_evento('admin', origem=origem, usuario=usuario, acao=acao, detalhes=detalhes)
+
+# --- GRAVAÇÃO EM SEGUNDO PLANO ---
+
+def iniciar_gravador():
+    global _gravador
+    if _gravador is not None: return
+    with _trava:
+        if _gravador is not None: return
+        _gravador = threading.Thread(target=_laco_gravacao, daemon=True, name='registro-eventos')
+        _gravador.start()
+        atexit.register(_encerrar)
+
+def _laco_gravacao():
+    global _descartados
+    while True:
+        try:
+            lote = [_fila.get(timeout=INTERVALO_GRAVACAO)]
+        except queue.Empty:
+            continue
+        while len(lote) < TAMANHO_LOTE:
+            try: lote.append(_fila.get_nowait())
+            except queue.Empty: break
+        encerrar = None in lote
+        gravar_lote([evento for evento in lote if evento is not None])
+        if _descartados:
+            print(f"AVISO: {_descartados} eventos descartados com a fila de log cheia.")
+            _descartados = 0
+        if encerrar: return
+
+def caminho_log(tipo):
+    return os.path.join(PASTA_LOGS, f"{tipo}.jsonl")
+
+def girar_se_necessario(caminho):
+    try:
+        if os.path.getsize(caminho) < MAX_BYTES_ARQUIVO: return
+        base, extensao = os.path.splitext(caminho)
+        os.replace(caminho, f"{base}.{datetime.now().strftime('%Y%m%d%H%M%S%f')}{extensao}")
+    except FileNotFoundError:
+        pass # Arquivo ainda não existe ou outro processo acabou de girá-lo
+
+def gravar_lote(eventos):
+    """Uma única escrita em modo append por arquivo, para o lote não se misturar com o de outro processo."""
+    por_tipo = {}
+    for evento in eventos:
+        por_tipo.setdefault(evento['tipo'], []).append(json.dumps(evento, ensure_ascii=False, default=str) + "\n")
+    try:
+        os.makedirs(PASTA_LOGS, exist_ok=True)
+        for tipo, linhas in por_tipo.items():
+            caminho = caminho_log(tipo)
+            girar_se_necessario(caminho)
+            with open(caminho, 'a', encoding='utf-8') as f:
+                f.write("".join(linhas))
+    except OSError as e:
+        print(f"ERRO ao gravar o log de eventos: {e}")
+
+def _encerrar():
+    """Na saída do processo, grava o que ainda estiver na fila."""
+    try:
+        _fila.put(None, timeout=1)
+        _gravador.join(timeout=5)
+    except Exception:
+        pass
+
+# --- CONSULTAS ---
+
+def arquivos_do_tipo(tipo):
+    """Arquivos girados (em ordem cronológica) seguidos do atual."""
+    if not os.path.exists(PASTA_LOGS): return []
+    girados = sorted(n for n in os.listdir(PASTA_LOGS) if n.startswith(f"{tipo}.") and n != f"{tipo}.jsonl" and n.endswith('.jsonl'))
+    return [os.path.join(PASTA_LOGS, n) for n in girados] + ([caminho_log(tipo)] if os.path.exists(caminho_log(tipo)) else [])
+
+def iterar_eventos(tipo, desde=None):
+    """Gera os eventos do tipo, linha a linha; `desde` é um datetime opcional."""
+    limite = desde.isoformat() if desde else None
+    for caminho in arquivos_do_tipo(tipo):
+        with open(caminho, 'r', encoding='utf-8') as f:
+            for linha in f:
+                try:
+                    evento = json.loads(linha)
+                except ValueError:
+                    continue # Linha truncada por uma queda no meio da gravação
+                if limite and evento.get('ts', '') < limite: continue
+                yield evento
+
+def resumo_buscas(desde=None):
+    """
+    Agregados das buscas: total, taxa de arquivos repetidos (mesmo digest já buscado),
+    taxa de acerto do cache de extração, latência p50/p95 e quantas vezes cada layout
+    ficou em primeiro lugar.
+    """
+    total, repetidas, com_cache, acertos_cache = 0, 0, 0, 0
+    digests_vistos, duracoes = set(), []
+    primeiros, por_origem = Counter(), Counter()
+    for evento in iterar_eventos('busca', desde):
+        total += 1
+        por_origem[evento.get('origem')] += 1
+        digest = evento.get('digest')
+        if digest:
+            repetidas += digest in digests_vistos
+            digests_vistos.add(digest)
+        contadores = evento.get('contadores', {})
+        if 'cache_acertos' in contadores or 'cache_falhas' in contadores:
+            com_cache += 1
+            acertos_cache += bool(contadores.get('cache_acertos'))
+        if evento.get('duracao_ms') is not None: duracoes.append(evento['duracao_ms'])
+        if evento.get('top_k'): primeiros[evento['top_k'][0]['codigo_layout']] += 1
+
+    duracoes.sort()
+    percentil = lambda p: duracoes[min(len(duracoes) - 1, int(p * len(duracoes)))] if duracoes else None
+    return {
+        'total': total,
+        'por_origem': dict(por_origem),
+        'taxa_arquivos_repetidos': repetidas / total if total else 0,
+        'taxa_acerto_cache': acertos_cache / com_cache if com_cache else 0,
+        'latencia_p50_ms': percentil(0.5),
+        'latencia_p95_ms': percentil(0.95),
+        'primeiro_lugar_por_layout': dict(primeiros.most_common()),
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Resumo das buscas registradas no log de eventos.")
+    parser.add_argument('--dias', type=int, help="Considera só os últimos N dias.")
+    args = parser.parse_args()
+
+    desde = datetime.now() - timedelta(days=args.dias) if args.dias else None
+    resumo = resumo_buscas(desde)
+    resumo['primeiro_lugar_por_layout'] = dict(list(resumo['primeiro_lugar_por_layout'].items())[:20])
+    print(json.dumps(resumo, indent=4, ensure_ascii=False))
@@ -0,0 +1,134 @@
+# Arquivo: selecao_texto.py
+#
+# Seleção do texto enviado ao codificador semântico. O modelo só lê os primeiros
+# max_seq_length tokens (128 no distiluse); mandar o documento inteiro gasta tempo
+# tokenizando linhas que serão cortadas, e o que sobra depende da ordem do arquivo.
+# Aqui o texto é montado dentro do orçamento de tokens, por prioridade:
+#   1. faixa do cabeçalho (primeiras linhas: banco, sistema, título do relatório);
+#   2. cabeçalhos de coluna (a linha antes do primeiro movimento e linhas com nomes de coluna);
+#   3. até MAX_LINHAS_MOVIMENTO linhas de movimento, como exemplo da estrutura;
+#   4. demais linhas distintas, na ordem do documento.
+# Movimentos repetidos (mesma forma com outros números) e ruído numérico ficam de fora.
+# Usado igualmente no treino (treinador_em_massa) e na busca (identificador).
+#
+# Uso: python selecao_texto.py <arquivo.txt> [--orcamento 128]   (mostra a seleção de um texto)
+
+import re
+import argparse
+
+VERSAO_SELECAO = 2 # Incrementar ao mudar a seleção; invalida vetores guardados (avaliacao.py)
+ORCAMENTO_PADRAO = 128
+LINHAS_CABECALHO = 12
+MAX_LINHAS_MOVIMENTO = 2
+MAX_CARACTERES_LINHA = 200 # Linhas maiores (XML, OFX numa linha só) são quebradas em trechos
+PALAVRAS_POR_TRECHO = 12
+FRACAO_DIGITOS_MOVIMENTO = 0.3
+MAX_LINHAS_ANALISADAS = 1000 # Em extratos enormes, o fim do arquivo não muda a seleção
+FATOR_CANDIDATOS = 4 # Para de ler quando as candidatas somam 4x o orçamento
+PALAVRAS_COLUNA = {'data', 'histórico', 'historico', 'descrição', 'descricao', 'valor', 'saldo', 'documento', 'doc',
+                   'débito', 'debito', 'crédito', 'credito', 'lançamento', 'lancamento', 'complemento', 'vencimento',
+                   'emissão', 'emissao', 'fornecedor', 'cliente', 'parcela', 'conta', 'total', 'd/c'}
+
+_PADRAO_TOKENS = re.compile(r'[^\W\d_]+|\d+|[^\w\s]')
+_PADRAO_DATA = re.compile(r'\b\d{1,2}[/.-]\d{1,2}(?:[/.-]\d{2,4})?\b')
+_PADRAO_NAN = re.compile(r'\bnan\b') # Células vazias do to_string do Excel (texto já em minúsculas)
+
+def estimar_tokens(texto):
+    """Estimativa barata de tokens WordPiece: palavras longas e números viram várias subpalavras."""
+    total = 0
+    for token in _PADRAO_TOKENS.findall(texto):
+        total += 1 + len(token) // (3 if token.isdigit() else 6)
+    return total
+
+def dividir_linhas(texto):
+    """Gera as linhas não vazias, normalizadas; linhas enormes saem em trechos de PALAVRAS_POR_TRECHO palavras."""
+    for linha in texto.splitlines():
+        linha = " ".join(_PADRAO_NAN.sub(' ', linha).split()) # Sem cortar palavras que começam com 'nan'
+        if not linha: continue
+        if len(linha) <= MAX_CARACTERES_LINHA:
+            yield linha
+            continue
+        palavras = linha.split()
+        for i in range(0, len(palavras), PALAVRAS_POR_TRECHO):
+            yield " ".join(palavras[i:i + PALAVRAS_POR_TRECHO])
+
+def eh_movimento(linha):
+    """Linha de transação: tem data ou vários números e é dominada por dígitos."""
+    sem_espaco = linha.replace(" ", "")
+    digitos = sum(c.isdigit() for c in sem_espaco)
+    if not sem_espaco or digitos / len(sem_espaco) < FRACAO_DIGITOS_MOVIMENTO: return False
+    return bool(_PADRAO_DATA.search(linha)) or len(re.findall(r'\d+', linha)) >= 3
+
+def eh_ruido(linha):
+    """Só números e pontuação, no máximo uma letra solta: datas, valores 'd'/'c', paginação."""
+    return len(re.sub(r'[\W\d_]', '', linha)) <= 1
+
+def eh_cabecalho_coluna(linha):
+    """Nomes de coluna numa linha só (TXT, Excel) ou um por linha (PDF extraído célula a célula)."""
+    palavras = re.findall(r'[^\W\d_]+(?:/[^\W\d_]+)?', linha)
+    return bool(palavras) and sum(p in PALAVRAS_COLUNA for p in palavras) >= min(2, len(palavras)) and not any(c.isdigit() for c in linha)
+
+def forma(linha):
+    """Linha com os números mascarados: movimentos do mesmo tipo ficam com a mesma forma."""
+    return re.sub(r'\d+([.,]\d+)*', '9', linha)
+
+def selecionar_texto(texto, orcamento_tokens=ORCAMENTO_PADRAO):
+    """Texto para o encode, dentro de `orcamento_tokens` (estimados), com as linhas na ordem original."""
+    if not texto or orcamento_tokens <= 0: return ""
+    candidatas, formas_vistas, movimentos, tokens_candidatos = [], set(), 0, 0
+    anterior = None
+    for i, linha in enumerate(dividir_linhas(texto)):
+        # Com candidatas suficientes para encher o orçamento várias vezes, o resto do documento não entraria
+        if i >= MAX_LINHAS_ANALISADAS or tokens_candidatos >= orcamento_tokens * FATOR_CANDIDATOS: break
+        chave = forma(linha)
+        if chave in formas_vistas: continue # Repetição de estrutura (movimentos, rodapés de página)
+        formas_vistas.add(chave)
+        if eh_ruido(linha): continue
+        if eh_movimento(linha):
+            if movimentos == 0 and anterior and anterior[0] > 2:
+                anterior[0] = 2 # A linha logo antes do primeiro movimento costuma ser o cabeçalho das colunas
+            if movimentos >= MAX_LINHAS_MOVIMENTO: continue
+            movimentos += 1
+            prioridade = 3
+        elif i < LINHAS_CABECALHO:
+            prioridade = 1
+        elif eh_cabecalho_coluna(linha):
+            prioridade = 2
+        else:
+            prioridade = 4
+        custo = estimar_tokens(linha)
+        tokens_candidatos += custo
+        anterior = [prioridade, i, linha, custo]
+        candidatas.append(anterior)
+
+    selecionadas, usados = [], 0
+    for prioridade, i, linha, custo in sorted(candidatas):
+        if usados + custo > orcamento_tokens:
+            if prioridade <= 2 and not selecionadas: # Garante algo mesmo se a primeira linha já estoura
+                selecionadas.append((i, linha))
+            continue
+        selecionadas.append((i, linha))
+        usados += custo
+        if usados >= orcamento_tokens: break
+    # Documento só com números (nada selecionável): o começo do texto, como antes
+    return "\n".join(linha for _, linha in sorted(selecionadas)) or texto[:MAX_CARACTERES_LINHA * 4]
+
+def orcamento_do_modelo(modelo):
+    return getattr(modelo, 'max_seq_length', None) or ORCAMENTO_PADRAO
+
+def texto_para_encode(texto, orcamento_tokens=ORCAMENTO_PADRAO, descricao_adicional=None):
+    """Entrada do modelo: seleção do documento, com espaço reservado para a descrição do usuário."""
+    descricao = (descricao_adicional or "").strip().lower()
+    selecionado = selecionar_texto(texto, orcamento_tokens - estimar_tokens(descricao))
+    return f"{selecionado} {descricao}" if descricao else selecionado
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Mostra o texto que seria enviado ao codificador.")
+    parser.add_argument('arquivo', help="Texto extraído (ex.: um .txt do cache_de_texto).")
+    parser.add_argument('--orcamento', type=int, default=ORCAMENTO_PADRAO)
+    args = parser.parse_args()
+
+    with open(args.arquivo, 'r', encoding='utf-8') as f: texto = f.read().lower()
+    selecionado = selecionar_texto(texto, args.orcamento)
+    print(selecionado)
+    print(f"\n--- {len(texto)} -> {len(selecionado)} caracteres; ~{estimar_tokens(texto)} -> ~{estimar_tokens(selecionado)} tokens ---")
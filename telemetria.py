@@ -0,0 +1,221 @@
+# Arquivo: telemetria.py
+#
+# Rastreio leve do pipeline de identificação. Cada chamada de identificar_layout abre um
+# rastreio (origem: streamlit/discord, formato do arquivo) e as funções do pipeline marcam
+# etapas (telemetria.etapa) e contadores (telemetria.contar); fora de um rastreio, as
+# marcações não fazem nada. Os rastreios concluídos alimentam histogramas de latência
+# exportados no formato texto do Prometheus, por HTTP e/ou em arquivo periódico.
+#
+# Variáveis de ambiente (todas opcionais):
+#   PORTA_METRICAS     -> serve /metrics nesta porta
+#   ARQUIVO_METRICAS   -> grava as métricas neste arquivo a cada INTERVALO_METRICAS segundos (padrão 60)
+#   LIMIAR_PERFIL_MS   -> amostra a pilha das requisições e salva o perfil das que passarem do limiar
+
+import os
+import sys
+import time
+import threading
+import contextvars
+from collections import defaultdict, Counter
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DIRETORIO_ATUAL = os.path.dirname(os.path.abspath(__file__))
+PASTA_PERFIS = os.path.join(DIRETORIO_ATUAL, 'perfis')
+LIMITES_SEGUNDOS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+INTERVALO_AMOSTRAGEM = 0.005
+
+_rastreio_atual = contextvars.ContextVar('rastreio_atual', default=None)
+_ultimo = threading.local()
+_trava = threading.Lock()
+_histogramas = {} # (métrica, rótulos) -> Histograma
+_contadores = defaultdict(float) # (métrica, rótulos) -> total
+_exportacao_iniciada = False
+
+class Histograma:
+    def __init__(self):
+        self.baldes = [0] * len(LIMITES_SEGUNDOS)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, segundos):
+        for i, limite in enumerate(LIMITES_SEGUNDOS):
+            if segundos <= limite: self.baldes[i] += 1
+        self.soma += segundos
+        self.total += 1
+
+class Rastreio:
+    """Etapas (ms acumulados por nome) e contadores de uma chamada."""
+
+    def __init__(self, origem, formato):
+        self.origem = origem or 'desconhecida'
+        self.formato = formato or 'desconhecido'
+        self.etapas = defaultdict(float)
+        self.contadores = Counter()
+        self.atributos = {}
+        self.inicio = time.perf_counter()
+        self.duracao_ms = None
+
+    def resumo(self):
+        return {
+            'origem': self.origem, 'formato': self.formato, 'duracao_ms': round(self.duracao_ms or 0, 1),
+            'etapas': {nome: round(ms, 1) for nome, ms in self.etapas.items()}, 'contadores': dict(self.contadores),
+            **self.atributos,
+        }
+
+# --- MARCAÇÕES USADAS PELO PIPELINE ---
+
+@contextmanager
+def rastrear(origem, formato):
+    rastreio = Rastreio(origem, formato)
+    token = _rastreio_atual.set(rastreio)
+    limiar_perfil_ms = float(os.getenv('LIMIAR_PERFIL_MS') or 0) # Lido a cada chamada: o app carrega o .env depois dos imports
+    amostrador = AmostradorPilha(threading.get_ident()) if limiar_perfil_ms > 0 else None
+    try:
+        yield rastreio
+    finally:
+        _rastreio_atual.reset(token)
+        rastreio.duracao_ms = (time.perf_counter() - rastreio.inicio) * 1000
+        if amostrador:
+            amostrador.parar()
+            if rastreio.duracao_ms >= limiar_perfil_ms: amostrador.salvar(rastreio)
+        registrar(rastreio)
+        _ultimo.rastreio = rastreio
+
+@contextmanager
+def etapa(nome):
+    rastreio = _rastreio_atual.get()
+    if rastreio is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        rastreio.etapas[nome] += (time.perf_counter() - inicio) * 1000
+
+def contar(nome, quantidade=1):
+    rastreio = _rastreio_atual.get()
+    if rastreio is not None: rastreio.contadores[nome] += quantidade
+
+def anotar(chave, valor):
+    """Atributo livre do rastreio atual (ex.: digest do arquivo), incluído no resumo."""
+    rastreio = _rastreio_atual.get()
+    if rastreio is not None: rastreio.atributos[chave] = valor
+
+def ultimo_rastreio():
+    """Rastreio concluído mais recente desta thread (para o log da busca)."""
+    return getattr(_ultimo, 'rastreio', None)
+
+# --- AGREGAÇÃO E EXPORTAÇÃO ---
+
+def _histograma(metrica, rotulos):
+    chave = (metrica, rotulos)
+    if chave not in _histogramas: _histogramas[chave] = Histograma()
+    return _histogramas[chave]
+
+def registrar(rastreio):
+    base = (('origem', rastreio.origem), ('formato', rastreio.formato))
+    with _trava:
+        _histograma('identificador_requisicao_segundos', base).observar(rastreio.duracao_ms / 1000)
+        for nome, ms in rastreio.etapas.items():
+            _histograma('identificador_etapa_segundos', base + (('etapa', nome),)).observar(ms / 1000)
+        for nome, quantidade in rastreio.contadores.items():
+            _contadores[('identificador_eventos_total', base + (('evento', nome),))] += quantidade
+
+def _formatar_rotulos(rotulos):
+    return "{" + ",".join(f'{chave}="{valor}"' for chave, valor in rotulos) + "}" if rotulos else ""
+
+def exportar_prometheus():
+    """Métricas acumuladas desde o início do processo, no formato texto do Prometheus."""
+    linhas = []
+    with _trava:
+        for metrica in sorted({m for m, _ in _histogramas}):
+            linhas.append(f"# TYPE {metrica} histogram")
+            for (nome, rotulos), hist in sorted(_histogramas.items()):
+                if nome != metrica: continue
+                for limite, quantidade in zip(LIMITES_SEGUNDOS, hist.baldes):
+                    linhas.append(f"{metrica}_bucket{_formatar_rotulos(rotulos + (('le', limite),))} {quantidade}")
+                linhas.append(f"{metrica}_bucket{_formatar_rotulos(rotulos + (('le', '+Inf'),))} {hist.total}")
+                linhas.append(f"{metrica}_sum{_formatar_rotulos(rotulos)} {hist.soma:.6f}")
+                linhas.append(f"{metrica}_count{_formatar_rotulos(rotulos)} {hist.total}")
+        for metrica in sorted({m for m, _ in _contadores}):
+            linhas.append(f"# TYPE {metrica} counter")
+            for (nome, rotulos), valor in sorted(_contadores.items()):
+                if nome == metrica: linhas.append(f"{metrica}{_formatar_rotulos(rotulos)} {valor:g}")
+    return "\n".join(linhas) + "\n"
+
+class _TratadorMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        corpo = exportar_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args): pass
+
+def _gravar_periodicamente(caminho, intervalo):
+    while True:
+        time.sleep(intervalo)
+        try:
+            with open(caminho + '.tmp', 'w', encoding='utf-8') as f: f.write(exportar_prometheus())
+            os.replace(caminho + '.tmp', caminho)
+        except OSError as e:
+            print(f"Erro ao gravar métricas: {e}")
+
+def iniciar_exportacao():
+    """Liga o endpoint e/ou o arquivo de métricas conforme o ambiente; chamadas repetidas são ignoradas."""
+    global _exportacao_iniciada
+    with _trava:
+        if _exportacao_iniciada: return
+        _exportacao_iniciada = True
+    porta = os.getenv('PORTA_METRICAS')
+    if porta:
+        try:
+            servidor = ThreadingHTTPServer(('0.0.0.0', int(porta)), _TratadorMetricas)
+            threading.Thread(target=servidor.serve_forever, daemon=True, name='metricas-http').start()
+            print(f"Métricas disponíveis em http://localhost:{porta}/metrics")
+        except OSError as e:
+            print(f"Não foi possível abrir a porta de métricas {porta}: {e}")
+    if os.getenv('ARQUIVO_METRICAS'):
+        threading.Thread(target=_gravar_periodicamente, args=(os.getenv('ARQUIVO_METRICAS'), int(os.getenv('INTERVALO_METRICAS', 60))),
+                         daemon=True, name='metricas-arquivo').start()
+
+# --- PERFIL POR AMOSTRAGEM ---
+
+class AmostradorPilha:
+    """
+    Amostra a pilha de uma thread em intervalos fixos enquanto a requisição roda. Se ela
+    passar do limiar (LIMIAR_PERFIL_MS), o perfil é salvo em perfis/ no formato de pilhas colapsadas
+    (uma linha 'arquivo:função;...;arquivo:função contagem'), aceito pelo flamegraph.pl/speedscope.
+    """
+
+    def __init__(self, ident_thread):
+        self.ident_thread = ident_thread
+        self.pilhas = Counter()
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._amostrar, daemon=True, name='amostrador-pilha')
+        self._thread.start()
+
+    def _amostrar(self):
+        while not self._parar.wait(INTERVALO_AMOSTRAGEM):
+            quadro = sys._current_frames().get(self.ident_thread)
+            pilha = []
+            while quadro is not None:
+                pilha.append(f"{os.path.basename(quadro.f_code.co_filename)}:{quadro.f_code.co_name}")
+                quadro = quadro.f_back
+            if pilha: self.pilhas[";".join(reversed(pilha))] += 1
+
+    def parar(self):
+        self._parar.set()
+        self._thread.join()
+
+    def salvar(self, rastreio):
+        os.makedirs(PASTA_PERFIS, exist_ok=True)
+        nome = f"perfil_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{rastreio.origem}_{int(rastreio.duracao_ms)}ms.txt"
+        with open(os.path.join(PASTA_PERFIS, nome), 'w', encoding='utf-8') as f:
+            for pilha, quantidade in self.pilhas.most_common():
+                f.write(f"{pilha} {quantidade}\n")
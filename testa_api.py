@@ -8,7 +8,7 @@ from dotenv import load_dotenv
 # Carrega o segredo do arquivo .env para manter o código limpo
 load_dotenv()
 API_SECRET = os.getenv('API_SECRET', '4722c7e4c11f186a30af5d4be091b236') # Usa o valor padrão se .env não for encontrado
-API_BASE_URL = "https://manager.conciliadorcontabil.com.br/api/"
+API_BASE_URL = os.getenv('MANAGER_API_URL', "https://manager.conciliadorcontabil.com.br/api/").rstrip('/') + '/'
 
 def inspecionar_api_layouts():
     """Conecta na API, busca os dados dos layouts e os imprime na tela."""
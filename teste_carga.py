@@ -0,0 +1,118 @@
+# Arquivo: teste_carga.py
+#
+# Teste de carga do identificar_layout sob o governador de execução. Numa área temporária
+# (como o benchmark.py), gera e treina o corpus sintético e dispara buscas simultâneas com
+# documentos inéditos, que não acertam o cache de extração. Cada combinação das
+# configurações informadas roda uma vez e o relatório traz vazão, latência p50/p95, buscas
+# recusadas ("OCUPADO") e a espera média por recurso.
+#
+# Uso:
+#   python teste_carga.py --clientes 8 --buscas 64 --threads 1,2,4 --limite-encode 1,2
+#   python teste_carga.py --codificador modelo --clientes 4,16 --limite-requisicoes 2,8 --saida carga.json
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import itertools
+import tempfile
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+DIRETORIO_ATUAL = os.path.dirname(os.path.abspath(__file__))
+RECURSOS = ('requisicao', 'encode', 'ocr', 'rasterizacao')
+
+def preparar_modelo(area, quantidade_layouts, semente):
+    """Corpus sintético treinado na área temporária; retorna os layouts."""
+    from benchmark import preparar_area_de_trabalho
+    preparar_area_de_trabalho(area)
+    import metadados_layouts, identificador
+    import treinador_em_massa as treinador
+    from corpus_sintetico import gerar_corpus, metadados_publicos
+
+    print(f"Gerando e treinando o corpus sintético em {area}...")
+    layouts, _ = gerar_corpus(area, quantidade_layouts, 3, semente)
+    metadados_layouts.gravar_layouts(metadados_publicos(layouts))
+    treinador.treinar_modelo_ml()
+    identificador.recarregar_modelo()
+    return layouts
+
+def gerar_consultas(layouts, quantidade, rodada):
+    from corpus_sintetico import TAMANHOS, gerar_documento, limitar_linhas
+    consultas = []
+    for i in range(quantidade):
+        layout = layouts[i % len(layouts)]
+        dados = gerar_documento(layout, limitar_linhas(layout, TAMANHOS['pequeno']), f"carga-{rodada}-{i}")
+        consultas.append((dados, f"consulta_{i}{layout['_extensao']}"))
+    return consultas
+
+def executar_rodada(consultas, clientes):
+    import identificador, telemetria
+
+    def buscar(consulta):
+        dados, nome = consulta
+        inicio = time.perf_counter()
+        resultado = identificador.identificar_layout(dados, nome_arquivo=nome, origem='teste_carga')
+        duracao = (time.perf_counter() - inicio) * 1000
+        return duracao, resultado == "OCUPADO", dict(telemetria.ultimo_rastreio().etapas)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clientes) as executor:
+        respostas = list(executor.map(buscar, consultas))
+    total_s = time.perf_counter() - inicio
+
+    atendidas = sorted(duracao for duracao, ocupado, _ in respostas if not ocupado)
+    percentil = lambda p: round(atendidas[min(len(atendidas) - 1, int(p * len(atendidas)))], 1) if atendidas else None
+    return {
+        'buscas': len(respostas), 'ocupado': sum(ocupado for _, ocupado, _ in respostas),
+        'vazao_por_s': round(len(atendidas) / total_s, 2), 'p50_ms': percentil(0.5), 'p95_ms': percentil(0.95),
+        'espera_media_ms': {recurso: round(statistics.mean(etapas.get(f'espera_{recurso}', 0) for _, _, etapas in respostas), 1)
+                            for recurso in RECURSOS},
+    }
+
+def lista(texto, tipo=int):
+    return [tipo(v) for v in texto.split(',')] if texto else [None]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Teste de carga do identificador com o governador de execução.")
+    parser.add_argument('--codificador', choices=['leve', 'modelo'], default='leve')
+    parser.add_argument('--layouts', type=int, default=14)
+    parser.add_argument('--buscas', type=int, default=48, help="Buscas por combinação.")
+    parser.add_argument('--clientes', default='8', help="Buscas disparadas ao mesmo tempo, ex: 1,4,16.")
+    parser.add_argument('--threads', help="THREADS_INFERENCIA a testar, ex: 1,2,4.")
+    parser.add_argument('--limite-requisicoes', help="LIMITE_REQUISICOES a testar.")
+    parser.add_argument('--limite-encode', help="LIMITE_ENCODE a testar.")
+    parser.add_argument('--limite-ocr', help="LIMITE_OCR a testar.")
+    parser.add_argument('--limite-rasterizacao', help="LIMITE_RASTERIZACAO a testar.")
+    parser.add_argument('--timeout-admissao', type=float, help="TIMEOUT_ADMISSAO (segundos) em todas as combinações.")
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', help="Grava os resultados em JSON.")
+    args = parser.parse_args()
+
+    os.environ['CODIFICADOR_SEMANTICO'] = args.codificador
+    sys.path.insert(0, DIRETORIO_ATUAL)
+    area = tempfile.mkdtemp(prefix='carga_layouts_')
+    resultados = []
+    try:
+        layouts = preparar_modelo(area, args.layouts, args.semente)
+        import identificador
+        combinacoes = list(itertools.product(lista(args.clientes), lista(args.threads), lista(args.limite_requisicoes),
+                                             lista(args.limite_encode), lista(args.limite_ocr), lista(args.limite_rasterizacao)))
+        for rodada, (clientes, threads, requisicoes, encode, ocr, rasterizacao) in enumerate(combinacoes):
+            governador = identificador.configurar_governador(threads, requisicoes, encode, ocr, rasterizacao, args.timeout_admissao)
+            consultas = gerar_consultas(layouts, args.buscas, rodada)
+            configuracao = {'clientes': clientes, 'threads': governador.threads, **{f'limite_{r}': v for r, v in governador.limites.items()}}
+            resultado = {**configuracao, **executar_rodada(consultas, clientes)}
+            resultados.append(resultado)
+            print(f"clientes={clientes:<3} threads={governador.threads:<2} limites={governador.limites} -> "
+                  f"{resultado['vazao_por_s']:6.2f} buscas/s  p50={resultado['p50_ms']} ms  p95={resultado['p95_ms']} ms  "
+                  f"ocupado={resultado['ocupado']}  espera={resultado['espera_media_ms']}")
+    finally:
+        os.chdir(DIRETORIO_ATUAL)
+        shutil.rmtree(area, ignore_errors=True)
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f: json.dump(resultados, f, indent=2, ensure_ascii=False)
+        print(f"Resultados gravados em {args.saida}")
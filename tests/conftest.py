@@ -0,0 +1,35 @@
+import os
+import sys
+import threading
+
+import pytest
+
+# Os módulos do projeto ficam na raiz do repositório, sem pacote
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def exigir_dependencias_do_pipeline():
+    """identificador/treinador importam PyMuPDF, pandas, torch e sentence-transformers no topo."""
+    for modulo in ('fitz', 'pandas', 'PIL', 'torch', 'sentence_transformers', 'streamlit', 'dotenv', 'tqdm'):
+        pytest.importorskip(modulo)
+
+
+@pytest.fixture
+def area_isolada(tmp_path, monkeypatch):
+    """Bancos, artefatos e diretório atual numa pasta temporária (como benchmark.preparar_area_de_trabalho)."""
+    exigir_dependencias_do_pipeline()
+    import corpus_textos, metadados_layouts, identificador
+    monkeypatch.setenv('CODIFICADOR_SEMANTICO', 'leve')
+    monkeypatch.setattr(corpus_textos, 'ARQUIVO_CORPUS', str(tmp_path / 'corpus_textos.db'))
+    monkeypatch.setattr(corpus_textos, '_conexoes', threading.local())
+    monkeypatch.setattr(metadados_layouts, 'ARQUIVO_METADADOS_DB', str(tmp_path / 'metadados_layouts.db'))
+    monkeypatch.setattr(metadados_layouts, 'ARQUIVO_METADADOS_LEGADO', str(tmp_path / 'layouts_meta.json'))
+    monkeypatch.setattr(metadados_layouts, '_conexoes', threading.local())
+    monkeypatch.setattr(metadados_layouts, '_snapshot', {'versao': None, 'layouts': {}})
+    for atributo, nome in [('ARQUIVO_EMBEDDINGS', 'layout_embeddings.joblib'), ('ARQUIVO_LABELS', 'layout_labels.joblib'),
+                           ('ARQUIVO_INDICE_COMPACTO', 'layout_indice_compacto.joblib'), ('ARQUIVO_INDICE_WAL', 'layout_indice_wal.jsonl'),
+                           ('ARQUIVO_VERSAO_MODELO', 'model_version.txt'), ('PASTA_TREINAMENTO', 'arquivos_de_treinamento')]:
+        monkeypatch.setattr(identificador, atributo, str(tmp_path / nome))
+    (tmp_path / 'arquivos_de_treinamento').mkdir()
+    monkeypatch.chdir(tmp_path) # O treinador usa caminhos relativos
+    return tmp_path
@@ -0,0 +1,68 @@
+import json
+import time
+
+import pytest
+
+import agendador_treinamento as agendador
+
+
+@pytest.fixture
+def fila(tmp_path, monkeypatch):
+    monkeypatch.setattr(agendador, 'DIRETORIO_ATUAL', str(tmp_path))
+    monkeypatch.setattr(agendador, 'ARQUIVO_FILA', str(tmp_path / 'fila.db'))
+    monkeypatch.setattr(agendador, 'ARQUIVO_TRAVA', str(tmp_path / 'treinamento.lock'))
+    monkeypatch.setattr(agendador, 'DEBOUNCE_SEGUNDOS', 0)
+    monkeypatch.setattr(agendador, 'iniciar_worker', lambda: None)
+    return tmp_path
+
+
+def pedido(id_, tipo, layouts):
+    return (id_, tipo, json.dumps(layouts))
+
+
+def test_coalescer_une_layouts_e_escolhe_o_tipo_mais_abrangente():
+    assert agendador.coalescer_pedidos([pedido(1, 'incremental', ['2', '1']), pedido(2, 'incremental', ['1', '3'])]) == ('incremental', ['1', '2', '3'])
+    assert agendador.coalescer_pedidos([pedido(1, 'incremental', ['1']), pedido(2, 'completo', [])])[0] == 'completo'
+    assert agendador.coalescer_pedidos([pedido(1, 'sincronizar', []), pedido(2, 'incremental', ['7'])]) == ('sincronizar', ['7'])
+
+
+def test_worker_executa_os_pedidos_pendentes_uma_vez(fila, monkeypatch):
+    execucoes = []
+    monkeypatch.setattr(agendador, 'executar_treinamento', lambda tipo, layouts, con: execucoes.append((tipo, layouts)))
+    agendador.solicitar_treinamento('incremental', ['10'], motivo='a')
+    agendador.solicitar_treinamento('incremental', ['20', '10'], motivo='b')
+
+    agendador.executar_worker()
+
+    assert execucoes == [('incremental', ['10', '20'])]
+    status = agendador.obter_status()
+    assert status['geracao'] == 1 and status['pendentes'] == 0 and status['estado'] == 'ocioso'
+    assert not agendador.worker_ativo() # O sinal é apagado na saída
+
+
+def test_sinal_de_vida_define_worker_ativo(fila):
+    assert not agendador.worker_ativo()
+    agendador.gravar_status(worker_pid=123, worker_sinal=time.time())
+    assert agendador.worker_ativo()
+    agendador.gravar_status(worker_sinal=time.time() - agendador.TOLERANCIA_SINAL - 1)
+    assert not agendador.worker_ativo()
+
+
+def test_consultar_status_nao_disputa_a_trava_do_worker(fila):
+    trava = agendador.TravaArquivo()
+    assert trava.tentar_adquirir()
+    try:
+        agendador.gravar_status(estado='executando', worker_pid=123, worker_sinal=time.time())
+        assert agendador.obter_status()['estado'] == 'executando'
+    finally:
+        trava.liberar()
+    # Consultas repetidas não seguram a trava: um worker novo sempre consegue adquiri-la
+    agendador.obter_status()
+    nova = agendador.TravaArquivo()
+    assert nova.tentar_adquirir()
+    nova.liberar()
+
+
+def test_worker_morto_aparece_como_interrompido(fila):
+    agendador.gravar_status(estado='executando', worker_pid=123, worker_sinal=time.time() - 3600)
+    assert agendador.obter_status()['estado'] == 'interrompido'
@@ -0,0 +1,106 @@
+import io
+import os
+import sqlite3
+import zipfile
+
+import pytest
+
+import backup
+
+
+@pytest.fixture
+def projeto(tmp_path, monkeypatch):
+    raiz = tmp_path / 'projeto'
+    (raiz / 'arquivos_de_treinamento').mkdir(parents=True)
+    pasta_backups = tmp_path / 'backups'
+    monkeypatch.setattr(backup, 'DIRETORIO_ATUAL', str(raiz))
+    monkeypatch.setattr(backup, 'PASTA_OBJETOS', str(pasta_backups / 'objetos'))
+    monkeypatch.setattr(backup, 'PASTA_GERACOES', str(pasta_backups / 'geracoes'))
+    monkeypatch.setattr(backup, 'PASTA_EXPORTACOES', str(pasta_backups / 'exportacoes'))
+    return raiz
+
+
+def abrir_banco(caminho):
+    con = sqlite3.connect(caminho)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("CREATE TABLE IF NOT EXISTS documentos (nome TEXT PRIMARY KEY)")
+    return con
+
+
+def test_geracao_nova_so_guarda_objetos_alterados(projeto):
+    (projeto / 'model_version.txt').write_text('v1')
+    (projeto / 'arquivos_de_treinamento' / '1_a.txt').write_text('extrato a')
+    primeira = backup.criar_geracao()
+    (projeto / 'arquivos_de_treinamento' / '2_b.txt').write_text('extrato b')
+    segunda = backup.criar_geracao()
+
+    assert primeira['objetos_novos'] == 2
+    assert segunda['objetos_novos'] == 1 and segunda['anterior'] == primeira['geracao']
+    assert set(segunda['arquivos']) == {'model_version.txt', 'arquivos_de_treinamento/1_a.txt', 'arquivos_de_treinamento/2_b.txt'}
+
+
+def test_restauracao_volta_ao_estado_da_geracao(projeto):
+    caminho_db = str(projeto / 'corpus_textos.db')
+    con = abrir_banco(caminho_db)
+    with con: con.execute("INSERT INTO documentos VALUES ('1_a.txt')")
+    (projeto / 'model_version.txt').write_text('v1')
+    (projeto / 'arquivos_de_treinamento' / '1_a.txt').write_text('extrato a')
+    geracao = backup.criar_geracao()['geracao']
+
+    # Depois do backup: banco alterado por uma conexão que continua aberta, arquivos novos e alterados
+    with con: con.execute("INSERT INTO documentos VALUES ('2_b.txt')")
+    (projeto / 'model_version.txt').write_text('v2')
+    (projeto / 'arquivos_de_treinamento' / '2_b.txt').write_text('extrato b')
+    (projeto / 'layout_indice_wal.jsonl').write_text('{}\n')
+
+    assert backup.restaurar_geracao(geracao) == 3
+
+    assert (projeto / 'model_version.txt').read_text() == 'v1'
+    assert sorted(os.listdir(projeto / 'arquivos_de_treinamento')) == ['1_a.txt']
+    assert not (projeto / 'layout_indice_wal.jsonl').exists()
+    # A conexão aberta vê o banco restaurado, que continua íntegro
+    assert con.execute("SELECT nome FROM documentos").fetchall() == [('1_a.txt',)]
+    con.close()
+    con = abrir_banco(caminho_db)
+    assert con.execute("PRAGMA integrity_check").fetchone()[0] == 'ok'
+    assert con.execute("SELECT COUNT(*) FROM documentos").fetchone()[0] == 1
+    con.close()
+
+
+def test_exportacao_zip_tem_os_arquivos_da_geracao(projeto, tmp_path):
+    (projeto / 'model_version.txt').write_text('v1')
+    (projeto / 'arquivos_de_treinamento' / '1_a.txt').write_text('extrato a')
+    geracao = backup.criar_geracao()['geracao']
+
+    destino = backup.exportar_zip(geracao, str(tmp_path / 'exportacoes' / 'backup_layouts_teste.zip'))
+
+    with zipfile.ZipFile(destino) as zf:
+        assert zf.read('arquivos_de_treinamento/1_a.txt') == b'extrato a'
+        assert zf.read('model_version.txt') == b'v1'
+
+
+def test_restauracao_recusa_enquanto_o_treinamento_tem_a_trava(projeto):
+    (projeto / 'model_version.txt').write_text('v1')
+    geracao = backup.criar_geracao()['geracao']
+    (projeto / 'model_version.txt').write_text('v2')
+
+    worker = backup.TravaArquivo(str(projeto / 'treinamento.lock'))
+    assert worker.tentar_adquirir()
+    try:
+        with pytest.raises(backup.TreinamentoEmAndamento):
+            backup.restaurar_geracao(geracao)
+        assert (projeto / 'model_version.txt').read_text() == 'v2'
+    finally:
+        worker.liberar()
+    assert backup.restaurar_geracao(geracao) == 1
+
+
+def test_conteudo_zip_nao_deixa_arquivo_exportado(projeto, tmp_path):
+    (projeto / 'model_version.txt').write_text('v1')
+    geracao = backup.criar_geracao()['geracao']
+
+    conteudo = backup.conteudo_zip(geracao)
+
+    with zipfile.ZipFile(io.BytesIO(conteudo)) as zf:
+        assert zf.read('model_version.txt') == b'v1'
+    assert not (tmp_path / 'backups' / 'exportacoes').exists()
@@ -0,0 +1,24 @@
+def test_cache_legado_e_fallback_ate_a_reextracao(area_isolada):
+    import corpus_textos
+    import treinador_em_massa as treinador
+    from identificador import parametros_extracao
+
+    (area_isolada / 'arquivos_de_treinamento' / '10_extrato.txt').write_text("extrato atual banco do brasil")
+    (area_isolada / 'arquivos_de_treinamento' / '11_razao.txt').write_text("razao contabil atual")
+    (area_isolada / 'cache_de_texto').mkdir()
+    (area_isolada / 'cache_de_texto' / '10_extrato.txt.txt').write_text("texto do extrator legado")
+    (area_isolada / 'cache_de_texto' / '99_apagado.pdf.txt').write_text("sem arquivo de treinamento")
+
+    treinador.migrar_cache_legado()
+    digest = corpus_textos.documentos_registrados()['10_extrato.txt'][1]
+    legado = parametros_extracao('.txt', versao=treinador.VERSAO_CACHE_LEGADO)
+    assert corpus_textos.ler_extracao(digest, 'texto', legado) == {'texto': "texto do extrator legado", 'foi_ocr': False}
+    assert corpus_textos.ler_extracao(digest, 'texto', parametros_extracao('.txt')) is None # Nunca passa por extração atual
+
+    treinador.compactar_corpus()
+    assert corpus_textos.ler_extracao(digest, 'texto', legado) # Ainda é o único texto do documento
+
+    treinador.reextrair_legado()
+    assert corpus_textos.ler_extracao(digest, 'texto', parametros_extracao('.txt'))['texto'] == "extrato atual banco do brasil"
+    treinador.compactar_corpus()
+    assert corpus_textos.ler_extracao(digest, 'texto', legado) is None
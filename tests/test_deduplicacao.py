@@ -0,0 +1,48 @@
+import random
+
+from deduplicacao import (calcular_simhash, distancia_hamming, agrupar_quase_duplicatas, selecionar_representantes,
+                          DISTANCIA_MAXIMA_DUPLICATA, MAX_AMOSTRAS_POR_LAYOUT)
+
+
+def extrato(banco, movimentos, semente):
+    aleatorio = random.Random(semente)
+    linhas = [f"{banco} extrato de conta corrente agencia 1234 conta 56789", "data historico documento valor saldo"]
+    for i in range(movimentos):
+        linhas.append(f"{i % 28 + 1:02d}/05/2024 {aleatorio.choice(['pix recebido', 'tarifa bancaria', 'pagamento boleto', 'ted enviada'])} "
+                      f"{aleatorio.randint(1000, 9999)} {aleatorio.randint(1, 9999)},{aleatorio.randint(0, 99):02d}")
+    return "\n".join(linhas)
+
+
+def test_simhash_e_deterministico_e_vazio_retorna_zero():
+    texto = extrato("banco do brasil", 40, 1)
+    assert calcular_simhash(texto) == calcular_simhash(texto)
+    assert calcular_simhash("") == 0 and calcular_simhash("-- !! --") == 0
+
+
+def test_quase_duplicata_fica_perto_e_outro_documento_longe():
+    original = extrato("banco do brasil", 60, 1)
+    copia = original.replace("tarifa bancaria", "tarifa bancária", 1) + "\npagina 2 de 2"
+    outro = extrato("caixa economica federal", 60, 2)
+    assert distancia_hamming(calcular_simhash(original), calcular_simhash(copia)) <= DISTANCIA_MAXIMA_DUPLICATA
+    assert distancia_hamming(calcular_simhash(original), calcular_simhash(outro)) > DISTANCIA_MAXIMA_DUPLICATA
+
+
+def test_agrupamento_guloso_usa_o_primeiro_como_representante():
+    assert agrupar_quase_duplicatas([0b0, 0b1, 0b11, (1 << 40) - 1], distancia_maxima=2) == [[0, 1, 2], [3]]
+
+
+def test_representantes_priorizam_grupos_maiores_e_arquivos_originais():
+    a = extrato("banco do brasil", 60, 1)
+    b = extrato("caixa economica federal", 60, 2)
+    amostras = [("10_confirmed_20240101_a.txt", a), ("10_a.txt", a), ("10_a_copia.txt", a + "\nfim"), ("10_b.txt", b)]
+
+    representantes, grupos = selecionar_representantes(amostras, max_amostras=1)
+
+    assert [nome for nome, _ in representantes] == ["10_a.txt"]
+    assert sorted(len(grupo) for grupo in grupos) == [1, 3]
+
+
+def test_limite_padrao_mantem_o_indice_pequeno():
+    amostras = [(f"10_{banco}.txt", extrato(banco, 60, i)) for i, banco in enumerate(["bb", "caixa", "itau", "bradesco", "santander"])]
+    representantes, grupos = selecionar_representantes(amostras)
+    assert len(grupos) == 5 and len(representantes) == MAX_AMOSTRAS_POR_LAYOUT <= 3
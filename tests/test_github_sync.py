@@ -0,0 +1,153 @@
+import json
+import base64
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+pytest.importorskip('requests')
+pytest.importorskip('streamlit')
+pytest.importorskip('dotenv')
+
+
+def sha_git(tipo, conteudo):
+    return hashlib.sha1(f"{tipo} {len(conteudo)}\0".encode() + conteudo).hexdigest()
+
+
+class GitHubFalso(BaseHTTPRequestHandler):
+    """Stand-in da API do GitHub: branch padrão e refs, commits, árvores e blobs da Git Data API."""
+    estado = None
+
+    @classmethod
+    def reiniciar(cls, arquivos):
+        cls.estado = {'blobs': {}, 'arvores': {}, 'commits': {}, 'refs': {}, 'posts': [], 'mover_ref': None}
+        arvore = cls.gravar_arvore({nome: cls.gravar_blob(conteudo) for nome, conteudo in arquivos.items()})
+        cls.estado['refs']['principal'] = cls.gravar_commit(arvore, [])
+
+    @classmethod
+    def gravar_blob(cls, conteudo):
+        sha = sha_git('blob', conteudo)
+        cls.estado['blobs'][sha] = conteudo
+        return sha
+
+    @classmethod
+    def gravar_arvore(cls, entradas):
+        sha = sha_git('tree', json.dumps(entradas, sort_keys=True).encode())
+        cls.estado['arvores'][sha] = entradas
+        return sha
+
+    @classmethod
+    def gravar_commit(cls, arvore, pais):
+        sha = sha_git('commit', json.dumps([arvore, pais, len(cls.estado['commits'])]).encode())
+        cls.estado['commits'][sha] = {'arvore': arvore, 'pais': pais}
+        return sha
+
+    @classmethod
+    def arquivos_da_branch(cls):
+        commit = cls.estado['commits'][cls.estado['refs']['principal']]
+        return {nome: cls.estado['blobs'][sha] for nome, sha in cls.estado['arvores'][commit['arvore']].items()}
+
+    def responder(self, status, corpo):
+        dados = json.dumps(corpo).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def ler_corpo(self):
+        return json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+
+    def do_GET(self):
+        estado, caminho = self.estado, self.path.split('?')[0]
+        if caminho == '/repos/dono/repo':
+            self.responder(200, {'default_branch': 'principal'})
+        elif caminho.startswith('/repos/dono/repo/git/ref/heads/'):
+            self.responder(200, {'object': {'sha': estado['refs'][caminho.rsplit('/', 1)[1]]}})
+        elif caminho.startswith('/repos/dono/repo/git/commits/'):
+            self.responder(200, {'tree': {'sha': estado['commits'][caminho.rsplit('/', 1)[1]]['arvore']}})
+        elif caminho.startswith('/repos/dono/repo/git/trees/'):
+            entradas = estado['arvores'][caminho.rsplit('/', 1)[1]]
+            self.responder(200, {'tree': [{'path': nome, 'type': 'blob', 'sha': sha} for nome, sha in entradas.items()]})
+        else:
+            self.responder(404, {'message': 'Not Found'})
+
+    def do_POST(self):
+        corpo = self.ler_corpo()
+        tipo = self.path.rsplit('/', 1)[1]
+        self.estado['posts'].append(tipo)
+        if tipo == 'blobs':
+            self.responder(201, {'sha': self.gravar_blob(base64.b64decode(corpo['content']))})
+        elif tipo == 'trees':
+            entradas = dict(self.estado['arvores'][corpo['base_tree']])
+            entradas.update({item['path']: item['sha'] for item in corpo['tree']})
+            self.responder(201, {'sha': self.gravar_arvore(entradas)})
+        else:
+            self.responder(201, {'sha': self.gravar_commit(corpo['tree'], corpo['parents'])})
+
+    def do_PATCH(self):
+        corpo = self.ler_corpo()
+        estado = self.estado
+        if estado['mover_ref']: # Outro processo publica entre a leitura e a atualização da ref
+            arquivos, estado['mover_ref'] = dict(self.arquivos_da_branch(), **estado['mover_ref']), None
+            arvore = self.gravar_arvore({nome: self.gravar_blob(conteudo) for nome, conteudo in arquivos.items()})
+            estado['refs']['principal'] = self.gravar_commit(arvore, [estado['refs']['principal']])
+        if estado['commits'][corpo['sha']]['pais'] != [estado['refs']['principal']]:
+            self.responder(422, {'message': 'Update is not a fast forward'})
+            return
+        estado['refs']['principal'] = corpo['sha']
+        self.responder(200, {'object': {'sha': corpo['sha']}})
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def github(monkeypatch):
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), GitHubFalso)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    monkeypatch.setenv('GITHUB_TOKEN', 'token-teste')
+    monkeypatch.setenv('REPO_NAME', 'dono/repo')
+    monkeypatch.setenv('GITHUB_API_URL', f"http://127.0.0.1:{servidor.server_port}")
+    monkeypatch.delenv('BRANCH_NAME', raising=False)
+    GitHubFalso.reiniciar({'model_version.txt': b'v1', 'README.md': b'leia-me'})
+    yield GitHubFalso
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def test_publica_so_os_alterados_em_um_unico_commit(github, tmp_path):
+    import github_sync
+    (tmp_path / 'model_version.txt').write_bytes(b'v1')
+    (tmp_path / 'layout_labels.joblib').write_bytes(bytes(range(256)) * 50)
+    (tmp_path / 'mapeamento_layouts.xlsx').write_bytes(b'planilha')
+    caminhos = [str(tmp_path / nome) for nome in ('model_version.txt', 'layout_labels.joblib', 'mapeamento_layouts.xlsx')]
+    head_anterior = github.estado['refs']['principal']
+
+    assert github_sync.upload_files_to_github(caminhos)
+
+    # model_version.txt não mudou: só dois blobs, uma árvore e um commit sobre o HEAD da branch padrão
+    assert sorted(github.estado['posts']) == ['blobs', 'blobs', 'commits', 'trees']
+    commit = github.estado['commits'][github.estado['refs']['principal']]
+    assert commit['pais'] == [head_anterior]
+    assert github.arquivos_da_branch() == {'model_version.txt': b'v1', 'README.md': b'leia-me',
+                                           'layout_labels.joblib': bytes(range(256)) * 50, 'mapeamento_layouts.xlsx': b'planilha'}
+
+    # Nada mudou desde a publicação: nenhum commit novo
+    github.estado['posts'].clear()
+    assert github_sync.upload_files_to_github(caminhos)
+    assert github.estado['posts'] == []
+
+
+def test_ref_movida_refaz_o_commit_sobre_o_novo_head(github, tmp_path):
+    import github_sync
+    (tmp_path / 'model_version.txt').write_bytes(b'v2')
+    github.estado['mover_ref'] = {'outro.txt': b'publicado por outro processo'}
+
+    assert github_sync.upload_files_to_github([str(tmp_path / 'model_version.txt')])
+
+    # O 422 refaz árvore e commit, mas o blob já enviado é reaproveitado
+    assert github.estado['posts'] == ['blobs', 'trees', 'commits', 'trees', 'commits']
+    assert github.arquivos_da_branch() == {'model_version.txt': b'v2', 'README.md': b'leia-me',
+                                           'outro.txt': b'publicado por outro processo'}
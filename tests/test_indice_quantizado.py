@@ -0,0 +1,148 @@
+import threading
+import time
+
+import joblib
+import numpy as np
+import pytest
+
+import indice_quantizado
+from indice_quantizado import IndiceQuantizado, LinhasEmDisco, PontuadorCompacto, carregar_indice, normalizar, quantizar
+
+
+def embeddings_agrupados(quantidade=3000, dimensao=64, layouts=40, semente=0):
+    """Vetores em torno de um centro por layout, como documentos do mesmo banco."""
+    aleatorio = np.random.default_rng(semente)
+    centros = aleatorio.normal(size=(layouts, dimensao))
+    labels = aleatorio.integers(0, layouts, quantidade)
+    return (centros[labels] + aleatorio.normal(scale=0.8, size=(quantidade, dimensao))).astype(np.float32), [str(l) for l in labels]
+
+
+@pytest.fixture(params=['torch', 'numpy'])
+def caminho_pontuacao(request, monkeypatch):
+    if request.param == 'numpy': monkeypatch.setattr(indice_quantizado, 'torch', None)
+    return request.param
+
+
+@pytest.mark.parametrize('precisao', ['int8', 'float16', 'float32'])
+def test_reavaliacao_recupera_os_vizinhos_exatos(precisao, caminho_pontuacao):
+    embeddings, _ = embeddings_agrupados()
+    exatos = normalizar(embeddings)
+    indice = IndiceQuantizado(quantizar(embeddings, precisao), embeddings)
+    aleatorio = np.random.default_rng(1)
+    for linha in aleatorio.choice(len(embeddings), 20, replace=False):
+        consulta = normalizar(exatos[linha] + aleatorio.normal(scale=0.02, size=exatos.shape[1]))
+        referencia = exatos @ consulta
+        aproximadas = indice.similaridades(consulta, candidatos=0)
+        assert np.abs(aproximadas - referencia).max() < 0.02
+        sims = indice.similaridades(consulta)
+        assert set(np.argsort(-sims)[:10]) == set(np.argsort(-referencia)[:10])
+        assert np.allclose(sims[np.argsort(-referencia)[:10]], np.sort(referencia)[::-1][:10], atol=1e-5)
+
+
+def test_pontuacao_int8_acumula_em_int32_sem_estourar():
+    vetores = np.full((3, 512), 127, dtype=np.int8) # 512 × 127² passa muito do limite do int16
+    escalas = np.ones(3, dtype=np.float32) / 127
+    consulta = np.full(512, 1 / np.sqrt(512), dtype=np.float32)
+    sims = indice_quantizado.pontuar_compacto(vetores, escalas, consulta)
+    assert np.allclose(sims, 512 / np.sqrt(512), rtol=1e-3)
+
+
+def test_float32_pontua_nos_embeddings_sem_copia_normalizada():
+    embeddings, _ = embeddings_agrupados(quantidade=1100)
+    pontuador = PontuadorCompacto(quantizar(embeddings, 'float32'), embeddings)
+    assert pontuador.vetores is embeddings and pontuador.nbytes == 1100 * 4 # Só o inverso das normas
+    consulta = normalizar(embeddings[7])
+    assert np.allclose(pontuador.pontuar(consulta), normalizar(embeddings) @ consulta, atol=1e-5)
+
+
+def test_inclusao_entra_na_busca_e_chave_repetida_substitui(caminho_pontuacao):
+    embeddings, labels = embeddings_agrupados(quantidade=500)
+    indice = IndiceQuantizado(quantizar(embeddings), embeddings, labels)
+    novo = np.random.default_rng(5).normal(size=64).astype(np.float32)
+
+    assert indice.adicionar([novo], ['999'], ['digest-1']) == 1
+    sims, rotulos = indice.buscar(novo)
+    assert len(indice) == 501 and rotulos[int(np.argmax(sims))] == '999'
+    assert np.isclose(sims.max(), 1.0, atol=1e-5)
+
+    indice.adicionar([novo], ['1000'], ['digest-1'])
+    sims, rotulos = indice.buscar(novo)
+    assert len(indice) == 501 and rotulos[int(np.argmax(sims))] == '1000'
+    assert indice.adicionar([np.ones(32)], ['7'], ['outra-dimensao']) == 0
+
+
+def test_linhas_em_disco_leem_do_arquivo_e_param_se_ele_for_trocado(tmp_path, monkeypatch):
+    embeddings, labels = embeddings_agrupados(quantidade=300)
+    caminho = str(tmp_path / 'layout_embeddings.joblib')
+    joblib.dump(embeddings, caminho)
+    joblib.dump(labels, str(tmp_path / 'layout_labels.joblib'))
+    monkeypatch.setattr(indice_quantizado, 'MAPEAR_EMBEDDINGS', False)
+
+    indice = carregar_indice(caminho, str(tmp_path / 'compacto.joblib'), str(tmp_path / 'layout_labels.joblib'), None, 'int8')
+    assert isinstance(indice.exatos, LinhasEmDisco)
+    assert np.array_equal(indice.exatos[[3, 150, 299]], embeddings[[3, 150, 299]])
+    consulta = normalizar(embeddings[42])
+    assert np.isclose(indice.similaridades(consulta)[42], 1.0, atol=1e-5)
+
+    joblib.dump(embeddings[::-1].copy(), caminho + '.tmp')
+    indice_quantizado.os.replace(caminho + '.tmp', caminho) # Retreino trocou o arquivo
+    assert indice.exatos[[3]] is None
+    sims = indice.similaridades(consulta) # Fica com a pontuação compacta até a recarga
+    assert int(np.argmax(sims)) == 42
+
+
+def test_float32_em_disco_pontua_por_blocos_do_arquivo(tmp_path, monkeypatch):
+    embeddings, labels = embeddings_agrupados(quantidade=1300)
+    caminho = str(tmp_path / 'layout_embeddings.joblib')
+    joblib.dump(embeddings, caminho)
+    joblib.dump(labels, str(tmp_path / 'layout_labels.joblib'))
+    monkeypatch.setattr(indice_quantizado, 'MAPEAR_EMBEDDINGS', False)
+
+    indice = carregar_indice(caminho, str(tmp_path / 'compacto.joblib'), str(tmp_path / 'layout_labels.joblib'), None, 'float32')
+    assert isinstance(indice.exatos, LinhasEmDisco) and indice.memoria_bytes() == 1300 * 4
+    consulta = normalizar(embeddings[900])
+    assert np.allclose(indice.similaridades(consulta), normalizar(embeddings) @ consulta, atol=1e-5)
+
+
+def test_log_de_inclusoes_chega_aos_outros_processos_e_a_compactacao_troca_o_arquivo(tmp_path):
+    wal = str(tmp_path / 'layout_indice_wal.jsonl')
+    embeddings, labels = embeddings_agrupados(quantidade=200)
+    site, bot = (IndiceQuantizado(quantizar(embeddings), embeddings, labels) for _ in range(2))
+    vetores = np.random.default_rng(7).normal(size=(3, 64)).astype(np.float32)
+
+    indice_quantizado.registrar_no_wal(wal, 'a', '901', vetores[0])
+    indice_quantizado.registrar_no_wal(wal, 'b', '902', vetores[1])
+    assert bot.aplicar_wal(wal) and len(bot) == 202
+    with open(wal, 'ab') as f: f.write(b'{"ts": 1, "chave": "meia') # Queda no meio de uma gravação
+    assert bot.aplicar_wal(wal) and len(bot) == 202
+
+    corte = time.time()
+    indice_quantizado.registrar_no_wal(wal, 'c', '903', vetores[2])
+    assert indice_quantizado.compactar_wal(wal, corte, labels=['901']) == 1 # '902' não foi retreinado
+    assert not bot.aplicar_wal(wal) # Log trocado: o processo recarrega
+    assert site.aplicar_wal(wal) and site.labels[200:] == ['902', '903']
+    assert indice_quantizado.compactar_wal(wal, corte, labels=['901']) == 0
+
+
+def test_inclusoes_durante_a_compactacao_nao_se_perdem(tmp_path):
+    wal = str(tmp_path / 'layout_indice_wal.jsonl')
+    vetor = np.ones(8, dtype=np.float32)
+    gravadas, parar = [], threading.Event()
+
+    def confirmar(prefixo):
+        i = 0
+        while not parar.is_set() or i < 50:
+            indice_quantizado.registrar_no_wal(wal, f"{prefixo}{i}", 'novo', vetor)
+            indice_quantizado.registrar_no_wal(wal, f"{prefixo}v{i}", 'velho', vetor)
+            gravadas.append(f"{prefixo}{i}")
+            i += 1
+
+    threads = [threading.Thread(target=confirmar, args=(p,)) for p in 'xy']
+    for thread in threads: thread.start()
+    for _ in range(100): indice_quantizado.compactar_wal(wal, time.time(), labels=['velho'])
+    parar.set()
+    for thread in threads: thread.join()
+    indice_quantizado.compactar_wal(wal, time.time(), labels=['velho'])
+
+    entradas = indice_quantizado.ler_wal(wal)[0]
+    assert sorted(e['chave'] for e in entradas) == sorted(gravadas)
@@ -0,0 +1,52 @@
+import io
+import zipfile
+
+import pytest
+
+
+@pytest.fixture
+def ingestao(area_isolada, monkeypatch):
+    import ingestao_zip
+    monkeypatch.setattr(ingestao_zip, 'PASTA_TREINAMENTO', str(area_isolada / 'arquivos_de_treinamento'))
+    return ingestao_zip
+
+
+def zip_com(membros, nome='lote.zip'):
+    dados = io.BytesIO()
+    with zipfile.ZipFile(dados, 'w') as z:
+        z.writestr('pasta/', b'')
+        for nome_membro, conteudo in membros.items():
+            z.writestr(nome_membro, conteudo)
+    dados.seek(0)
+    dados.name = nome
+    return dados
+
+
+def test_duplicados_do_mesmo_envio_de_reenvio_e_da_pasta(ingestao, area_isolada):
+    (area_isolada / 'arquivos_de_treinamento' / '12_copiado_a_mao.txt').write_bytes(b"razao contabil empresa x")
+    membros = {'pasta/10_extrato.txt': b"extrato banco do brasil maio", '10_extrato_copia.txt': b"extrato banco do brasil maio",
+               '11_razao.txt': b"razao contabil empresa x", 'leiame.txt': b"sem codigo"}
+
+    status = {item['arquivo']: item['status'] for item in ingestao.processar_zips([zip_com(membros)])}
+    assert status == {'10_extrato.txt': "novo", '10_extrato_copia.txt': "duplicado no mesmo lote",
+                      '11_razao.txt': "duplicado de 12_copiado_a_mao.txt", 'leiame.txt': "nome sem código de layout no início"}
+
+    reenvio = {item['arquivo']: item['status'] for item in ingestao.processar_zips([zip_com(membros)])}
+    assert reenvio['10_extrato.txt'] == "duplicado de 10_extrato.txt"
+
+
+def test_barra_de_progresso_conta_so_arquivos(ingestao):
+    lote = zip_com({'pasta/10_a.txt': b"a", '__MACOSX/._10_a.txt': b"", '11_b.pdf': b"b", 'leiame.md': b"c"})
+    assert ingestao.contar_membros([lote]) == 3 # 10_a, 11_b e o rejeitado por extensão
+
+
+def test_threads_limitadas_pelas_vagas_de_ocr(ingestao, monkeypatch):
+    import identificador
+    monkeypatch.setattr(identificador, '_governador', None) # Restaurado ao fim do teste
+    identificador.configurar_governador(limite_ocr=2)
+    monkeypatch.setattr(ingestao, 'MAX_WORKERS_EXTRACAO', 4)
+    usados = []
+    original = ingestao.ThreadPoolExecutor
+    monkeypatch.setattr(ingestao, 'ThreadPoolExecutor', lambda max_workers: usados.append(max_workers) or original(max_workers))
+    list(ingestao.processar_zips([zip_com({'10_a.txt': b"extrato"})]))
+    assert usados == [2]
@@ -0,0 +1,57 @@
+import threading
+
+import pytest
+
+pytest.importorskip('pytesseract')
+pytest.importorskip('PIL')
+
+import motor_ocr
+from motor_ocr import MotorOCR, OCROcupado, timeouts_ocr
+
+
+def imagem():
+    from PIL import Image
+    return Image.new('RGB', (20, 20), 'white')
+
+
+def test_timeout_do_tesseract_e_falha_de_ocr_e_nao_ocupado(monkeypatch):
+    def estourar(*args, **kwargs):
+        raise RuntimeError('Tesseract process timeout')
+    monkeypatch.setattr(motor_ocr.pytesseract, 'image_to_string', estourar)
+    motor = MotorOCR(usar_tesserocr=False)
+    antes = timeouts_ocr()
+
+    assert motor.reconhecer(imagem(), timeout=1) == ""
+    assert timeouts_ocr() == antes + 1
+    assert motor._vagas.acquire(blocking=False) # A vaga foi devolvida
+
+
+def test_ocupado_so_quando_nao_ha_vaga_no_pool(monkeypatch):
+    monkeypatch.setattr(motor_ocr.pytesseract, 'image_to_string', lambda *args, **kwargs: "texto")
+    motor = MotorOCR(max_workers=1, usar_tesserocr=False)
+    assert motor.reconhecer(imagem()) == "texto"
+    motor._vagas.acquire()
+    with pytest.raises(OCROcupado):
+        motor.reconhecer(imagem(), timeout=0.05)
+
+
+def test_timeout_e_por_thread():
+    vistos = []
+    thread = threading.Thread(target=lambda: vistos.append((motor_ocr.registrar_timeout("teste"), timeouts_ocr())))
+    antes = timeouts_ocr()
+    thread.start()
+    thread.join()
+    assert vistos == [("", 1)] and timeouts_ocr() == antes
+
+
+def test_texto_com_timeout_de_ocr_nao_vai_para_o_cache(area_isolada, monkeypatch):
+    import corpus_textos, identificador
+
+    def extrair(dados, senha_manual=None, nome_arquivo=None):
+        motor_ocr.registrar_timeout("página lenta")
+        return "extrato banco do brasil", True
+    monkeypatch.setattr(identificador, 'extrair_texto_do_arquivo', extrair)
+
+    assert identificador.extrair_texto_com_cache(b"%PDF lento", nome_arquivo="lento.pdf") == ("extrato banco do brasil", True)
+    digest = corpus_textos.calcular_digest(b"%PDF lento")
+    assert corpus_textos.ler_extracao(digest, 'texto', identificador.parametros_extracao('.pdf')) is None
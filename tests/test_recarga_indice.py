@@ -0,0 +1,36 @@
+import time
+
+import joblib
+import numpy as np
+
+
+def test_log_reescrito_recarrega_so_o_indice(area_isolada, monkeypatch):
+    import identificador
+    import indice_quantizado
+    carregamentos = []
+    carregar_modelo = identificador.carregar_modelo_semantico
+    monkeypatch.setattr(identificador, 'carregar_modelo_semantico', lambda: carregamentos.append(1) or carregar_modelo())
+    embeddings = np.random.default_rng(0).normal(size=(20, 16)).astype(np.float32)
+    joblib.dump(embeddings, str(area_isolada / 'layout_embeddings.joblib'))
+    joblib.dump([str(i % 4) for i in range(20)], str(area_isolada / 'layout_labels.joblib'))
+    (area_isolada / 'model_version.txt').write_text('v1')
+    identificador.carregar_modelo_em_cache.clear()
+    identificador.carregar_indice_em_cache.clear()
+    try:
+        sucesso, modelo, indice = identificador.carregar_recursos_modelo()
+        assert sucesso and len(indice) == 20
+        wal = str(area_isolada / 'layout_indice_wal.jsonl')
+        indice_quantizado.registrar_no_wal(wal, 'digest-1', '3', embeddings[0])
+        assert not identificador.recarregar_se_atualizado() and len(indice) == 21 # Só aplica o log
+
+        indice_quantizado.compactar_wal(wal, time.time()) # Retreino incorporou a inclusão
+        assert identificador.recarregar_se_atualizado()
+        _, modelo_novo, indice_novo = identificador.carregar_recursos_modelo()
+        assert indice_novo is not indice and len(indice_novo) == 20
+        assert modelo_novo is modelo and len(carregamentos) == 1
+
+        (area_isolada / 'model_version.txt').write_text('v2')
+        assert identificador.recarregar_se_atualizado() and len(carregamentos) == 2
+    finally:
+        identificador.carregar_modelo_em_cache.clear()
+        identificador.carregar_indice_em_cache.clear()
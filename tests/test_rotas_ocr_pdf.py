@@ -0,0 +1,67 @@
+import io
+
+import pytest
+
+from conftest import exigir_dependencias_do_pipeline
+
+
+@pytest.fixture
+def identificador(monkeypatch):
+    exigir_dependencias_do_pipeline()
+    import identificador
+    chamadas = []
+
+    def reconhecer(imagem):
+        chamadas.append(type(imagem).__name__)
+        return "texto reconhecido pelo ocr " * 3
+    monkeypatch.setattr(identificador, 'reconhecer_texto_governado', reconhecer)
+    identificador.chamadas_ocr = chamadas
+    return identificador
+
+
+def png(largura, altura):
+    from PIL import Image
+    saida = io.BytesIO()
+    Image.new('RGB', (largura, altura), 'white').save(saida, format='PNG')
+    return saida.getvalue()
+
+
+def pdf(montar):
+    import fitz
+    doc = fitz.open()
+    montar(doc.new_page(width=600, height=800))
+    return fitz.open(stream=doc.tobytes(), filetype='pdf')
+
+
+def fitz_rect(*coordenadas):
+    import fitz
+    return fitz.Rect(*coordenadas)
+
+
+def test_pagina_escaneada_e_so_rasterizada(identificador):
+    doc = pdf(lambda pagina: pagina.insert_image(pagina.rect, stream=png(300, 400)))
+    assert identificador.classificar_pagina_pdf(doc[0])[0] == 'digitalizada'
+    texto, foi_ocr = identificador.extrair_texto_das_paginas_pdf(doc)
+    assert foi_ocr and identificador.chamadas_ocr == ['Image'] # Uma passada, sem OCR da imagem embutida
+
+
+def test_pagina_com_texto_e_logo_reconhece_so_o_logo(identificador):
+    def montar(pagina):
+        pagina.insert_text((50, 100), "extrato de conta corrente agencia 1234 conta 56789 periodo maio")
+        pagina.insert_image(fitz_rect(10, 10, 60, 60), stream=png(50, 50))
+    doc = pdf(montar)
+    assert identificador.classificar_pagina_pdf(doc[0])[0] == 'mista'
+    identificador.extrair_texto_das_paginas_pdf(doc)
+    assert identificador.chamadas_ocr == ['bytes']
+
+
+def test_pouco_texto_ao_lado_de_logo_e_rasterizado_uma_vez(identificador, monkeypatch):
+    doc = pdf(lambda pagina: pagina.insert_image(fitz_rect(10, 10, 60, 60), stream=png(50, 50)))
+    assert identificador.classificar_pagina_pdf(doc[0])[0] == 'vetorial'
+    identificador.extrair_texto_das_paginas_pdf(doc)
+    assert identificador.chamadas_ocr == ['Image']
+
+    identificador.chamadas_ocr.clear() # Sem renderização, o logo ainda passa pelo OCR
+    monkeypatch.setattr(identificador, 'rasterizar_pagina', lambda pagina: None)
+    identificador.extrair_texto_das_paginas_pdf(doc)
+    assert identificador.chamadas_ocr == ['bytes']
@@ -0,0 +1,42 @@
+from selecao_texto import dividir_linhas, estimar_tokens, selecionar_texto, texto_para_encode, MAX_LINHAS_MOVIMENTO
+
+
+def extrato(movimentos=200):
+    linhas = ["banco do brasil s.a.", "extrato de conta corrente", "cliente: nanuque comercio ltda", "agencia 1234 conta 56789"]
+    linhas += [f"linha de rodape {i}" for i in range(8)] # Completa a faixa do cabeçalho
+    linhas.append("data historico documento valor saldo")
+    for i in range(movimentos):
+        linhas.append(f"{i % 28 + 1:02d}/05/2024 pix recebido {1000 + i} {i * 7},{i % 100:02d} {i * 13},00")
+    linhas.append("saldo anterior conferido pelo gerente")
+    return "\n".join(linhas)
+
+
+def test_celulas_nan_somem_sem_cortar_palavras():
+    assert list(dividir_linhas("nan  valor nan\nnanuque nan banana\nnan")) == ["valor", "nanuque banana"]
+
+
+def test_selecao_respeita_o_orcamento_e_a_ordem_do_documento():
+    texto = extrato()
+    selecionado = selecionar_texto(texto, 64)
+    linhas = selecionado.splitlines()
+
+    assert estimar_tokens(selecionado) <= 64
+    assert linhas[0] == "banco do brasil s.a."
+    assert "cliente: nanuque comercio ltda" in linhas
+    posicoes = [texto.splitlines().index(linha) for linha in linhas]
+    assert posicoes == sorted(posicoes)
+
+
+def test_movimentos_repetidos_entram_so_como_exemplo():
+    selecionado = selecionar_texto(extrato(), 1000)
+    movimentos = [linha for linha in selecionado.splitlines() if "pix recebido" in linha]
+    assert len(movimentos) <= MAX_LINHAS_MOVIMENTO
+    assert "data historico documento valor saldo" in selecionado
+    assert "saldo anterior conferido pelo gerente" in selecionado
+
+
+def test_documento_so_com_numeros_e_descricao_do_usuario():
+    numeros = "\n".join(f"{i} {i * 3},00" for i in range(50))
+    assert selecionar_texto(numeros, 64) == numeros[:800]
+    assert selecionar_texto("", 64) == "" and selecionar_texto("banco", 0) == ""
+    assert texto_para_encode(extrato(), 64, "  Extrato BB  ").endswith(" extrato bb")
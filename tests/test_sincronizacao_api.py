@@ -0,0 +1,103 @@
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+
+class ManagerFalso(BaseHTTPRequestHandler):
+    """Stand-in da API do Manager: get-token com o segredo e layouts com o token."""
+    layouts = []
+
+    def responder(self, status, corpo):
+        dados = json.dumps(corpo).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_POST(self):
+        corpo = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+        if self.path == '/api/get-token' and 'secret=segredo' in corpo:
+            self.responder(200, {'data': {'access_token': 'token-teste'}})
+        else:
+            self.responder(401, {'erro': 'segredo inválido'})
+
+    def do_GET(self):
+        if self.path.startswith('/api/layouts') and self.headers.get('Authorization') == 'Bearer token-teste':
+            self.responder(200, {'data': self.layouts})
+        else:
+            self.responder(401, {'erro': 'token inválido'})
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def manager(area_isolada, monkeypatch):
+    import treinador_em_massa as treinador
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), ManagerFalso)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    monkeypatch.setattr(treinador, 'API_BASE_URL', f"http://127.0.0.1:{servidor.server_port}/api/")
+    monkeypatch.setattr(treinador, 'API_SECRET', 'segredo')
+    yield ManagerFalso
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def test_sincronizacao_incremental_contra_api_de_testes(manager, area_isolada):
+    import treinador_em_massa as treinador
+    import metadados_layouts
+    manager.layouts = [
+        {'codigo': 1, 'nome': 'BB - Extrato conta corrente', 'formato': 'PDF', 'imagem': None},
+        {'codigo': 2, 'nome': 'Dominio contas a pagar', 'formato': 'EXCEL', 'imagem': 'http://img/2.png'},
+    ]
+    (area_isolada / 'arquivos_de_treinamento' / '1_extrato.txt').write_text('banco do brasil extrato')
+
+    resumo = treinador.sincronizar_mapeamento_com_api()
+    assert sorted(resumo['novos']) == ['1', '2'] and not resumo['alterados'] and not resumo['removidos']
+    assert resumo['cabecalhos'] == ['1'] # Só o layout com documentos tem cabeçalho a extrair
+    layouts = metadados_layouts.carregar_layouts()
+    assert layouts['1']['sistema'] == 'BB BANCO DO BRASIL' and layouts['1']['tipo_relatorio'] == 'Bancário'
+    assert layouts['2']['formato'] == 'PDF' and layouts['2']['tipo_relatorio'] == 'Financeiro'
+    assert layouts['2']['url_previa'] == 'http://img/2.png'
+
+    # Nada mudou na API nem nos documentos: nada é regravado
+    resumo = treinador.sincronizar_mapeamento_com_api()
+    assert resumo == {'novos': [], 'alterados': [], 'removidos': [], 'cabecalhos': []}
+
+    manager.layouts = [{'codigo': 1, 'nome': 'BB - Extrato poupança', 'formato': 'PDF', 'imagem': None}]
+    resumo = treinador.sincronizar_mapeamento_com_api()
+    assert resumo['alterados'] == ['1'] and resumo['removidos'] == ['2'] and not resumo['novos']
+    assert set(metadados_layouts.carregar_layouts()) == {'1'}
+
+
+def test_sincronizacao_com_segredo_errado_mantem_os_metadados(manager, area_isolada, monkeypatch):
+    import treinador_em_massa as treinador
+    import metadados_layouts
+    monkeypatch.setattr(treinador, 'API_SECRET', 'outro')
+    manager.layouts = [{'codigo': 1, 'nome': 'BB - Extrato', 'formato': 'PDF', 'imagem': None}]
+    assert treinador.sincronizar_mapeamento_com_api() is None
+    assert metadados_layouts.carregar_layouts() == {}
+
+
+def test_layouts_importados_do_json_legado_recebem_a_previa_da_api(manager, area_isolada, monkeypatch):
+    import json
+    import identificador
+    import metadados_layouts
+    (area_isolada / 'layouts_meta.json').write_text(json.dumps([
+        {'codigo_layout': '1', 'descricao': 'BB - Extrato', 'formato': 'PDF'},
+        {'codigo_layout': '2', 'descricao': 'Dominio contas a pagar', 'formato': 'PDF', 'url_previa': 'http://img/local.png'},
+    ]))
+    manager.layouts = [
+        {'codigo': 1, 'nome': 'BB - Extrato', 'formato': 'PDF', 'imagem': 'http://img/1.png'},
+        {'codigo': 2, 'nome': 'Dominio contas a pagar', 'formato': 'PDF', 'imagem': 'http://img/2.png'},
+    ]
+    monkeypatch.setenv('API_SECRET', 'segredo')
+
+    assert identificador.completar_previas_da_api() == 1
+    layouts = metadados_layouts.snapshot()
+    assert layouts['1']['url_previa'] == 'http://img/1.png'
+    assert layouts['2']['url_previa'] == 'http://img/local.png' # A que já existia não é trocada
+    assert identificador.completar_previas_da_api() == 0
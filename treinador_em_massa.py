@@ -2,89 +2,97 @@
 
 import os
 import re
-import json
+import time
 from collections import defaultdict
 import joblib
+import numpy as np
 import pandas as pd
 import argparse
 from tqdm import tqdm
-from sentence_transformers import SentenceTransformer
 from datetime import datetime
 import requests
 from dotenv import load_dotenv
 
-# Importa as duas funções de extração do nosso cérebro
-from identificador import extrair_texto_do_arquivo, extrair_texto_do_cabecalho
+# Importa as funções de extração (com cache por conteúdo) do nosso cérebro
+from identificador import (extrair_texto_com_cache, extrair_cabecalho_com_cache, parametros_extracao,
+                           carregar_modelo_semantico)
+import corpus_textos
+import metadados_layouts
+from deduplicacao import selecionar_representantes, MAX_AMOSTRAS_POR_LAYOUT
+from indice_quantizado import quantizar, compactar_wal
+from selecao_texto import selecionar_texto, orcamento_do_modelo
 
 # --- CONFIGURAÇÕES ---
 PASTA_PRINCIPAL_TREINAMENTO = 'arquivos_de_treinamento'
-PASTA_CACHE = 'cache_de_texto'
+PASTA_CACHE = 'cache_de_texto' # Cache antigo (um .txt por arquivo); importado com --migrar-cache-legado
+VERSAO_CACHE_LEGADO = 0 # Assinatura própria dos textos do cache antigo (extrator anterior ao VERSAO_EXTRATOR 1)
+EXTENSOES_TREINAMENTO = ['.pdf', '.xlsx', '.xls', '.txt', '.csv', '.xml', '.ofx']
 NOME_ARQUIVO_MAPEAMENTO = 'mapeamento_layouts.xlsx'
-NOME_MODELO_SEMANTICO = 'distiluse-base-multilingual-cased-v1'
 
 ARQUIVO_EMBEDDINGS = 'layout_embeddings.joblib'
 ARQUIVO_LABELS = 'layout_labels.joblib'
-ARQUIVO_METADADOS = 'layouts_meta.json'
+ARQUIVO_INDICE_COMPACTO = 'layout_indice_compacto.joblib'
+ARQUIVO_INDICE_WAL = 'layout_indice_wal.jsonl' # Confirmações incluídas no índice desde o último treino
 
-API_BASE_URL = "https://manager.conciliadorcontabil.com.br/api/"
 load_dotenv() 
+API_BASE_URL = os.getenv('MANAGER_API_URL', "https://manager.conciliadorcontabil.com.br/api/").rstrip('/') + '/' # MANAGER_API_URL: API de testes (stand-in local)
 API_SECRET = os.getenv('API_SECRET')
+TIMEOUT_API = 30
 
-if not os.path.exists(PASTA_CACHE):
-    os.makedirs(PASTA_CACHE)
+def buscar_layouts_api(segredo=None):
+    """Baixa o cadastro de layouts do Manager e o normaliza em registros de metadados."""
+    resposta_token = requests.post(f"{API_BASE_URL}get-token", data={'secret': segredo or API_SECRET}, timeout=TIMEOUT_API)
+    resposta_token.raise_for_status()
+    access_token = resposta_token.json().get("data", {}).get("access_token")
+    if not access_token:
+        raise RuntimeError("Não foi possível obter o access_token da API.")
+
+    headers = {'Authorization': f'Bearer {access_token}'}
+    resposta_layouts = requests.get(f"{API_BASE_URL}layouts?orderby=id,asc", headers=headers, timeout=TIMEOUT_API)
+    resposta_layouts.raise_for_status()
+    layouts_da_api = resposta_layouts.json().get("data", [])
+    if not isinstance(layouts_da_api, list):
+        raise RuntimeError("A API não retornou uma lista de layouts válida.")
+
+    registros = []
+    for layout in layouts_da_api:
+        if not layout.get('codigo'): continue
+        formato = layout.get('formato') or ''
+        # Mantém a lógica de compatibilidade PDF/Excel se necessário
+        if formato.upper() == 'EXCEL':
+            formato = 'PDF'
+        registros.append({'codigo_layout': str(layout.get('codigo')), 'descricao': layout.get('nome') or '',
+                          'formato': formato, 'url_previa': layout.get('imagem') or None})
+    return registros
 
 def sincronizar_mapeamento_com_api():
     """
-    Busca todos os layouts da API, corrige os formatos e cria/sobrescreve
-    o arquivo mapeamento_layouts.xlsx.
+    Sincronização incremental: compara os layouts da API com os metadados atuais pelo código,
+    aplica só as inclusões, alterações e remoções e recalcula os cabeçalhos apenas dos layouts
+    afetados. Retorna o resumo das mudanças, ou None em caso de falha.
     """
     print("--- Etapa de Sincronização com a API ---")
     if not API_SECRET:
         print("ERRO: Segredo da API não encontrado no arquivo .env.")
-        return False
+        return None
     try:
-        token_url = f"{API_BASE_URL}get-token"
-        response_token = requests.post(token_url, data={'secret': API_SECRET})
-        response_token.raise_for_status()
-        access_token = response_token.json().get("data", {}).get("access_token")
-        if not access_token:
-            print("ERRO: Não foi possível obter o access_token da API.")
-            return False
-        
         print("Buscando todos os layouts do Manager...")
-        headers = {'Authorization': f'Bearer {access_token}'}
-        response_layouts = requests.get(f"{API_BASE_URL}layouts?orderby=id,asc", headers=headers)
-        response_layouts.raise_for_status()
-        
-        layouts_da_api_objeto = response_layouts.json()
-        layouts_da_api_lista = layouts_da_api_objeto.get("data", [])
-
-        if not isinstance(layouts_da_api_lista, list):
-             print("ERRO: A API não retornou uma lista de layouts válida.")
-             return False
-
-        dados_para_excel = []
-        for layout in layouts_da_api_lista:
-            formato_original = layout.get('formato')
-            # Mantém a lógica de compatibilidade PDF/Excel se necessário
-            if formato_original and formato_original.upper() == 'EXCEL':
-                formato_corrigido = 'PDF'
-            else:
-                formato_corrigido = formato_original
-                
-            dados_para_excel.append({
-                'codigo_layout': layout.get('codigo'),
-                'descricao': layout.get('nome'),
-                'Formato': formato_corrigido
-            })
-
-        df_final = pd.DataFrame(dados_para_excel)
-        df_final.to_excel(NOME_ARQUIVO_MAPEAMENTO, index=False, engine='openpyxl')
-        print(f"Sucesso! '{NOME_ARQUIVO_MAPEAMENTO}' foi atualizado com {len(df_final)} layouts.")
-        return True
+        registros = buscar_layouts_api()
+        if not registros:
+            print("ERRO: A API não retornou nenhum layout; metadados mantidos.")
+            return None
+
+        mapa_layouts = metadados_layouts.carregar_layouts()
+        resumo = aplicar_registros_api(mapa_layouts, registros)
+        resumo['cabecalhos'] = atualizar_cabecalhos(mapa_layouts)
+        alterados = set(resumo['novos']) | set(resumo['alterados']) | set(resumo['cabecalhos'])
+        metadados_layouts.gravar_layouts([mapa_layouts[c] for c in alterados], remover=resumo['removidos'])
+        print(f"Sucesso! {len(registros)} layouts na API: {len(resumo['novos'])} novos, {len(resumo['alterados'])} alterados, "
+              f"{len(resumo['removidos'])} removidos, {len(resumo['cabecalhos'])} cabeçalhos recalculados.")
+        return resumo
     except Exception as e:
         print(f"ERRO CRÍTICO durante a sincronização com a API: {e}")
-        return False
+        return None
 
 def extrair_e_padronizar_sistema(descricao):
     descricao = str(descricao)
@@ -100,135 +108,292 @@ def extrair_e_padronizar_sistema(descricao):
     elif sistema.upper() == 'CEF': return 'CEF CAIXA ECONOMICA FEDERAL'
     else: return sistema
 
+def classificar_tipo_relatorio(descricao):
+    return 'Bancário' if 'extrato' in str(descricao).lower() else 'Financeiro'
+
+# --- METADADOS ---
+
+def aplicar_registros_api(mapa_layouts, registros):
+    """
+    Aplica os registros da API sobre o mapa de metadados (in-place). `sistema` e
+    `tipo_relatorio` só são recalculados quando a descrição muda; o cabeçalho é preservado.
+    """
+    resumo = {'novos': [], 'alterados': [], 'removidos': []}
+    codigos_api = set()
+    for registro in registros:
+        codigo = registro['codigo_layout']
+        codigos_api.add(codigo)
+        atual = mapa_layouts.get(codigo)
+        if atual and all(atual.get(campo) == valor for campo, valor in registro.items()):
+            continue
+        if atual is None or atual.get('descricao') != registro['descricao']:
+            registro = dict(registro, sistema=extrair_e_padronizar_sistema(registro['descricao']),
+                            tipo_relatorio=classificar_tipo_relatorio(registro['descricao']))
+        resumo['alterados' if atual else 'novos'].append(codigo)
+        mapa_layouts[codigo] = {**(atual or {}), **registro}
+    for codigo in [c for c in mapa_layouts if c not in codigos_api]:
+        del mapa_layouts[codigo]
+        resumo['removidos'].append(codigo)
+    return resumo
+
+def atualizar_cabecalhos(mapa_layouts):
+    """
+    Recalcula o cabeçalho só dos layouts cujo conjunto de documentos de treinamento mudou,
+    detectado pela assinatura dos digests guardada em cada registro. Retorna os layouts recalculados.
+    """
+    documentos_por_layout = defaultdict(list)
+    for nome_arquivo, codigo_layout, digest in sincronizar_documentos_de_treinamento():
+        if codigo_layout in mapa_layouts:
+            documentos_por_layout[codigo_layout].append((nome_arquivo, digest))
+
+    atualizados = []
+    for codigo, meta_item in mapa_layouts.items():
+        documentos = sorted(documentos_por_layout.get(codigo, []))
+        assinatura = corpus_textos.assinatura_parametros(sorted(digest for _, digest in documentos)) if documentos else ''
+        if meta_item.get('assinatura_documentos', '') == assinatura and (assinatura or 'cabecalho' not in meta_item):
+            continue
+        cabecalhos = [extrair_cabecalho_com_cache(os.path.join(PASTA_PRINCIPAL_TREINAMENTO, nome), digest=digest)
+                      for nome, digest in documentos]
+        cabecalho = metadados_layouts.limitar_cabecalho(" ".join(c for c in cabecalhos if c))
+        if cabecalho: meta_item['cabecalho'] = cabecalho
+        else: meta_item.pop('cabecalho', None)
+        meta_item['assinatura_documentos'] = assinatura
+        atualizados.append(codigo)
+    return atualizados
+
 def atualizar_metadados():
+    """
+    Recalcula os cabeçalhos dos layouts cujos documentos mudaram, sem consultar a API.
+    Sem metadados ainda, parte do mapeamento_layouts.xlsx (instalações antigas).
+    """
     print("\n--- Etapa de Metadados ---")
-    if not os.path.exists(NOME_ARQUIVO_MAPEAMENTO):
-        print(f"ERRO: Arquivo de mapeamento '{NOME_ARQUIVO_MAPEAMENTO}' não encontrado.")
-        return None
     try:
-        df_mapa = pd.read_excel(NOME_ARQUIVO_MAPEAMENTO, dtype=str, engine='openpyxl')
-        df_mapa.fillna('', inplace=True)
-        df_mapa.rename(columns={'Formato': 'formato'}, inplace=True)
-        df_mapa['sistema'] = df_mapa['descricao'].apply(extrair_e_padronizar_sistema)
-        metadados_completos = df_mapa.to_dict('records')
-        mapa_layouts = {str(item['codigo_layout']): item for item in metadados_completos}
-        
-        print("Extraindo informações de cabeçalho dos arquivos de exemplo...")
-        cabecalhos_por_layout = defaultdict(str)
-        if os.path.exists(PASTA_PRINCIPAL_TREINAMENTO):
-            for nome_arquivo in os.listdir(PASTA_PRINCIPAL_TREINAMENTO):
-                # AJUSTE: Captura apenas o número no INÍCIO do nome do arquivo
-                match = re.match(r'^(\d+)', nome_arquivo)
-                if match:
-                    codigo_layout = match.group(1)
-                    if codigo_layout in mapa_layouts:
-                        caminho_completo = os.path.join(PASTA_PRINCIPAL_TREINAMENTO, nome_arquivo)
-                        texto_cabecalho = extrair_texto_do_cabecalho(caminho_completo)
-                        if texto_cabecalho:
-                            cabecalhos_por_layout[codigo_layout] += " " + texto_cabecalho
-        
-        print("Classificando relatórios como 'Bancário' ou 'Financeiro'...")
-        for meta_item in metadados_completos:
-            codigo = str(meta_item.get('codigo_layout', ''))
-            descricao = meta_item.get('descricao', '').lower()
-            if 'extrato' in descricao:
-                meta_item['tipo_relatorio'] = 'Bancário'
-            else:
-                meta_item['tipo_relatorio'] = 'Financeiro'
-            if codigo in cabecalhos_por_layout:
-                meta_item['cabecalho'] = " ".join(cabecalhos_por_layout[codigo].split())
-        
-        with open(ARQUIVO_METADADOS, 'w', encoding='utf-8') as f:
-            json.dump(metadados_completos, f, indent=4, ensure_ascii=False)
-        print(f"'{ARQUIVO_METADADOS}' foi atualizado com {len(metadados_completos)} registros.")
+        mapa_layouts = metadados_layouts.carregar_layouts()
+        novos = []
+        if not mapa_layouts:
+            if not os.path.exists(NOME_ARQUIVO_MAPEAMENTO):
+                print(f"ERRO: Nenhum metadado cadastrado e '{NOME_ARQUIVO_MAPEAMENTO}' não encontrado. Sincronize com a API.")
+                return None
+            df_mapa = pd.read_excel(NOME_ARQUIVO_MAPEAMENTO, dtype=str, engine='openpyxl').fillna('')
+            df_mapa.rename(columns={'Formato': 'formato'}, inplace=True)
+            novos = aplicar_registros_api(mapa_layouts, df_mapa[['codigo_layout', 'descricao', 'formato']].to_dict('records'))['novos']
+
+        print("Extraindo informações de cabeçalho dos layouts com documentos novos ou alterados...")
+        atualizados = atualizar_cabecalhos(mapa_layouts)
+        metadados_layouts.gravar_layouts([mapa_layouts[c] for c in set(novos) | set(atualizados)])
+        print(f"{len(atualizados)} cabeçalhos recalculados.")
         return mapa_layouts
     except Exception as e:
-        print(f"ERRO ao ler o arquivo Excel: {e}.")
+        print(f"ERRO ao atualizar os metadados: {e}.")
         return None
 
-def treinar_modelo_ml():
-    print("\n--- Etapa de Treinamento de Machine Learning (Usando Cache) ---")
-    textos_por_layout = defaultdict(str)
+def exportar_mapeamento_excel(caminho=NOME_ARQUIVO_MAPEAMENTO):
+    """Exportação opcional dos metadados no formato antigo do mapeamento_layouts.xlsx."""
+    df = pd.DataFrame([{'codigo_layout': m['codigo_layout'], 'descricao': m.get('descricao', ''), 'Formato': m.get('formato', '')}
+                       for m in metadados_layouts.carregar_layouts().values()])
+    df.to_excel(caminho, index=False, engine='openpyxl')
+    print(f"'{caminho}' exportado com {len(df)} layouts.")
+
+def sincronizar_documentos_de_treinamento():
+    """Mantém a tabela de documentos do corpus em dia com a pasta; retorna [(nome_arquivo, codigo_layout, digest)]."""
+    return corpus_textos.sincronizar_pasta(PASTA_PRINCIPAL_TREINAMENTO)
+
+def parametros_validos():
+    return [parametros_extracao(ext, tipo) for ext in EXTENSOES_TREINAMENTO for tipo in ['texto', 'cabecalho']]
+
+def parametros_legados():
+    return [parametros_extracao(ext, versao=VERSAO_CACHE_LEGADO) for ext in EXTENSOES_TREINAMENTO]
+
+def migrar_cache_legado():
+    """
+    Importa o cache antigo (cache_de_texto/<nome>.txt) para o corpus empacotado, evitando
+    refazer o OCR do acervo. Os textos entram com a assinatura do extrator legado: o treino só
+    os usa quando o documento ainda não tem extração atual, até --reextrair-legado (ou uma
+    consulta ao mesmo arquivo) gerar a nova. Textos sem arquivo de treinamento são ignorados.
+    """
+    print("\n--- Migração do cache antigo para o corpus empacotado ---")
+    if not os.path.exists(PASTA_CACHE):
+        print(f"AVISO: Pasta '{PASTA_CACHE}' não encontrada.")
+        return
+    documentos = {nome: digest for nome, _, digest in sincronizar_documentos_de_treinamento()}
+    importados, existentes, orfaos = 0, 0, 0
+    for nome_cache in tqdm(os.listdir(PASTA_CACHE), desc="Importando textos"):
+        nome_arquivo = nome_cache[:-len('.txt')] if nome_cache.endswith('.txt') else nome_cache
+        if nome_arquivo not in documentos:
+            orfaos += 1
+            continue
+        extensao = os.path.splitext(nome_arquivo)[1].lower()
+        parametros = parametros_extracao(extensao, versao=VERSAO_CACHE_LEGADO)
+        if corpus_textos.ler_extracao(documentos[nome_arquivo], 'texto', parametros) or \
+                corpus_textos.ler_extracao(documentos[nome_arquivo], 'texto', parametros_extracao(extensao)):
+            existentes += 1
+            continue
+        with open(os.path.join(PASTA_CACHE, nome_cache), 'r', encoding='utf-8') as f:
+            texto = f.read()
+        if texto:
+            corpus_textos.gravar_extracao(documentos[nome_arquivo], 'texto', parametros, {'texto': texto, 'foi_ocr': False})
+            importados += 1
+    print(f"{importados} textos importados, {existentes} já presentes, {orfaos} sem arquivo de treinamento.")
+
+def reextrair_legado(limite=None):
+    """
+    Extrai com o extrator atual os documentos que só têm o texto do cache legado (com OCR, se
+    preciso). Pode rodar aos poucos (`limite`); o legado sai do corpus no próximo --compactar-corpus.
+    """
+    print("\n--- Reextração dos textos do cache legado ---")
+    atuais = corpus_textos.carregar_extracoes('texto', parametros_validos())
+    legados = corpus_textos.carregar_extracoes('texto', parametros_legados())
+    pendentes = []
+    for nome_arquivo, _, digest in sincronizar_documentos_de_treinamento():
+        extensao = os.path.splitext(nome_arquivo)[1].lower()
+        if (digest, corpus_textos.assinatura_parametros(parametros_extracao(extensao))) in atuais: continue
+        if (digest, corpus_textos.assinatura_parametros(parametros_extracao(extensao, versao=VERSAO_CACHE_LEGADO))) in legados:
+            pendentes.append((nome_arquivo, digest))
+    for nome_arquivo, digest in tqdm(pendentes[:limite], desc="Reextraindo"):
+        senha_extraida = re.search(r'senha[_\s-]*(\d+)', nome_arquivo, re.IGNORECASE)
+        extrair_texto_com_cache(os.path.join(PASTA_PRINCIPAL_TREINAMENTO, nome_arquivo),
+                                senha_manual=senha_extraida.group(1) if senha_extraida else None, digest=digest)
+    print(f"{len(pendentes[:limite])} de {len(pendentes)} documentos reextraídos.")
+
+def compactar_corpus():
+    return corpus_textos.compactar(parametros_validos(), parametros_provisorios=parametros_legados())
+
+def registrar_versao_modelo():
+    """As interfaces recarregam o modelo quando este arquivo muda (identificador.recarregar_se_atualizado)."""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with open("model_version.txt", "w") as f:
+        f.write(timestamp)
+
+def salvar_artefato(objeto, caminho):
+    """joblib.dump atômico: leitores nunca veem um arquivo pela metade."""
+    caminho_tmp = f"{caminho}.{os.getpid()}.tmp"
+    joblib.dump(objeto, caminho_tmp)
+    os.replace(caminho_tmp, caminho)
+
+def treinar_modelo_ml(layouts=None):
+    """
+    Treina o índice de embeddings, com um vetor por amostra representativa: quase-duplicatas
+    de cada layout são agrupadas e só até MAX_AMOSTRAS_POR_LAYOUT representantes são codificados.
+    Com `layouts`, faz um retreino incremental: só os layouts informados são recodificados e
+    os demais vetores do modelo atual são mantidos. Ao final, o log de inclusões perde as
+    confirmações que este treino incorporou.
+    """
+    inicio_treino = time.time() # Inclusões gravadas depois disso podem não estar nos artefatos
+    incremental = layouts is not None and os.path.exists(ARQUIVO_EMBEDDINGS) and os.path.exists(ARQUIVO_LABELS)
+    layouts_alvo = {str(codigo) for codigo in layouts} if incremental else None
+    print(f"\n--- Etapa de Treinamento de Machine Learning (Usando Cache{', incremental' if incremental else ''}) ---")
+    textos_por_layout = defaultdict(list)
     
     if not os.path.exists(PASTA_PRINCIPAL_TREINAMENTO):
         print("AVISO: Pasta de treinamento não encontrada. Pulando etapa de ML.")
         return
-    if not os.path.exists(ARQUIVO_METADADOS):
-        print("AVISO: Arquivo de metadados não encontrado. Execute a atualização de metadados primeiro.")
+    mapa_layouts = metadados_layouts.carregar_layouts()
+    if not mapa_layouts:
+        print("AVISO: Nenhum metadado de layout encontrado. Sincronize com a API primeiro.")
         return
-    with open(ARQUIVO_METADADOS, 'r', encoding='utf-8') as f:
-        meta_list = json.load(f)
-        mapa_layouts = {str(item['codigo_layout']): item for item in meta_list}
 
     print("Verificando cache e lendo/gerando textos de treinamento...")
-    for nome_arquivo in tqdm(os.listdir(PASTA_PRINCIPAL_TREINAMENTO), desc="Processando arquivos"):
-        caminho_cache = os.path.join(PASTA_CACHE, nome_arquivo + '.txt')
-        texto = ""
-        
-        if os.path.exists(caminho_cache):
-            with open(caminho_cache, 'r', encoding='utf-8') as f:
-                texto = f.read()
+    documentos = sincronizar_documentos_de_treinamento()
+    extracoes = corpus_textos.carregar_extracoes('texto', parametros_validos()) # Leitura em lote
+    legados = corpus_textos.carregar_extracoes('texto', parametros_legados())
+    usados_legado = 0
+    for nome_arquivo, codigo_layout, digest in tqdm(documentos, desc="Processando arquivos"):
+        if codigo_layout not in mapa_layouts: continue
+        if layouts_alvo is not None and codigo_layout not in layouts_alvo: continue
+        extensao = os.path.splitext(nome_arquivo)[1].lower()
+        em_cache = extracoes.get((digest, corpus_textos.assinatura_parametros(parametros_extracao(extensao))))
+        legado = legados.get((digest, corpus_textos.assinatura_parametros(parametros_extracao(extensao, versao=VERSAO_CACHE_LEGADO))))
+        if em_cache:
+            texto = em_cache['texto']
+        elif legado:
+            texto = legado['texto'] # Sem extração atual: o texto do cache antigo evita refazer o OCR no treino
+            usados_legado += 1
         else:
-            caminho_completo = os.path.join(PASTA_PRINCIPAL_TREINAMENTO, nome_arquivo)
             senha_extraida = re.search(r'senha[_\s-]*(\d+)', nome_arquivo, re.IGNORECASE)
-            
-            # AJUSTE: extrair_texto_do_arquivo retorna (texto, foi_ocr)
-            texto_extraido, _ = extrair_texto_do_arquivo(
-                caminho_completo, 
-                senha_manual=senha_extraida.group(1) if senha_extraida else None
+            # AJUSTE: extrair_texto_com_cache retorna (texto, foi_ocr)
+            texto, _ = extrair_texto_com_cache(
+                os.path.join(PASTA_PRINCIPAL_TREINAMENTO, nome_arquivo),
+                senha_manual=senha_extraida.group(1) if senha_extraida else None,
+                digest=digest
             )
-            
-            if texto_extraido and texto_extraido not in ["SENHA_NECESSARIA", "SENHA_INCORRETA"]:
-                texto = texto_extraido
-                with open(caminho_cache, 'w', encoding='utf-8') as f:
-                    f.write(texto)
+            if texto in ["SENHA_NECESSARIA", "SENHA_INCORRETA"]:
+                texto = ""
         
         if texto:
-            # AJUSTE: Captura apenas o número no INÍCIO do nome do arquivo
-            match = re.match(r'^(\d+)', nome_arquivo)
-            if match:
-                codigo_layout = match.group(1)
-                if codigo_layout in mapa_layouts:
-                    textos_por_layout[codigo_layout] += " " + texto
+            textos_por_layout[codigo_layout].append((nome_arquivo, texto))
     
-    if not textos_por_layout:
+    if not textos_por_layout and not incremental:
         print("AVISO: Nenhum texto válido para treinar o modelo de ML.")
         return
 
-    labels = list(textos_por_layout.keys())
-    corpus = [textos_por_layout[label] for label in labels]
+    if usados_legado: print(f"{usados_legado} textos vieram do cache legado (gere os atuais com --reextrair-legado).")
+    print("Agrupando amostras quase duplicadas...")
+    labels, corpus = [], []
+    total_amostras, total_grupos = 0, 0
+    for codigo_layout, amostras in textos_por_layout.items():
+        representantes, grupos = selecionar_representantes(amostras, MAX_AMOSTRAS_POR_LAYOUT)
+        total_amostras += len(amostras)
+        total_grupos += len(grupos)
+        labels.extend([codigo_layout] * len(representantes))
+        corpus.extend(texto for _, texto in representantes)
+    if total_amostras:
+        print(f"{total_amostras} amostras -> {total_grupos} grupos distintos -> {len(corpus)} representantes codificados "
+              f"({total_amostras - total_grupos} quase-duplicatas, {total_grupos - len(corpus)} acima do limite por layout).")
     
-    print(f"\nGerando embeddings semânticos para {len(labels)} layouts...")
-    model = SentenceTransformer(NOME_MODELO_SEMANTICO)
-    embeddings = model.encode(corpus, show_progress_bar=True)
+    embeddings = None
+    if corpus:
+        print(f"\nGerando embeddings semânticos para {len(corpus)} amostras de {len(textos_por_layout)} layouts...")
+        model = carregar_modelo_semantico()
+        # Mesma seleção de texto da busca (selecao_texto): só o que cabe no orçamento de tokens
+        embeddings = model.encode([selecionar_texto(texto, orcamento_do_modelo(model)) for texto in corpus], show_progress_bar=True)
+
+    if incremental:
+        # Mantém os vetores dos layouts não afetados e substitui os recodificados
+        embeddings_atuais = np.asarray(joblib.load(ARQUIVO_EMBEDDINGS))
+        labels_atuais = joblib.load(ARQUIVO_LABELS)
+        manter = [i for i, label in enumerate(labels_atuais) if label not in layouts_alvo]
+        embeddings = np.vstack([embeddings_atuais[manter]] + ([embeddings] if embeddings is not None else []))
+        labels = [labels_atuais[i] for i in manter] + labels
 
     print("Salvando os arquivos do modelo de ML...")
-    joblib.dump(embeddings, ARQUIVO_EMBEDDINGS)
-    joblib.dump(labels, ARQUIVO_LABELS)
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open("model_version.txt", "w") as f:
-        f.write(timestamp)
+    embeddings = np.asarray(embeddings, dtype=np.float32) # Sem compressão, para o identificador mapear em memória
+    salvar_artefato(embeddings, ARQUIVO_EMBEDDINGS)
+    salvar_artefato(labels, ARQUIVO_LABELS)
+    salvar_artefato(quantizar(embeddings), ARQUIVO_INDICE_COMPACTO)
+    mescladas = compactar_wal(ARQUIVO_INDICE_WAL, inicio_treino, layouts_alvo)
+    if mescladas: print(f"{mescladas} inclusões do log incorporadas ao modelo.")
+    registrar_versao_modelo() # Por último: quem recarregar pela versão já encontra o log compactado
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Treinador para o identificador de layouts.")
-    parser.add_argument('--sincronizar-api', action='store_true', help="Apenas sincroniza a API para o arquivo Excel e atualiza os metadados.")
-    parser.add_argument('--apenas-meta', action='store_true', help="Apenas atualiza os metadados a partir do Excel existente.")
+    parser.add_argument('--sincronizar-api', action='store_true', help="Apenas sincroniza os metadados com a API (incremental).")
+    parser.add_argument('--apenas-meta', action='store_true', help="Apenas recalcula os cabeçalhos dos layouts com documentos alterados.")
+    parser.add_argument('--exportar-excel', action='store_true', help="Exporta os metadados para mapeamento_layouts.xlsx.")
     parser.add_argument('--retreinar-rapido', action='store_true', help="Apenas retreina o modelo de ML a partir do cache de texto existente.")
+    parser.add_argument('--layouts', help="Com --retreinar-rapido, retreina só estes layouts (ex: 12,345).")
+    parser.add_argument('--migrar-cache-legado', action='store_true', help="Importa a pasta cache_de_texto para o corpus empacotado (corpus_textos.db).")
+    parser.add_argument('--reextrair-legado', action='store_true', help="Extrai de novo os documentos que só têm texto do cache legado.")
+    parser.add_argument('--limite', type=int, help="Com --reextrair-legado, quantos documentos processar nesta execução.")
+    parser.add_argument('--compactar-corpus', action='store_true', help="Remove do corpus extrações obsoletas e consultas antigas.")
     args = parser.parse_args()
 
     if args.sincronizar_api:
-        if sincronizar_mapeamento_com_api():
-            atualizar_metadados()
+        sincronizar_mapeamento_com_api()
     elif args.apenas_meta:
         atualizar_metadados()
+    elif args.exportar_excel:
+        exportar_mapeamento_excel()
     elif args.retreinar_rapido:
-        treinar_modelo_ml()
+        treinar_modelo_ml(layouts=args.layouts.split(',') if args.layouts else None)
+    elif args.migrar_cache_legado:
+        migrar_cache_legado()
+    elif args.reextrair_legado:
+        reextrair_legado(args.limite)
+    elif args.compactar_corpus:
+        print(f"Extrações removidas: {compactar_corpus()}")
     else:
         # Fluxo completo (chamado pelo botão de upload do ZIP)
-        sucesso_sinc = sincronizar_mapeamento_com_api()
-        if sucesso_sinc:
-            mapa_final = atualizar_metadados()
-            if mapa_final:
-                treinar_modelo_ml()
+        if sincronizar_mapeamento_com_api() is not None:
+            treinar_modelo_ml()
     
     print("\n--- Processo Concluído ---")
\ No newline at end of file